@@ -4,12 +4,14 @@
 # This module is intended to implement integer/bitwise operations in OpenFHE's 
 # BinFHE for demonstration purposes.  A more "real" version of this
 # API would probably be written in C++ to leverage CPU parallelism and 
-# consequently be much faster.
+# consequently be much faster.  Circuits can instead be built lazily as a
+# `Netlist`, which can be optimized and evaluated level by level.
 #
 # It implements both secure and plaintext versions of these operations
 # to simplify the writing of unit tests and similar.
 #
 
+import operator
 import os
 from typing import Callable, Iterable
 from unittest import TestCase
@@ -63,6 +65,15 @@ class Wire:
   def __xor__(self, other: 'Wire') -> 'Wire':
     raise NotImplementedError("__xor__")
 
+  def nand(self, other: 'Wire') -> 'Wire':
+    return ~(self & other)
+
+  def nor(self, other: 'Wire') -> 'Wire':
+    return ~(self | other)
+
+  def xnor(self, other: 'Wire') -> 'Wire':
+    return ~(self ^ other)
+
   def adc(self, other: 'Wire') -> tuple['Wire', 'Wire']:
     """Add with carry with `other` returning a tuple of (sum of self and other, carry bit)"""
     return (self ^ other, self & other)
@@ -193,6 +204,15 @@ class BinFHEWire(Wire):
       return ~self
 
     return BinFHEWire(self.cc, self.cc.EvalBinGate(openfhe.XOR, self.wire, other.wire))
+
+  def nand(self, other: 'BinFHEWire') -> 'BinFHEWire':
+    return BinFHEWire(self.cc, self.cc.EvalBinGate(openfhe.NAND, self.wire, other.wire))
+
+  def nor(self, other: 'BinFHEWire') -> 'BinFHEWire':
+    return BinFHEWire(self.cc, self.cc.EvalBinGate(openfhe.NOR, self.wire, other.wire))
+
+  def xnor(self, other: 'BinFHEWire') -> 'BinFHEWire':
+    return BinFHEWire(self.cc, self.cc.EvalBinGate(openfhe.XNOR, self.wire, other.wire))
   
 
 # -- circuits -----------------------------------------------------------------
@@ -225,14 +245,14 @@ class Circuit:
   def zero(self) -> Wire:
     """Get or create a zero valued Wire"""
     if self.zerowire is None:
-      self.zerowire = self.wires[0] & ~self.wires[0]
+      self.zerowire = self.wires[0].zero()
     
     return self.zerowire
   
   def one(self) -> Wire:
     """Get or create a Wire with a value of one"""
     if self.onewire is None:
-      self.onewire = self.wires[0] | ~self.wires[0]
+      self.onewire = self.wires[0].one()
     
     return self.onewire
 
@@ -351,11 +371,349 @@ class Circuit:
 
 
 
+# -- netlists -----------------------------------------------------------------
+
+# the binary gates a netlist can contain, all of which are bootstrapped in BinFHE
+GATES: dict[str, Callable[[Wire, Wire], Wire]] = {
+  "and": operator.and_,
+  "or": operator.or_,
+  "xor": operator.xor,
+  "nand": lambda a, b: a.nand(b),
+  "nor": lambda a, b: a.nor(b),
+  "xnor": lambda a, b: a.xnor(b),
+}
+
+# the negation of every binary gate
+NEGATED = {
+  "and": "nand", "or": "nor", "xor": "xnor",
+  "nand": "and", "nor": "or", "xnor": "xor",
+}
+
+class Netlist:
+  """A gate graph built lazily by `NetlistWire`s.
+
+  Gates are numbered in the order they were created, so the inputs of a gate
+  always come before it.  Each gate is a tuple `(op, a, b)` where `op` is
+  "input" (`a` indexes `inputs`), "const" (`a` is 0 or 1), "not" (`b` is
+  unused) or one of `GATES`.
+  Evaluated wires are kept in `values` so that only new gates are evaluated
+  when more outputs are needed (unless they are dropped while evaluating, see
+  `evaluate`).
+  """
+  def __init__(self):
+    self.gates: list[tuple[str, int, int]] = []
+    self.inputs: list[Wire] = []
+    self.values: dict[int, Wire] = {}
+    self.constants: dict[int, int] = {}
+
+  def add(self, op: str, a: int, b: int = -1) -> 'NetlistWire':
+    self.gates.append((op, a, b))
+    return NetlistWire(self, len(self.gates) - 1)
+
+  def input(self, w: Wire) -> 'NetlistWire':
+    """Add an already evaluated wire to the netlist"""
+    self.inputs.append(w)
+    return self.add("input", len(self.inputs) - 1)
+
+  def constant(self, bit: bool) -> 'NetlistWire':
+    """A wire with a known value - it is only evaluated (from the first
+    input) if it is not optimized away"""
+    if int(bit) not in self.constants:
+      self.constants[int(bit)] = self.add("const", int(bit)).index
+
+    return NetlistWire(self, self.constants[int(bit)])
+
+  def circuit(self, c: 'Circuit') -> 'Circuit':
+    """Add the (already evaluated) wires of `c` to the netlist"""
+    return Circuit(list(self.input(w) for w in c.wires))
+
+  def depths(self) -> list[int]:
+    """The number of binary gates on the longest path to each gate - NOT
+    is not bootstrapped so it does not add to the depth"""
+    depths = []
+    for (op, a, b) in self.gates:
+      if op == "input" or op == "const":
+        depths.append(0)
+      elif op == "not":
+        depths.append(depths[a])
+      else:
+        depths.append(max(depths[a], depths[b]) + 1)
+
+    return depths
+
+  def levels(self, gates: Iterable[int] | None = None) -> list[list[int]]:
+    """Group `gates` (by default all gates) by depth - every binary gate at a
+    given depth only depends on gates at lower depths or on NOTs of them"""
+    depths = self.depths()
+    levels: list[list[int]] = []
+    for g in range(len(self.gates)) if gates is None else gates:
+      while len(levels) <= depths[g]:
+        levels.append([])
+      levels[depths[g]].append(g)
+
+    return levels
+
+  def evaluate(self, outputs: list['NetlistWire'], executor: 'GateExecutor | None' = None, drop: bool = False) -> list[Wire]:
+    """Evaluate the gates `outputs` depend on one level at a time, running
+    the binary gates of every level in a single batch on `executor` (by
+    default in this process).  With `drop`, wires other than `outputs` are
+    dropped as soon as every gate using them was evaluated, which saves
+    memory if the netlist is only evaluated once"""
+    if executor is None:
+      executor = GateExecutor()
+
+    keep = set(o.index for o in outputs)
+    needed: set[int] = set()
+    uses: dict[int, int] = {}
+    todo = list(o.index for o in outputs)
+    while todo:
+      g = todo.pop()
+      if g in needed or g in self.values:
+        continue
+      needed.add(g)
+      (op, a, b) = self.gates[g]
+      for i in (a, b) if op in GATES else (a,) if op == "not" else ():
+        uses[i] = uses.get(i, 0) + 1
+        todo.append(i)
+
+    for level in self.levels(sorted(needed)):
+      batch = list(g for g in level if self.gates[g][0] in GATES)
+      results = executor.run(list((self.gates[g][0], self.values[self.gates[g][1]], self.values[self.gates[g][2]]) for g in batch))
+      for (g, w) in zip(batch, results):
+        self.values[g] = w
+
+      # inputs, constants and NOTs are evaluated here, in gate order
+      for g in level:
+        (op, a, _) = self.gates[g]
+        if op == "input":
+          self.values[g] = self.inputs[a]
+        elif op == "const":
+          self.values[g] = self.inputs[0].one() if a else self.inputs[0].zero()
+        elif op == "not":
+          self.values[g] = ~self.values[a]
+
+      for g in level:
+        (op, a, b) = self.gates[g]
+        for i in (a, b) if op in GATES else (a,) if op == "not" else ():
+          uses[i] -= 1
+          if drop and uses[i] == 0 and i in needed and i not in keep:
+            del self.values[i]
+
+    return list(self.values[o.index] for o in outputs)
+
+class NetlistWire(Wire):
+  """Netlist version of `Wire` - operations add gates to the netlist rather
+  than evaluating them"""
+  def __init__(self, netlist: Netlist, index: int):
+    self.netlist = netlist
+    self.index = index
+
+  def __invert__(self) -> 'NetlistWire':
+    return self.netlist.add("not", self.index)
+
+  def __and__(self, other: 'NetlistWire') -> 'NetlistWire':
+    return self.netlist.add("and", self.index, other.index)
+
+  def __or__(self, other: 'NetlistWire') -> 'NetlistWire':
+    return self.netlist.add("or", self.index, other.index)
+
+  def __xor__(self, other: 'NetlistWire') -> 'NetlistWire':
+    return self.netlist.add("xor", self.index, other.index)
+
+  def zero(self) -> 'NetlistWire':
+    return self.netlist.constant(False)
+
+  def one(self) -> 'NetlistWire':
+    return self.netlist.constant(True)
+
+class NetlistEncoder(Encoder):
+  """Netlist version of `Encoder` - bits are encoded with `encoder` and
+  the gates needed to decode a value are evaluated with `executor`"""
+  def __init__(self, encoder: Encoder, executor: 'GateExecutor | None' = None):
+    self.encoder = encoder
+    self.executor = GateExecutor() if executor is None else executor
+    self.netlist = Netlist()
+
+  def encode_bit(self, bit: bool) -> Wire:
+    return self.netlist.input(self.encoder.encode_bit(bit))
+
+  def decode_bit(self, wire: Wire) -> bool:
+    assert isinstance(wire, NetlistWire)
+    return self.encoder.decode_bit(wire.netlist.evaluate([wire], self.executor)[0])
+
+  def decode_int(self, c: 'Circuit') -> int:
+    # evaluate every bit together so that their gates share levels
+    netlist: Netlist = c.wires[0].netlist  # type: ignore
+    assert all(isinstance(w, NetlistWire) and w.netlist is netlist for w in c.wires)
+    return self.encoder.decode_int(Circuit(netlist.evaluate(c.wires, self.executor)))  # type: ignore
+
+class GateExecutor:
+  """Evaluates batches of independent binary gates - this version evaluates
+  them one after another in this process"""
+  def run(self, gates: list[tuple[str, Wire, Wire]]) -> list[Wire]:
+    return list(GATES[op](a, b) for (op, a, b) in gates)
+
+# -- optimization -------------------------------------------------------------
+
+class Folder:
+  """Rebuilds gates into a new netlist, propagating constants, removing
+  double negations and trivial gates (such as `w & ~w`), pushing NOTs out of
+  XORs and reusing any gate that was already built from the same inputs"""
+  def __init__(self, netlist: Netlist):
+    self.netlist = netlist
+    self.built: dict[tuple[str, int, int], int] = {}
+
+  def gate(self, op: str, a: int, b: int = -1) -> int:
+    key = (op, min(a, b), max(a, b)) if op in GATES else (op, a, b)
+    if key not in self.built:
+      self.built[key] = self.netlist.add(op, a, b).index
+
+    return self.built[key]
+
+  def value(self, g: int) -> bool | None:
+    (op, a, _) = self.netlist.gates[g]
+    return a == 1 if op == "const" else None
+
+  def negated(self, g1: int, g2: int) -> bool:
+    return self.netlist.gates[g1] == ("not", g2, -1) or self.netlist.gates[g2] == ("not", g1, -1)
+
+  def negate(self, g: int) -> int:
+    (op, a, _) = self.netlist.gates[g]
+    if op == "const":
+      return self.netlist.constant(a == 0).index
+    if op == "not":
+      return a
+
+    return self.gate("not", g)
+
+  def binary(self, op: str, a: int, b: int) -> int:
+    if op in ("nand", "nor", "xnor"):
+      return self.negate(self.binary(NEGATED[op], a, b))
+
+    (va, vb) = (self.value(a), self.value(b))
+    if va is not None and vb is not None:
+      return self.netlist.constant(GATES[op](PlainWire(va), PlainWire(vb)).wire).index  # type: ignore
+    if va is not None:
+      (a, b, vb) = (b, a, va)
+
+    if vb is not None:
+      if op == "xor":
+        return self.negate(a) if vb else a
+      # x & 1 = x, x & 0 = 0, x | 0 = x, x | 1 = 1
+      return a if vb == (op == "and") else b
+
+    if a == b:
+      return self.netlist.constant(False).index if op == "xor" else a
+    if self.negated(a, b):
+      return self.netlist.constant(op != "and").index
+
+    if op == "xor":
+      # ~x ^ y = ~(x ^ y) so that the NOT can be absorbed or cancelled
+      (opa, xa, _) = self.netlist.gates[a]
+      (opb, xb, _) = self.netlist.gates[b]
+      if opa == "not" and opb == "not":
+        return self.binary("xor", xa, xb)
+      elif opa == "not":
+        return self.negate(self.binary("xor", xa, b))
+      elif opb == "not":
+        return self.negate(self.binary("xor", a, xb))
+
+    return self.gate(op, a, b)
+
+def live_gates(netlist: Netlist, outputs: Iterable[int]) -> list[int]:
+  """The gates `outputs` depend on, in order"""
+  live = set(outputs)
+  for g in range(max(live, default=-1), -1, -1):
+    (op, a, b) = netlist.gates[g]
+    if g in live and (op == "not" or op in GATES):
+      live.add(a)
+      if op in GATES:
+        live.add(b)
+
+  return sorted(live)
+
+def optimize(outputs: list[Wire], costs: dict[str, int] | None = None) -> list[NetlistWire]:
+  """Return wires with the same values as `outputs` (which all belong to the
+  same netlist) in a new netlist with fewer gates: constants are propagated,
+  common subexpressions are shared, gates that do not contribute to an
+  output are removed and NOTs are absorbed into NAND, NOR and XNOR gates.
+  Given the `costs` of every gate of `GATES` and of "not", a NOT is only
+  absorbed if the negated gate does not cost more than the gate and the NOT.
+  The costs must not depend on whether the circuit is being estimated or
+  actually run, so that both evaluate the same gates"""
+  assert len(outputs) > 0 and all(isinstance(o, NetlistWire) for o in outputs)
+  netlist: Netlist = outputs[0].netlist  # type: ignore
+  indices: list[int] = list(o.index for o in outputs)  # type: ignore
+
+  folder = Folder(Netlist())
+  folder.netlist.inputs = netlist.inputs
+  new: dict[int, int] = {}
+  for g in live_gates(netlist, indices):
+    (op, a, b) = netlist.gates[g]
+    if op == "input":
+      new[g] = folder.gate("input", a)
+    elif op == "const":
+      new[g] = folder.netlist.constant(a == 1).index
+    elif op == "not":
+      new[g] = folder.negate(new[a])
+    else:
+      new[g] = folder.binary(op, new[a], new[b])
+
+  # absorb NOTs into the gates that are only used by them
+  folded = folder.netlist
+  live = live_gates(folded, (new[i] for i in indices))
+  uses: dict[int, int] = {}
+  for g in live:
+    (op, a, b) = folded.gates[g]
+    if op == "not" or op in GATES:
+      uses[a] = uses.get(a, 0) + 1
+    if op in GATES:
+      uses[b] = uses.get(b, 0) + 1
+  for i in indices:
+    uses[new[i]] = uses.get(new[i], 0) + 1
+
+  absorbed = set()
+  for g in live:
+    (op, a, _) = folded.gates[g]
+    if op == "not" and folded.gates[a][0] in GATES and uses[a] == 1:
+      gate = folded.gates[a][0]
+      if costs is None or costs[NEGATED[gate]] <= costs[gate] + costs["not"]:
+        absorbed.add(a)
+
+  result = Netlist()
+  result.inputs = netlist.inputs
+  final: dict[int, int] = {}
+  for g in live:
+    (op, a, b) = folded.gates[g]
+    if g in absorbed:
+      continue
+    elif op == "input":
+      final[g] = result.add("input", a).index
+    elif op == "const":
+      final[g] = result.constant(a == 1).index
+    elif op == "not" and a in absorbed:
+      (op, a, b) = folded.gates[a]
+      final[g] = result.add(NEGATED[op], final[a], final[b]).index
+    elif op == "not":
+      final[g] = result.add("not", final[a]).index
+    else:
+      final[g] = result.add(op, final[a], final[b]).index
+
+  return list(NetlistWire(result, final[new[i]]) for i in indices)
+
 # -- unit testing -------------------------------------------------------------
 
+class CountingExecutor(GateExecutor):
+  def __init__(self):
+    self.gates = 0
+
+  def run(self, gates: list[tuple[str, Wire, Wire]]) -> list[Wire]:
+    self.gates += len(gates)
+    return super().run(gates)
+
 class TestImpl(TestCase):
   def setUp(self) -> None:
-    self.encs: list[Encoder] = [PlainEncoder()]
+    self.encs: list[Encoder] = [PlainEncoder(), NetlistEncoder(PlainEncoder())]
 
     if os.environ.get("CIRCUIT_TEST_FHE", "0") == "1":
       cc = openfhe.BinFHEContext()
@@ -474,5 +832,53 @@ class TestImpl(TestCase):
   def test_cond(self):
     self.run_program(self.cond_program)
 
+  def test_netlist_levels(self):
+    enc = NetlistEncoder(PlainEncoder())
+    (a, b) = (enc.encode_bit(True), enc.encode_bit(False))
+    c = (a & b) | ~(a ^ b)
+    assert isinstance(c, NetlistWire)
+    self.assertEqual([[0, 1], [2, 3, 4], [5]], enc.netlist.levels())
+    self.assertEqual({}, enc.netlist.values)
+    self.assertFalse(enc.decode_bit(c))
+    self.assertEqual([0, 1, 2, 3, 4, 5], sorted(enc.netlist.values))
+
+    # evaluated wires are reused
+    executor = CountingExecutor()
+    self.assertTrue(enc.encoder.decode_bit(enc.netlist.evaluate([~c], executor)[0]))
+    self.assertEqual(0, executor.gates)
+
+    enc.netlist.values.clear()
+    enc.netlist.evaluate([c], drop=True)
+    self.assertEqual([5], list(enc.netlist.values))
+
+  def test_optimize(self):
+    enc = NetlistEncoder(PlainEncoder())
+    def gates(ws: list[Wire]) -> int:
+      netlist: Netlist = ws[0].netlist  # type: ignore
+      return sum(1 for g in live_gates(netlist, (w.index for w in ws)) if netlist.gates[g][0] in GATES)  # type: ignore
+
+    for (x, y) in [(5, 10), (254, 10), (7, 7)]:
+      (a, b) = (enc.encode_int(x, 8), enc.encode_int(y, 8))
+      outputs = (a * b).wires + (a + b).wires + (a.eq(a.plain(x)).cond(a, b)).wires + [a.lt(b), ~a.eq(b)]
+      optimized = optimize(outputs)
+      self.assertLess(gates(optimized), gates(outputs))
+      for (w1, w2) in zip(outputs, optimized):
+        self.assertEqual(enc.decode_bit(w1), enc.decode_bit(w2))
+
+    # comparing with a constant is an AND of the bits or their negations
+    a = enc.encode_int(5, 3)
+    outputs = optimize([a.eq(a.plain(5))])
+    self.assertEqual(2, gates(outputs))
+    self.assertTrue(enc.decode_bit(outputs[0]))
+
+    # NOTs are only absorbed into gates that do not cost more
+    (a, b) = (enc.encode_bit(True), enc.encode_bit(False))
+    costs = {"and": 10, "or": 10, "xor": 10, "nand": 10, "nor": 10, "xnor": 12, "not": 1}
+    for (cost, op) in [(11, "xnor"), (12, "not")]:
+      costs["xnor"] = cost
+      (w,) = optimize([a.xnor(b)], costs)
+      self.assertEqual(op, w.netlist.gates[w.index][0])  # type: ignore
+      self.assertFalse(enc.decode_bit(w))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,5 @@
 from typing import Callable
-from benchmark.circuit import BinFHEEncoder, BinFHEWire, Circuit
+from benchmark.circuit import BinFHEEncoder, BinFHEWire, Circuit, Netlist, optimize
 import dioptra.binfhe
 from dioptra.binfhe.analyzer import BinFHEAnalyzer
 from dioptra.estimate import EstimationCases, dioptra_custom_estimation
@@ -10,12 +10,16 @@ def arbitrary_circuit(cc: BinFHEAnalyzer, sz: int) -> Circuit:
   wires = [BinFHEWire(cc, cc.ArbitraryCT()) for _ in range(0, sz)]
   return Circuit(wires)
 
-def binfhe_retrieve_case(bits: int) -> Callable[[BinFHEAnalyzer], None]:
+def binfhe_retrieve_case(bits: int, optimized: bool = False) -> Callable[[BinFHEAnalyzer], None]:
   def run_case(cc: BinFHEAnalyzer):
     db_size = 2 ** bits
     database = list(x * x for x in range(0, db_size))
     query = arbitrary_circuit(cc, bits)
-    pir.pir_binfhe_retrieve(database, query, bits)
+    if optimized:
+      result = optimize(pir.pir_binfhe_retrieve(database, Netlist().circuit(query), bits).wires)
+      result[0].netlist.evaluate(result, drop=True)
+    else:
+      pir.pir_binfhe_retrieve(database, query, bits)
 
   return run_case
 
@@ -23,3 +27,4 @@ def binfhe_retrieve_case(bits: int) -> Callable[[BinFHEAnalyzer], None]:
 def binfhe_pir_estimates(ec: EstimationCases):
   for bits in [4, 6, 8, 10]:
     ec.add_binfhe_case(binfhe_retrieve_case(bits), f"pir_binfhe_lookup [database size {2**bits}]")
+    ec.add_binfhe_case(binfhe_retrieve_case(bits, True), f"pir_binfhe_lookup optimized [database size {2**bits}]")
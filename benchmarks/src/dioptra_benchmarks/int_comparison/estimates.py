@@ -1,6 +1,6 @@
 from typing import Callable
 from dioptra.binfhe.analyzer import BinFHEAnalyzer
-from benchmark.circuit import BinFHEEncoder, Circuit, BinFHEWire, Wire
+from benchmark.circuit import BinFHEEncoder, Circuit, BinFHEWire, Netlist, Wire, optimize
 from dioptra.estimate import EstimationCases, dioptra_custom_estimation
 from compare import any_eq, zip_lt
 
@@ -10,11 +10,17 @@ def mk_arbitrary_circuit(cc: BinFHEAnalyzer, sz: int) -> Circuit:
 def mk_estimation_case(
     op: Callable[[list[Circuit], list[Circuit]], Wire],
     int_sz: int,
-    list_size: int):
+    list_size: int,
+    optimized: bool = False):
   def case(cc: BinFHEAnalyzer):
     cs1 = [mk_arbitrary_circuit(cc, int_sz) for _ in range(0, list_size)]
     cs2 = [mk_arbitrary_circuit(cc, int_sz) for _ in range(0, list_size)]
-    op(cs1, cs2)
+    if optimized:
+      netlist = Netlist()
+      result = optimize([op([netlist.circuit(c) for c in cs1], [netlist.circuit(c) for c in cs2])])
+      result[0].netlist.evaluate(result, drop=True)
+    else:
+      op(cs1, cs2)
   
   return case
 
@@ -25,3 +31,5 @@ def estimates(ec: EstimationCases):
       for list_size in [8, 16, 32]:
         desc = f"{name} int_sz: {int_sz} list_size: {list_size}"
         ec.add_binfhe_case(mk_estimation_case(op, int_sz, list_size), desc)
+        desc = f"{name} optimized int_sz: {int_sz} list_size: {list_size}"
+        ec.add_binfhe_case(mk_estimation_case(op, int_sz, list_size, True), desc)
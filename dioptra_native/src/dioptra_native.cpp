@@ -1,4 +1,5 @@
 #include"pybind11/pybind11.h"
+#include"pybind11/stl.h"
 #include"openfhe.h"
 
 namespace py = pybind11;
@@ -64,7 +65,33 @@ size_t eval_key_vec_size(std::vector<EvalKey<DCRTPoly>> const& eval_keys) {
   for(auto const& ek : eval_keys) {
     size += eval_key_size(ek);
   }
-  return size;  
+  return size;
+}
+
+// The size of the relinearization keys generated for a secret key.
+size_t eval_mult_keys_size(PrivateKey<DCRTPoly> const& sk) {
+  auto const& keys = CryptoContextImpl<DCRTPoly>::GetAllEvalMultKeys();
+  auto it = keys.find(sk->GetKeyTag());
+  if(it == keys.end()) {
+    return 0;
+  }
+  return eval_key_vec_size(it->second);
+}
+
+// The size of every automorphism (i.e. rotation and bootstrapping) key
+// generated for a secret key, by automorphism index.
+std::map<uint32_t, size_t> eval_automorphism_key_sizes(PrivateKey<DCRTPoly> const& sk) {
+  std::map<uint32_t, size_t> sizes;
+  auto const& keys = CryptoContextImpl<DCRTPoly>::GetAllEvalAutomorphismKeys();
+  auto it = keys.find(sk->GetKeyTag());
+  if(it == keys.end() || !it->second) {
+    return sizes;
+  }
+
+  for(auto const& [index, ek] : *it->second) {
+    sizes[index] = eval_key_size(ek);
+  }
+  return sizes;
 }
 
 PYBIND11_MODULE(dioptra_native, m) {
@@ -72,5 +99,9 @@ PYBIND11_MODULE(dioptra_native, m) {
   m.def("ciphertext_size", &ciphertext_size, "Compute the size of a ciphertext");
   m.def("plaintext_size", &plaintext_size, "Compute the size of a plaintext");
   m.def("lwe_ciphertext_size", &lwe_ciphertext_size, "Compute the size of an LWECiphertext");
+  m.def("eval_key_size", &eval_key_size, "Compute the size of an evaluation key");
+  m.def("eval_key_vec_size", &eval_key_vec_size, "Compute the total size of a list of evaluation keys");
+  m.def("eval_mult_keys_size", &eval_mult_keys_size, "Compute the size of the multiplication keys of a secret key");
+  m.def("eval_automorphism_key_sizes", &eval_automorphism_key_sizes, "Compute the sizes of the automorphism keys of a secret key");
 }
 
@@ -1,15 +1,18 @@
+import threading
 import weakref
-from typing import Callable
+from concurrent.futures import ALL_COMPLETED, Future
+from typing import Any, Callable, Iterable, Iterator
 
 import openfhe
 
 from dioptra.binfhe.params import BinFHEParams
 from dioptra.binfhe.value import LWECiphertext, LWEPrivateKey
-from dioptra.utils import code_loc
+from dioptra.utils import code_loc, threads
 from dioptra.utils.code_loc import Frame, TraceLoc
 from dioptra.utils.error import NotSupportedException
 from dioptra.utils.measurement import BPS
 from dioptra.utils.network import NetworkModel
+from dioptra.utils.threads import VirtualClocks, VirtualThread, VirtualTimeExecutor
 
 
 class BinFHEAnalysisBase:
@@ -129,11 +132,17 @@ class BinFHEAnalyzer:
         params: BinFHEParams,
         analysis: BinFHEAnalysisBase,
         trace: TraceLoc | None = None,
+        clocks: VirtualClocks | None = None,
     ) -> None:
         self.params = params
         self.analysis = analysis
         self.trace = trace
 
+        # gates may be evaluated from several threads (see `ThreadPoolExecutor`),
+        # so the analysis is only ever called by one at a time
+        self.lock = threading.RLock()
+        self.clocks = VirtualClocks() if clocks is None else clocks
+
     def _unsupported_feature_msg(self, feature: str) -> str:
         return f"{feature} is not supported for estimation in the current version of dioptra"
 
@@ -154,7 +163,8 @@ class BinFHEAnalyzer:
     def Decrypt(self, sk: LWEPrivateKey, ct: LWECiphertext, p: int = 4) -> int:
         loc = code_loc.calling_frame()
         self._check_plaintext_modulus(p, loc)
-        self.analysis.trace_decrypt(sk, ct, loc)
+        with self.lock:
+            self.analysis.trace_decrypt(sk, ct, loc)
         return ct.value  # TODO: value is not correct
 
     def Encrypt(
@@ -176,7 +186,8 @@ class BinFHEAnalyzer:
         ct = LWECiphertext(
             length=self.params.n, modulus=self.params.q, value=m, pt_mod=p
         )
-        self.analysis.trace_encrypt(ct, sk, loc)
+        with self.lock:
+            self.analysis.trace_encrypt(ct, sk, loc)
         return ct
 
     def _eval_gate_plain(self, gate: openfhe.BINGATE, i1: int, i2: int) -> int:
@@ -204,8 +215,9 @@ class BinFHEAnalyzer:
         self, gate: openfhe.BINGATE, ct1: LWECiphertext, ct2: LWECiphertext
     ) -> LWECiphertext:
         loc = code_loc.calling_frame()
-        dest = self._mk_ct(self._eval_gate_plain(gate, ct1.value, ct2.value), loc)
-        self.analysis.trace_eval_gate(gate, dest, ct1, ct2, loc)
+        with self.lock:
+            dest = self._mk_ct(self._eval_gate_plain(gate, ct1.value, ct2.value), loc)
+            self.analysis.trace_eval_gate(gate, dest, ct1, ct2, loc)
         return dest
 
     # TODO: need to figure out how long the resulting list is - ask Hilder
@@ -220,8 +232,9 @@ class BinFHEAnalyzer:
 
     def EvalNOT(self, ct: LWECiphertext) -> LWECiphertext:
         loc = code_loc.calling_frame()
-        dest = self._mk_ct(~ct.value & 1, loc)
-        self.analysis.trace_eval_not(dest, ct, loc)
+        with self.lock:
+            dest = self._mk_ct(~ct.value & 1, loc)
+            self.analysis.trace_eval_not(dest, ct, loc)
         return dest
 
     def EvalSign(self, ct: LWECiphertext) -> LWECiphertext:
@@ -252,6 +265,33 @@ class BinFHEAnalyzer:
         nm = NetworkModel(send_bps.bps, recv_bps.bps, latency=latency_ms * 10**6)
         return BinFHENetwork(self, nm)
 
+    def ThreadPoolExecutor(
+        self, max_workers: int | None = None, **kwargs: Any
+    ) -> VirtualTimeExecutor:
+        """Stand-in for `concurrent.futures.ThreadPoolExecutor`, whose tasks run
+        concurrently in the estimate (see `Analyzer.ThreadPoolExecutor`)."""
+        return VirtualTimeExecutor(self.clocks, max_workers)
+
+    def Thread(self, *args: Any, **kwargs: Any) -> VirtualThread:
+        """Stand-in for `threading.Thread` (see `Analyzer.Thread`)."""
+        return VirtualThread(self.clocks, *args, **kwargs)
+
+    def wait(
+        self,
+        fs: Iterable[Future],
+        timeout: float | None = None,
+        return_when: str = ALL_COMPLETED,
+    ) -> tuple[set[Future], set[Future]]:
+        """Stand-in for `concurrent.futures.wait` (see `Analyzer.wait`)."""
+        return threads.wait(fs, timeout, return_when)
+
+    def as_completed(
+        self, fs: Iterable[Future], timeout: float | None = None
+    ) -> Iterator[Future]:
+        """Stand-in for `concurrent.futures.as_completed` (see
+        `Analyzer.as_completed`)."""
+        return threads.as_completed(fs, timeout)
+
     def ArbitraryCT(self) -> LWECiphertext:
         return LWECiphertext(
             length=self.params.n, modulus=self.params.q, value=0, pt_mod=4
@@ -261,16 +301,19 @@ class BinFHEAnalyzer:
         loc = None
         if self.trace is not None:
             loc = self.trace.get_current_frame()
-        self.analysis.trace_dealloc_ct(vid, loc)
+        with self.lock:
+            self.analysis.trace_dealloc_ct(vid, loc)
 
     def _mk_ct(self, value: int, loc: Frame | None) -> LWECiphertext:
         new = LWECiphertext(self.params.n, self.params.q, value, 4)
         self.analysis.trace_alloc_ct(new, loc)
-        new._set_finalizer(weakref.finalize(new, self._dealloc_ct, new.id))
+        new._set_finalizer(weakref.finalize(new, self._dealloc_ct, new.value_id))
         return new
 
     def _send_ciphertext(self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None):
-        self.analysis.trace_send_ct(ct, nm, loc)
+        with self.lock:
+            self.analysis.trace_send_ct(ct, nm, loc)
 
     def _recv_ciphertext(self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None):
-        self.analysis.trace_recv_ct(ct, nm, loc)
+        with self.lock:
+            self.analysis.trace_recv_ct(ct, nm, loc)
@@ -9,7 +9,7 @@ import psutil
 import dioptra_native
 from dioptra.binfhe.event import BinFHEEvent, BinFHEEventKind
 from dioptra.binfhe.params import BinFHEParams
-from dioptra.utils.measurement import format_ns
+from dioptra.utils.measurement import format_ns, merge_setup_memory
 
 
 class BinFHECalibrationData:
@@ -32,6 +32,14 @@ class BinFHECalibrationData:
     def set_setup_memory_estimate(self, size: int) -> None:
         self.setup_memory_size = size
 
+    def merge(self, other: "BinFHECalibrationData") -> None:
+        """Add the samples of another calibration of the same context."""
+        for e, runtimes in other.runtime_samples.items():
+            self.runtime_samples.setdefault(e, []).extend(runtimes)
+        self.setup_memory_size = merge_setup_memory(
+            self.setup_memory_size, other.setup_memory_size
+        )
+
     def avg_case(self) -> dict[BinFHEEvent, int]:
         return dict([(e, sum(s) // len(s)) for (e, s) in self.runtime_samples.items()])
 
@@ -0,0 +1,119 @@
+"""The gate circuit of a BinFHE estimation case.
+
+Every binary gate bootstraps its result, so the cost of a BinFHE case is
+dominated by its gates, and how fast it can run on several bootstrapping
+workers depends on how they depend on each other. `GateGraph` records the
+dataflow graph of the case (from the values every operation uses and
+produces) with the same costs as the runtime estimate, along with the number
+of gates of every kind, the depth of every value in bootstrapped gates, and the
+number of gates at every depth (the width profile). Values that were not
+produced by an operation (such as arbitrary ciphertexts) have depth 0.
+"""
+
+import openfhe
+
+from dioptra.binfhe.event import BinFHEEvent, BinFHEEventKind
+from dioptra.binfhe.runtime import RuntimeEstimate
+from dioptra.binfhe.value import LWECiphertext, LWEPrivateKey
+from dioptra.report.runtime import RuntimeReport
+from dioptra.utils.code_loc import Frame
+from dioptra.utils.network import NetworkModel
+from dioptra.utils.schedule import TaskGraph
+
+
+class GateGraph(RuntimeEstimate):
+    def __init__(self, ort: dict[BinFHEEvent, int], ct_size: int) -> None:
+        super().__init__(ort, ct_size, RuntimeReport())
+        self.graph = TaskGraph()
+        self.gate_counts: dict[BinFHEEventKind, int] = {}
+
+        # the number of gates at every depth (starting at depth 1)
+        self.widths: list[int] = []
+
+        # the operation that produced every live ciphertext, and its depth
+        self.producer: dict[int, tuple[int, int]] = {}
+
+        # the cost of the operation being traced
+        self.cost = 0
+
+    def trace_evt(self, evt: BinFHEEvent, loc: Frame | None):
+        runtime = self.kind_runtimes[evt.kind.value]
+        if runtime is None:
+            raise NotImplementedError(f"No runtime found for event: {evt}")
+        self.cost += runtime
+
+    def node(
+        self, dest: LWECiphertext | None, *args: LWECiphertext, gate: bool = False
+    ) -> None:
+        deps = []
+        depth = 0
+        for arg in args:
+            entry = self.producer.get(arg.value_id)
+            if entry is not None:
+                deps.append(entry[0])
+                depth = max(depth, entry[1])
+
+        node = self.graph.add(self.cost, deps)
+        self.cost = 0
+        if gate:
+            depth += 1
+            if len(self.widths) < depth:
+                self.widths.append(0)
+            self.widths[depth - 1] += 1
+
+        if dest is not None:
+            self.producer[dest.value_id] = (node, depth)
+
+    @property
+    def depth(self) -> int:
+        return len(self.widths)
+
+    @property
+    def gates(self) -> int:
+        return sum(self.widths)
+
+    def trace_encrypt(self, dest: LWECiphertext, sk: LWEPrivateKey, loc: Frame | None):
+        super().trace_encrypt(dest, sk, loc)
+        self.node(dest)
+
+    def trace_decrypt(self, sk: LWEPrivateKey, ct: LWECiphertext, loc: Frame | None):
+        super().trace_decrypt(sk, ct, loc)
+        self.node(None, ct)
+
+    def trace_keygen(self, key: LWEPrivateKey, loc: Frame | None):
+        super().trace_keygen(key, loc)
+        self.node(None)
+
+    def trace_eval_gate(
+        self,
+        gate: openfhe.BINGATE,
+        dest: LWECiphertext,
+        c1: LWECiphertext,
+        c2: LWECiphertext,
+        loc: Frame | None,
+    ):
+        super().trace_eval_gate(gate, dest, c1, c2, loc)
+        kind = BinFHEEvent.bingate_to_event()[gate].kind
+        self.gate_counts[kind] = self.gate_counts.get(kind, 0) + 1
+        self.node(dest, c1, c2, gate=True)
+
+    def trace_eval_not(self, dest: LWECiphertext, c: LWECiphertext, loc: Frame | None):
+        # negation does not bootstrap, so it does not add to the depth
+        super().trace_eval_not(dest, c, loc)
+        self.node(dest, c)
+
+    def trace_send_ct(
+        self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None
+    ) -> None:
+        self.cost += nm.send_latency_ns(self.ct_size)
+        self.node(None, ct)
+
+    def trace_recv_ct(
+        self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None
+    ) -> None:
+        # the ciphertext is only available once it has been received
+        self.cost += nm.recv_latency_ns(self.ct_size)
+        self.node(ct, ct)
+
+    def trace_dealloc_ct(self, vid: int, loc: Frame | None) -> None:
+        self.producer.pop(vid, None)
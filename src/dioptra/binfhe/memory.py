@@ -11,7 +11,9 @@ class BinFHEMemoryEstimate(BinFHEAnalysisBase):
         self.ct_size = ct_size
 
     def trace_alloc_ct(self, dest: LWECiphertext, loc: Frame | None) -> None:
-        self.report.record_alloc(AllocationType.CIPHERTEXT, dest.id, self.ct_size, loc)
+        self.report.record_alloc(
+            AllocationType.CIPHERTEXT, dest.value_id, self.ct_size, loc
+        )
 
     def trace_dealloc_ct(self, vid: int, loc: Frame | None) -> None:
         self.report.record_dealloc(AllocationType.PLAINTEXT, vid, self.ct_size, loc)
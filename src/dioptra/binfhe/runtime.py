@@ -16,9 +16,18 @@ class RuntimeEstimate(BinFHEAnalysisBase):
         self.runtime_report = report
         self.ct_size = ct_size
 
+        # runtimes indexed by event kind, so a lookup is a single list access
+        self.kind_runtimes: list[int | None] = [None] * (
+            max(k.value for k in BinFHEEventKind) + 1
+        )
+        for evt, runtime in ort.items():
+            self.kind_runtimes[evt.kind.value] = runtime
+
     def trace_evt(self, evt: BinFHEEvent, loc: Frame | None):
-        runtime = self.operation_runtime_table[evt]
-        self.runtime_report.runtime_estimate(loc, runtime)
+        runtime = self.kind_runtimes[evt.kind.value]
+        if runtime is None:
+            raise NotImplementedError(f"No runtime found for event: {evt}")
+        self.runtime_report.runtime_op(evt.kind.name, loc, runtime)
 
     def trace_encrypt(self, dest: LWECiphertext, sk: LWEPrivateKey, loc: Frame | None):
         self.trace_evt(BinFHEEvent(BinFHEEventKind.ENCRYPT), loc)
@@ -52,10 +61,10 @@ class RuntimeEstimate(BinFHEAnalysisBase):
         self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None
     ) -> None:
         runtime = nm.send_latency_ns(self.ct_size)
-        self.runtime_report.runtime_estimate(loc, runtime)
+        self.runtime_report.runtime_op("SendCiphertext", loc, runtime, "network")
 
     def trace_recv_ct(
         self, ct: LWECiphertext, nm: NetworkModel, loc: Frame | None
     ) -> None:
         runtime = nm.recv_latency_ns(self.ct_size)
-        self.runtime_report.runtime_estimate(loc, runtime)
+        self.runtime_report.runtime_op("RecvCiphertext", loc, runtime, "network")
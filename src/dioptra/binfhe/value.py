@@ -1,12 +1,13 @@
+import itertools
 import weakref
 
 
 class Value:
-    id: int = 0
+    # `next` on a count is atomic, so values can be created from any thread
+    _ids = itertools.count(1)
 
     def __init__(self):
-        Value.id += 1
-        self.value_id = Value.id
+        self.value_id = next(Value._ids)
 
 
 class LWECiphertext(Value):
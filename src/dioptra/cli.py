@@ -11,12 +11,20 @@ from pathlib import Path
 
 import click
 
-from dioptra.context.calibrate import calibrate_main
+from dioptra.context.calibrate import (
+    calibrate_all_main,
+    calibrate_main,
+    sampling_policy,
+)
+from dioptra.context.convert import convert_main
 from dioptra.context.list import list_main
 from dioptra.estimate.annotate import annotate_main
+from dioptra.estimate.flamegraph import flamegraph_main
+from dioptra.estimate.record import price_main, record_main
 from dioptra.estimate.render import render_main
 from dioptra.estimate.report import report_main
 from dioptra.estimate.timeline import timeline_main
+from dioptra.pke.calibration import EventKind
 
 
 @click.group()
@@ -51,14 +59,160 @@ def estimate() -> None:
     help="Calibration data file to use for estimates.",
 )
 @click.option("--print-meta", is_flag=True, help="Print calibration metadata before report (if available)")
-def report(file: Path, calibration_data: Path, print_meta: bool) -> None:
+@click.option(
+    "--batch",
+    is_flag=True,
+    help="Record PKE cases as operation traces and analyze them afterwards "
+    "(the same analysis 'estimate record' and 'estimate price' use; not faster).",
+)
+@click.option(
+    "--sample-loops",
+    is_flag=True,
+    help="Extrapolate uniform 'Repeat' loops of PKE cases from a few iterations.",
+)
+@click.option(
+    "--no-values",
+    is_flag=True,
+    help="Do not simulate plaintext slot values in PKE cases (cost only).",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Estimate PKE runtimes at this number of OpenMP threads, interpolating "
+    "between the thread counts of the calibration.",
+)
+@click.option(
+    "--memory-peak",
+    is_flag=True,
+    help="Break the peak memory usage of every case down by allocation site.",
+)
+@click.option(
+    "--memory-curve",
+    type=click.Path(dir_okay=False, writable=True),
+    required=False,
+    help="File to which the memory usage of every case over (estimated) time "
+    "should be written, as JSON.",
+)
+@click.option(
+    "--liveness",
+    is_flag=True,
+    help="Estimate the peak memory of PKE cases if values were freed right after "
+    "their last use, and list the sites holding values the longest past it.",
+)
+@click.option(
+    "--cores",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Estimate the wall time of cases on this many cores, running "
+    "independent operations (or BinFHE gates) concurrently.",
+)
+def report(
+    file: Path,
+    calibration_data: Path,
+    print_meta: bool,
+    batch: bool,
+    sample_loops: bool,
+    no_values: bool,
+    threads: int | None,
+    memory_peak: bool,
+    memory_curve: Path | None,
+    liveness: bool,
+    cores: int | None,
+) -> None:
     """Report runtime and memory performance estimates for all estimation cases.
 
     FILE is the Python file in which to look for estimation cases (functions
     decorated with "@dioptra_pke_estimation()" or
     "@dioptra_binfhe_estimation()").
     """
-    report_main(str(calibration_data), [str(file)], print_meta)
+    if batch and (memory_peak or memory_curve is not None or liveness):
+        raise click.UsageError(
+            "--memory-peak, --memory-curve and --liveness need allocation sites,"
+            " which --batch does not record"
+        )
+    if sample_loops and liveness:
+        raise click.UsageError("--liveness cannot extrapolate sampled loops")
+    if cores is not None and (batch or sample_loops):
+        raise click.UsageError(
+            "--cores needs the values every operation uses, and cannot be used"
+            " with --batch or --sample-loops"
+        )
+
+    report_main(
+        str(calibration_data),
+        [str(file)],
+        print_meta,
+        batch,
+        sample_loops,
+        track_values=not no_values,
+        threads=threads,
+        memory_peak=memory_peak,
+        memory_curve=None if memory_curve is None else str(memory_curve),
+        liveness=liveness,
+        cores=cores,
+    )
+
+
+@estimate.command()
+@click.argument("file", type=click.Path(exists=True), required=True)
+@click.option(
+    "--calibration-data",
+    "-cd",
+    type=click.Path(exists=True),
+    required=True,
+    help="Calibration data file whose scheme model is used for the trace.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, writable=True),
+    required=True,
+    help="File to which the recorded traces should be written.",
+)
+def record(file: Path, calibration_data: Path, output: Path) -> None:
+    """Record the operations of all PKE estimation cases to a trace file.
+
+    FILE is the Python file in which to look for estimation cases (functions
+    decorated with "@dioptra_pke_estimation()"). The resulting trace can be
+    priced against any calibration of the same scheme with "dioptra estimate
+    price", without running the cases again.
+    """
+    record_main(str(calibration_data), [str(file)], str(output))
+
+
+@estimate.command()
+@click.option(
+    "--trace",
+    "-t",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="Trace file produced by \"dioptra estimate record\".",
+)
+@click.option(
+    "--calibration-data",
+    "-cd",
+    type=click.Path(exists=True),
+    required=True,
+    multiple=True,
+    help="Calibration data file to use for estimates (can be repeated).",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Estimate runtimes at this number of OpenMP threads, interpolating "
+    "between the thread counts of each calibration.",
+)
+def price(
+    trace: Path, calibration_data: tuple[Path, ...], threads: int | None
+) -> None:
+    """Report runtime and memory estimates of recorded estimation cases.
+
+    Produces a report for every given calibration from the operations in the
+    trace, without importing or running the estimation cases.
+    """
+    price_main(str(trace), [str(cd) for cd in calibration_data], threads)
 
 
 @estimate.command()
@@ -91,14 +245,59 @@ def report(file: Path, calibration_data: Path, print_meta: bool) -> None:
     default=Path("."),
     help="Root directory of files to annotate - files outside this root are not annotated."    
 )
-def annotate(file: Path, calibration_data: Path, name: str, output: Path, annotation_root: Path) -> None:
+@click.option(
+    "--memory-peak",
+    is_flag=True,
+    help="Also annotate lines with the memory they hold at the case's peak usage.",
+)
+def annotate(file: Path, calibration_data: Path, name: str, output: Path, annotation_root: Path, memory_peak: bool) -> None:
     """Annotate Python source files with estimated OpenFHE operation runtimes.
 
     FILE is the Python file in which to look for estimation cases (functions
     decorated with "@dioptra_pke_estimation()" or
     "@dioptra_binfhe_estimation()").
     """
-    annotate_main(str(calibration_data), str(file), name, str(output), str(annotation_root))
+    annotate_main(str(calibration_data), str(file), name, str(output), str(annotation_root), memory_peak)
+
+
+@estimate.command()
+@click.argument("file", type=click.Path(exists=True), required=True)
+@click.option(
+    "--calibration-data",
+    "-cd",
+    type=click.Path(exists=True),
+    required=True,
+    help="Calibration data file to use for estimates.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(file_okay=True, dir_okay=False, writable=True, path_type=Path),
+    required=True,
+    help="File to which the flame graph should be written.",
+)
+@click.option(
+    "--name",
+    "-n",
+    type=str,
+    required=True,
+    help="Name of the estimation case to profile.",
+)
+@click.option(
+    "--format",
+    type=click.Choice(["folded", "speedscope"]),
+    default="folded",
+    help="Folded stacks (as read by flamegraph.pl and most flame graph tools), "
+    "or a speedscope JSON profile.",
+)
+def flamegraph(file: Path, calibration_data: Path, name: str, output: Path, format: str) -> None:
+    """Write a flame graph of the estimated runtime of an estimation case.
+
+    FILE is the Python file in which to look for estimation cases (functions
+    decorated with "@dioptra_pke_estimation()" or
+    "@dioptra_binfhe_estimation()").
+    """
+    flamegraph_main(str(calibration_data), str(file), name, str(output), format)
 
 
 @cli.group()
@@ -142,14 +341,210 @@ def context() -> None:
     required=False,
     help="Text file of metadata to add to the resulting calibration file"
 )
-def calibrate(file: Path, name: str, output: Path, sample_count: int, meta_file: Path|None):
+@click.option(
+    "--plan",
+    type=click.Choice(["full", "sparse", "quick"]),
+    default="full",
+    help="Which PKE level pairs to measure; sparse and quick plans fill in the "
+    "rest with a fitted cost model (default: full, the only plan for BFV).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to measure with, each on its own cores "
+    "(default: 1).",
+)
+@click.option(
+    "--target-ci",
+    type=click.FloatRange(min=0, min_open=True),
+    required=False,
+    help="Sample each PKE event until the 95% confidence interval of its mean "
+    "runtime is within this many percent; --sample-count is then the minimum.",
+)
+@click.option(
+    "--time-budget",
+    type=click.FloatRange(min=0),
+    required=False,
+    help="With --target-ci, the most time (in seconds) to spend sampling each "
+    "event.",
+)
+@click.option(
+    "--top-up",
+    is_flag=True,
+    help="Add the new samples to the calibration data already in the output "
+    "file(s), rather than replacing it.",
+)
+@click.option(
+    "--events",
+    type=click.Choice([kind.name for kind in EventKind], case_sensitive=False),
+    multiple=True,
+    help="Only measure these kinds of PKE events (can be given several times).",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Measure PKE runtimes with this many OpenMP threads (can be given "
+    "several times, to sweep thread counts for \"estimate report --threads\"; "
+    "not with --jobs).",
+)
+def calibrate(
+    file: Path,
+    name: str,
+    output: Path,
+    sample_count: int,
+    meta_file: Path | None,
+    plan: str,
+    jobs: int,
+    target_ci: float | None,
+    time_budget: float | None,
+    top_up: bool,
+    events: tuple[str, ...],
+    threads: tuple[int, ...],
+):
     """Generate calibration data for a decorated context function.
 
     FILE is the Python file in which to look for contexts (functions decorated
     with "@dioptra_pke_context()" or "@dioptra_binfhe_context()".)
     """
     meta_file_arg = str(meta_file) if meta_file is not None else None
-    calibrate_main([str(file)], name, str(output), sample_count, meta_file=meta_file_arg)
+    calibrate_main(
+        [str(file)],
+        name,
+        str(output),
+        sample_count,
+        meta_file=meta_file_arg,
+        plan=plan,
+        jobs=jobs,
+        sampling=sampling_policy(sample_count, target_ci, time_budget),
+        top_up=top_up,
+        events={EventKind[e.upper()] for e in events} or None,
+        threads=[*threads] or None,
+    )
+
+
+@context.command("calibrate-all")
+@click.argument("file", type=click.Path(exists=True), required=True)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(file_okay=False),
+    required=True,
+    help="Directory to which calibration data should be written.",
+)
+@click.option(
+    "--sample-count",
+    "-sc",
+    type=int,
+    default=5,
+    help="Number of samples to take (default: 5).",
+)
+@click.option(
+    "--meta-file",
+    type=click.Path(exists=True),
+    required=False,
+    help="Text file of metadata to add to the resulting calibration files",
+)
+@click.option(
+    "--plan",
+    type=click.Choice(["full", "sparse", "quick"]),
+    default="full",
+    help="Which PKE level pairs to measure (default: full, the only plan for BFV).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to measure with, each on its own cores "
+    "(default: 1).",
+)
+@click.option(
+    "--target-ci",
+    type=click.FloatRange(min=0, min_open=True),
+    required=False,
+    help="Sample each PKE event until the 95% confidence interval of its mean "
+    "runtime is within this many percent; --sample-count is then the minimum.",
+)
+@click.option(
+    "--time-budget",
+    type=click.FloatRange(min=0),
+    required=False,
+    help="With --target-ci, the most time (in seconds) to spend sampling each "
+    "event.",
+)
+@click.option(
+    "--top-up",
+    is_flag=True,
+    help="Add the new samples to the calibration data already in the output "
+    "file(s), rather than replacing it.",
+)
+@click.option(
+    "--events",
+    type=click.Choice([kind.name for kind in EventKind], case_sensitive=False),
+    multiple=True,
+    help="Only measure these kinds of PKE events (can be given several times).",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help="Measure PKE runtimes with this many OpenMP threads (can be given "
+    "several times, to sweep thread counts for \"estimate report --threads\"; "
+    "not with --jobs).",
+)
+def calibrate_all(
+    file: Path,
+    output: Path,
+    sample_count: int,
+    meta_file: Path | None,
+    plan: str,
+    jobs: int,
+    target_ci: float | None,
+    time_budget: float | None,
+    top_up: bool,
+    events: tuple[str, ...],
+    threads: tuple[int, ...],
+):
+    """Generate calibration data for all decorated context functions.
+
+    FILE is the Python file in which to look for contexts. The calibration data
+    of each context is written to OUTPUT/<context name>.dc. With several jobs,
+    the measurements of all contexts are spread over the same workers.
+    """
+    meta_file_arg = str(meta_file) if meta_file is not None else None
+    calibrate_all_main(
+        [str(file)],
+        str(output),
+        sample_count,
+        meta_file=meta_file_arg,
+        plan=plan,
+        jobs=jobs,
+        sampling=sampling_policy(sample_count, target_ci, time_budget),
+        top_up=top_up,
+        events={EventKind[e.upper()] for e in events} or None,
+        threads=[*threads] or None,
+    )
+
+
+@context.command()
+@click.argument("input", type=click.Path(exists=True, dir_okay=False), required=True)
+@click.argument("output", type=click.Path(dir_okay=False), required=True)
+@click.option(
+    "--format",
+    type=click.Choice(["json", "binary"]),
+    required=False,
+    help="Format to convert to (default: the one INPUT is not in).",
+)
+def convert(input: Path, output: Path, format: str | None):
+    """Convert calibration data between the JSON and binary formats.
+
+    The binary format (for PKE calibrations) loads much faster, as it can be
+    memory-mapped. Estimates accept calibration data in either format.
+    """
+    convert_main(str(input), str(output), format)
 
 
 @context.command()
@@ -185,16 +580,29 @@ def list(file: Path):
     required=True,
     help="Name of the estimation case to render.",
 )
-def render(file: Path, calibration_data: Path, name: str, output: Path) -> None:
+@click.option(
+    "--memory-peak",
+    is_flag=True,
+    help="Also show the memory lines hold at the case's peak usage, and its "
+    "memory usage over time.",
+)
+def render(file: Path, calibration_data: Path, name: str, output: Path, memory_peak: bool) -> None:
     """Render a website for an estimation case.
 
     FILE is the Python file in which to look for estimation cases (functions
     decorated with "@diotpra_estimation()" or "@dioptra_binfhe_estimation()").
     """
-    render_main(str(calibration_data), str(file), name, str(output))
+    render_main(str(calibration_data), str(file), name, str(output), memory_peak)
 
 @estimate.command()
 @click.argument("file", type=click.Path(exists=True, dir_okay=False), required=True)
 @click.option("--env", "-e", type=click.Path(exists=True, dir_okay=False), required=True)
-def timeline(file: Path, env: Path):
-    timeline_main(Path(env), [Path(file)])
+@click.option(
+    "--trace-events",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    required=False,
+    help="File to which the simulated timeline of every operation should be "
+    "written, as Chrome trace events (which Perfetto can open).",
+)
+def timeline(file: Path, env: Path, trace_events: Path | None):
+    timeline_main(Path(env), [Path(file)], trace_events)
@@ -1,41 +1,238 @@
 from collections import OrderedDict
+import os
 import sys
 from typing import Any
 
-from dioptra.binfhe.calibration import BinFHECalibration
+from dioptra.binfhe.calibration import BinFHECalibration, BinFHECalibrationData
 from dioptra.context import context_functions
-from dioptra.pke.calibration import PKECalibration
-from dioptra.utils.file_loading import load_files
+from dioptra.context.context_function import ContextFunction
+from dioptra.context.scheduler import CalibrationData, calibrate_parallel
+from dioptra.pke.calibration import (
+    CalibrationJournal,
+    CalibrationPlan,
+    EventKind,
+    PKECalibration,
+    PKECalibrationData,
+)
+from dioptra.pke.calibration_file import (
+    is_binary_calibration,
+    write_binary_calibration,
+)
+from dioptra.utils.file_loading import load_calibration_data, load_files
+from dioptra.utils.sampling import SamplingPolicy
 from dioptra.utils.scheme_type import SchemeType
 
 
 def calibrate_main(
-    files: list[str], name: str, outfile: str, samples: int = 5, quiet: bool = False, meta_file = str | None
+    files: list[str],
+    name: str,
+    outfile: str,
+    samples: int = 5,
+    quiet: bool = False,
+    meta_file: str | None = None,
+    plan: str = "full",
+    jobs: int = 1,
+    sampling: SamplingPolicy | None = None,
+    top_up: bool = False,
+    events: set[EventKind] | None = None,
+    threads: list[int] | None = None,
 ):
     load_files(files)
-
-    meta_file_data = None
-    if meta_file is not None:
-        with open(meta_file) as f:
-            meta_file_data = f.read()
-
+    meta_file_data = read_meta_file(meta_file)
 
     cf = context_functions.get(name, None)
     if cf is None:
         print(f"Calibration failed: no context named '{name}' found", file=sys.stderr)
         sys.exit(-1)
 
+    if jobs > 1 or threads:
+        calibrate_contexts_parallel(
+            files,
+            {name: outfile},
+            samples,
+            quiet,
+            meta_file_data,
+            plan,
+            jobs,
+            sampling,
+            top_up,
+            events,
+            threads,
+        )
+    else:
+        calibrate_context(
+            cf,
+            outfile,
+            samples,
+            quiet,
+            meta_file_data,
+            plan,
+            sampling,
+            top_up,
+            events,
+        )
+
+
+def calibrate_all_main(
+    files: list[str],
+    outdir: str,
+    samples: int = 5,
+    quiet: bool = False,
+    meta_file: str | None = None,
+    plan: str = "full",
+    jobs: int = 1,
+    sampling: SamplingPolicy | None = None,
+    top_up: bool = False,
+    events: set[EventKind] | None = None,
+    threads: list[int] | None = None,
+):
+    """Calibrate all contexts defined in `files`, writing the calibration data
+    of each to `outdir`, in a file named after the context."""
+    load_files(files)
+    meta_file_data = read_meta_file(meta_file)
+
+    os.makedirs(outdir, exist_ok=True)
+    outfiles = {
+        name: os.path.join(outdir, f"{name}.dc") for name in context_functions.keys()
+    }
+
+    if jobs > 1 or threads:
+        calibrate_contexts_parallel(
+            files,
+            outfiles,
+            samples,
+            quiet,
+            meta_file_data,
+            plan,
+            jobs,
+            sampling,
+            top_up,
+            events,
+            threads,
+        )
+    else:
+        for name, outfile in outfiles.items():
+            cf = context_functions[name]
+            calibrate_context(
+                cf,
+                outfile,
+                samples,
+                quiet,
+                meta_file_data,
+                plan,
+                sampling,
+                top_up,
+                events,
+            )
+
+
+def sampling_policy(
+    samples: int, target_ci: float | None, time_budget: float | None
+) -> SamplingPolicy | None:
+    """The sampling policy for PKE calibrations given on the command line:
+    with a `target_ci` (in percent), `samples` is the minimum number of
+    samples, and `time_budget` (in seconds) bounds the time spent on each
+    event."""
+    if target_ci is None:
+        return None
+
+    budget_ns = None if time_budget is None else int(time_budget * 1e9)
+    return SamplingPolicy.adaptive(
+        target_ci / 100, budget_ns, min_samples=max(samples, 2)
+    )
+
+
+def journal_file(outfile: str, threads: int | None = None) -> str:
+    """Where the PKE calibration written to `outfile` (at `threads` threads,
+    when sweeping thread counts) is checkpointed while it runs, and resumed
+    from if it was interrupted."""
+    if threads is None:
+        return outfile + ".journal"
+    return f"{outfile}.{threads}threads.journal"
+
+
+def write_calibration(
+    data: PKECalibrationData | BinFHECalibrationData, outfile: str, top_up: bool
+) -> None:
+    """Write calibration data to `outfile`, adding it to the calibration data
+    already in `outfile` if `top_up`. A binary `outfile` stays binary."""
+    binary = os.path.exists(outfile) and is_binary_calibration(outfile)
+    if top_up and os.path.exists(outfile):
+        existing = load_calibration_data(outfile)
+        if type(existing) is not type(data):
+            print(
+                f"Calibration failed: cannot top up {outfile}, which is for a"
+                " different scheme",
+                file=sys.stderr,
+            )
+            sys.exit(-1)
+
+        existing.merge(data)  # type: ignore
+        existing.metadata = data.metadata
+        if isinstance(data, PKECalibrationData):
+            assert isinstance(existing, PKECalibrationData)
+            models = (existing.cost_model, data.cost_model)
+            fitted = [m for m in models if m is not None]
+            if fitted:
+                # refit to all samples (the new ones may be of a few events
+                # only), keeping the errors measured on validation events
+                existing.cost_model = existing.fit_cost_model()
+                for model in fitted:
+                    existing.cost_model.errors.update(model.errors)
+        data = existing
+
+    if binary and isinstance(data, PKECalibrationData):
+        write_binary_calibration(outfile, data)
+    else:
+        data.write_json(outfile)
+
+
+def read_meta_file(meta_file: str | None) -> str | None:
+    if meta_file is None:
+        return None
+
+    with open(meta_file) as f:
+        return f.read()
+
+
+def calibrate_context(
+    cf: ContextFunction,
+    outfile: str,
+    samples: int,
+    quiet: bool,
+    meta_file_data: str | None,
+    plan: str,
+    sampling: SamplingPolicy | None = None,
+    top_up: bool = False,
+    events: set[EventKind] | None = None,
+):
     print(f"Calibration for f{cf.schemetype} scheme")
     if cf.schemetype == SchemeType.PKE:
         (cc, params, key_pair, features) = cf.run()
         log = None if quiet else sys.stdout
-        calibration = PKECalibration(
-            cc, params, key_pair, features, log, sample_count=samples
-        )
+        journal = CalibrationJournal(journal_file(outfile))
+        try:
+            calibration = PKECalibration(
+                cc,
+                params,
+                key_pair,
+                features,
+                log,
+                sample_count=samples,
+                plan=CalibrationPlan(plan),
+                sampling=sampling,
+                done=journal.read(),
+                journal=journal,
+                events=events,
+            )
+        except ValueError as e:
+            print(f"Calibration failed: {e}", file=sys.stderr)
+            sys.exit(-1)
         smp = calibration.calibrate()
         meta = format_meta(cf.description, meta_file_data, calibration.gen_metadata())
         smp.metadata = meta
-        smp.write_json(outfile)
+        write_calibration(smp, outfile, top_up)
+        journal.remove()
 
     elif cf.schemetype == SchemeType.BINFHE:
         (cc, sk) = cf.run()
@@ -44,7 +241,90 @@ def calibrate_main(
         cd = calibration.run()
         meta = format_meta(cf.description, meta_file_data, calibration.gen_metadata())
         cd.metadata = meta
-        cd.write_json(outfile)
+        write_calibration(cd, outfile, top_up)
+
+
+def calibrate_contexts_parallel(
+    files: list[str],
+    outfiles: dict[str, str],
+    samples: int,
+    quiet: bool,
+    meta_file_data: str | None,
+    plan: str,
+    jobs: int,
+    sampling: SamplingPolicy | None = None,
+    top_up: bool = False,
+    events: set[EventKind] | None = None,
+    threads: list[int] | None = None,
+):
+    """Calibrate contexts with worker processes. Given several `threads`
+    counts, PKE contexts are calibrated at each of them in turn, and the
+    runtimes at all but the first are added to the calibration data of the
+    first (BinFHE contexts are only calibrated at the first)."""
+    if threads and jobs > 1:
+        # workers would share cores while measuring how runtimes scale
+        print(
+            "Calibration failed: --threads cannot be combined with --jobs",
+            file=sys.stderr,
+        )
+        sys.exit(-1)
+
+    counts: list[int | None] = [None] if not threads else [*dict.fromkeys(threads)]
+    names = list(outfiles.keys())
+    pke_names = [
+        name for name in names if context_functions[name].schemetype == SchemeType.PKE
+    ]
+
+    # calibration data and metadata of each context at each thread count
+    sweeps: dict[str, list[tuple[CalibrationData, Any]]] = {}
+    journals: dict[str, list[CalibrationJournal]] = {}
+    for threads_now in counts:
+        if threads_now is not None:
+            print(f"Calibrating with {threads_now} threads")
+
+        journals_now = {
+            name: CalibrationJournal(journal_file(outfiles[name], threads_now))
+            for name in pke_names
+        }
+        done = {}
+        for name, journal in journals_now.items():
+            journals.setdefault(name, []).append(journal)
+            data = journal.read()
+            if data is not None:
+                print(f"[{name}] Resuming: {len(data.runtime_samples)} events measured")
+                done[name] = data
+
+        for name, data, gen_meta in calibrate_parallel(
+            files,
+            names if threads_now == counts[0] else pke_names,
+            samples,
+            CalibrationPlan(plan),
+            jobs,
+            sampling,
+            done,
+            journals_now,
+            events,
+            threads_now,
+            quiet,
+        ):
+            sweeps.setdefault(name, []).append((data, gen_meta))
+            if len(sweeps[name]) < len(counts) and name in pke_names:
+                continue
+
+            ((data, gen_meta), *others) = sweeps[name]
+            if isinstance(data, PKECalibrationData):
+                for count, (other, _) in zip(counts[1:], others):
+                    data.thread_samples[count] = other.runtime_samples  # type: ignore
+                if len(counts) > 1:
+                    gen_meta["thread counts"] = ", ".join(str(t) for t in counts)
+
+            desc = context_functions[name].description
+            data.metadata = format_meta(desc, meta_file_data, gen_meta)
+            write_calibration(data, outfiles[name], top_up)
+            for journal in journals.get(name, []):
+                journal.remove()
+            print(f"[{name}] Calibration written to {outfiles[name]}")
+
 
 def format_meta(desc: str, mf: str|None, gen: OrderedDict[str, Any]) -> str:
     metas = [("description", desc)] + list(gen.items())
@@ -0,0 +1,29 @@
+import sys
+
+from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.pke.calibration_file import (
+    is_binary_calibration,
+    write_binary_calibration,
+)
+from dioptra.utils.file_loading import load_calibration_data
+
+
+def convert_main(infile: str, outfile: str, format: str | None = None):
+    """Convert a calibration file between the JSON and binary formats (by
+    default, to the one it is not in)."""
+    if format is None:
+        format = "json" if is_binary_calibration(infile) else "binary"
+
+    calibration = load_calibration_data(infile)
+    if format == "json":
+        calibration.write_json(outfile)
+
+    elif isinstance(calibration, BinFHECalibrationData):
+        print(
+            "Conversion failed: the binary format is only for PKE calibrations",
+            file=sys.stderr,
+        )
+        sys.exit(-1)
+
+    else:
+        write_binary_calibration(outfile, calibration)
@@ -0,0 +1,283 @@
+"""Parallel calibration.
+
+The measurements of a calibration are split into independent groups (of
+levels and level pairs for PKE contexts, of sample iterations for BinFHE
+contexts) which are run by a pool of worker processes, and then merged. Each
+worker rebuilds the crypto contexts it needs from their context functions, and
+is pinned to its own set of cores, so that workers do not skew each other's
+measurements.
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Any, Iterator
+
+from dioptra.binfhe.calibration import BinFHECalibration, BinFHECalibrationData
+from dioptra.context import context_functions
+from dioptra.pke.calibration import (
+    CalibrationGroup,
+    CalibrationJournal,
+    CalibrationPlan,
+    EventKind,
+    PKECalibration,
+    PKECalibrationData,
+)
+from dioptra.utils.file_loading import load_files
+from dioptra.utils.sampling import SamplingPolicy
+from dioptra.utils.scheme_type import SchemeType
+
+CalibrationData = PKECalibrationData | BinFHECalibrationData
+
+# state of a worker process: the files it loaded and the contexts it built
+_loaded_files: set[tuple[str, ...]] = set()
+_contexts: dict[str, Any] = {}
+
+
+def _init_worker(cores: Any) -> None:
+    core_set = cores.get()
+    if core_set is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, core_set)
+
+
+def _context(files: list[str], name: str) -> tuple[SchemeType, Any]:
+    key = tuple(files)
+    if key not in _loaded_files:
+        load_files(files)
+        _loaded_files.add(key)
+
+    # only keep the context used last, as contexts can take a lot of memory
+    cf = context_functions[name]
+    if name not in _contexts:
+        _contexts.clear()
+        _contexts[name] = cf.run()
+    return (cf.schemetype, _contexts[name])
+
+
+def _pke_calibration(
+    files: list[str],
+    name: str,
+    samples: int,
+    plan: CalibrationPlan,
+    sampling: SamplingPolicy | None,
+    done: PKECalibrationData | None = None,
+    events: set[EventKind] | None = None,
+    quiet: bool = True,
+) -> PKECalibration:
+    (_, (cc, params, key_pair, features)) = _context(files, name)
+    return PKECalibration(
+        cc,
+        params,
+        key_pair,
+        features,
+        None if quiet else sys.stdout,
+        sample_count=samples,
+        plan=plan,
+        sampling=sampling,
+        done=done,
+        events=events,
+    )
+
+
+def _plan(
+    files: list[str],
+    name: str,
+    samples: int,
+    plan: CalibrationPlan,
+    sampling: SamplingPolicy | None,
+    jobs: int,
+) -> tuple[SchemeType, Any, Any, Any]:
+    """The metadata and groups of a calibration, and what to finish it with."""
+    (schemetype, context) = _context(files, name)
+    if schemetype == SchemeType.PKE:
+        calibration = _pke_calibration(files, name, samples, plan, sampling)
+        (groups, validation_pairs) = calibration.plan_groups(jobs)
+        return (schemetype, calibration.gen_metadata(), groups, validation_pairs)
+
+    (cc, sk) = context
+    metadata = BinFHECalibration(cc, sk).gen_metadata()
+    counts = [samples // jobs + (1 if i < samples % jobs else 0) for i in range(jobs)]
+    return (schemetype, metadata, [c for c in counts if c > 0], None)
+
+
+def _measure(
+    files: list[str],
+    name: str,
+    samples: int,
+    plan: CalibrationPlan,
+    sampling: SamplingPolicy | None,
+    done: PKECalibrationData | None,
+    events: set[EventKind] | None,
+    quiet: bool,
+    group: Any,
+) -> CalibrationData:
+    (schemetype, context) = _context(files, name)
+    if schemetype == SchemeType.PKE:
+        assert isinstance(group, CalibrationGroup)
+        calibration = _pke_calibration(
+            files, name, samples, plan, sampling, done, events, quiet
+        )
+        return calibration.calibrate_base(group)
+
+    (cc, sk) = context
+    log = None if quiet else sys.stdout
+    return BinFHECalibration(cc, sk, log=log, sample_count=group).run()
+
+
+def worker_cores(jobs: int) -> list[set[int] | None]:
+    """Disjoint sets of cores for `jobs` workers (or no pinning, if there are
+    not enough cores or the platform does not support it)."""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * jobs
+
+    cores = sorted(os.sched_getaffinity(0))
+    per_job = len(cores) // jobs
+    if per_job == 0:
+        return [None] * jobs
+
+    return [set(cores[i * per_job : (i + 1) * per_job]) for i in range(jobs)]
+
+
+def calibrate_parallel(
+    files: list[str],
+    names: list[str],
+    samples: int,
+    plan: CalibrationPlan,
+    jobs: int,
+    sampling: SamplingPolicy | None = None,
+    done: dict[str, PKECalibrationData] = {},
+    journals: dict[str, CalibrationJournal] = {},
+    events: set[EventKind] | None = None,
+    threads: int | None = None,
+    quiet: bool = True,
+) -> Iterator[tuple[str, CalibrationData, Any]]:
+    """Calibrate the named contexts with `jobs` worker processes, yielding the
+    name, calibration data and metadata of each context once it is done.
+
+    PKE contexts resume from the measurements `done` in an earlier run, and
+    every group of measurements is recorded in the context's journal (if
+    any) as soon as it is done. OpenFHE runs with `threads` OpenMP threads in
+    every worker if given (and workers are not pinned to cores, which could
+    be fewer than `threads`), and with as many as the worker has cores
+    otherwise. Unless `quiet`, workers log their measurements as they go."""
+    cores = worker_cores(jobs) if threads is None else [None] * jobs
+    omp_threads = None
+    if threads is not None:
+        omp_threads = str(threads)
+
+    elif cores[0] is not None:
+        # OpenFHE parallelizes operations with OpenMP, which should stay on
+        # each worker's own cores
+        omp_threads = str(len(cores[0]))
+
+    # workers inherit the variable when spawned (OpenMP reads it when OpenFHE
+    # is loaded, before the worker runs any code of ours), and record the
+    # thread count it gives them in their calibration data
+    saved = os.environ.get("OMP_NUM_THREADS")
+    if omp_threads is not None:
+        os.environ["OMP_NUM_THREADS"] = omp_threads
+    try:
+        yield from _calibrate_in_pool(
+            files,
+            names,
+            samples,
+            plan,
+            jobs,
+            cores,
+            sampling,
+            done,
+            journals,
+            events,
+            quiet,
+        )
+    finally:
+        if saved is None:
+            os.environ.pop("OMP_NUM_THREADS", None)
+        else:
+            os.environ["OMP_NUM_THREADS"] = saved
+
+
+def _calibrate_in_pool(
+    files: list[str],
+    names: list[str],
+    samples: int,
+    plan: CalibrationPlan,
+    jobs: int,
+    cores: list[set[int] | None],
+    sampling: SamplingPolicy | None,
+    done: dict[str, PKECalibrationData],
+    journals: dict[str, CalibrationJournal],
+    events: set[EventKind] | None,
+    quiet: bool,
+) -> Iterator[tuple[str, CalibrationData, Any]]:
+    ctx = multiprocessing.get_context("spawn")
+    core_queue = ctx.Queue()
+    for core_set in cores:
+        core_queue.put(core_set)
+
+    with ProcessPoolExecutor(
+        jobs, mp_context=ctx, initializer=_init_worker, initargs=(core_queue,)
+    ) as pool:
+        plans = {
+            pool.submit(_plan, files, name, samples, plan, sampling, jobs): name
+            for name in names
+        }
+
+        # the future of every group, with its context and index in the plan
+        measuring: dict[Future, tuple[str, int]] = {}
+        results: dict[str, list[CalibrationData | None]] = {}
+        finish: dict[str, tuple[Any, Any]] = {}
+        for future in as_completed(plans):
+            name = plans[future]
+            try:
+                (_, metadata, groups, validation_pairs) = future.result()
+            except ValueError as e:
+                print(f"[{name}] Calibration failed: {e}", file=sys.stderr)
+                sys.exit(-1)
+            print(f"[{name}] Measuring {len(groups)} groups")
+            finish[name] = (metadata, validation_pairs)
+            results[name] = [None] * len(groups)
+            for i, group in enumerate(groups):
+                f = pool.submit(
+                    _measure,
+                    files,
+                    name,
+                    samples,
+                    plan,
+                    sampling,
+                    done.get(name),
+                    events,
+                    quiet,
+                    group,
+                )
+                measuring[f] = (name, i)
+
+        for future in as_completed(measuring):
+            (name, i) = measuring[future]
+            group_results = results[name]
+            group_results[i] = future.result()
+            if name in journals and isinstance(group_results[i], PKECalibrationData):
+                journals[name].record(group_results[i])  # type: ignore
+            measured = sum(1 for r in group_results if r is not None)
+            print(f"[{name}] {measured}/{len(group_results)} groups done")
+            if measured < len(group_results):
+                continue
+
+            (metadata, validation_pairs) = finish[name]
+            (data, *rest) = group_results
+            for other in rest:
+                data.merge(other)  # type: ignore
+
+            if name in done:
+                done[name].merge(data)  # type: ignore
+                data = done[name]
+
+            if isinstance(data, PKECalibrationData) and validation_pairs:
+                errors = data.validate_cost_model(validation_pairs)
+                for kind, error in errors.items():
+                    print(
+                        f"[{name}] Cost model error for {kind.name}: {100 * error:.1f}%"
+                    )
+
+            yield (name, data, metadata)  # type: ignore
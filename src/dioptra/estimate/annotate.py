@@ -2,19 +2,22 @@ import os
 import sys
 from pathlib import Path
 
-from dioptra.binfhe.analyzer import BinFHEAnalyzer
+from dioptra.binfhe.analyzer import BinFHEAnalysisGroup, BinFHEAnalyzer
 from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.binfhe.memory import BinFHEMemoryEstimate
 from dioptra.binfhe.runtime import RuntimeEstimate
 from dioptra.estimate import estimation_cases
 from dioptra.pke.analyzer import Analyzer
 from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.memory import PKEMemoryEstimate
 from dioptra.pke.runtime import Runtime
+from dioptra.report.memory import MemoryPeakReport
 from dioptra.report.runtime import RuntimeAnnotation
 from dioptra.utils.file_loading import load_calibration_data, load_files
-from dioptra.utils.measurement import format_ns
+from dioptra.utils.measurement import format_bytes, format_ns
 from dioptra.utils.scheme_type import SchemeType
 
-def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_root_str: str) -> None:
+def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_root_str: str, memory_peak: bool = False) -> None:
     calibration = load_calibration_data(sample_file)
     load_files([file])
     case = estimation_cases.get(test_case, None)
@@ -37,12 +40,23 @@ def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_
     case_output = Path(output)
 
     annot_rpt = None
+    peak_rpt = MemoryPeakReport()
     if case.schemetype == SchemeType.PKE and isinstance(
         calibration, PKECalibrationData
     ):
         annot_rpt = RuntimeAnnotation()
-        runtime_analysis = Runtime(calibration, annot_rpt)
-        analyzer = Analyzer([runtime_analysis], calibration.scheme)
+        analyses = [Runtime(calibration, annot_rpt)]
+        if memory_peak:
+            analyses.append(
+                PKEMemoryEstimate(
+                    calibration.setup_memory_size,
+                    calibration.ct_mem,
+                    calibration.pt_mem,
+                    peak_rpt,
+                    calibration.eval_key_mem,
+                )
+            )
+        analyzer = Analyzer(analyses, calibration.scheme)
         case.run_and_exit_if_unsupported(analyzer)
 
 
@@ -53,6 +67,11 @@ def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_
         est = RuntimeEstimate(
             calibration.avg_case(), calibration.ciphertext_size, annot_rpt
         )
+        if memory_peak:
+            mem = BinFHEMemoryEstimate(
+                calibration.setup_memory_size, calibration.ciphertext_size, peak_rpt
+            )
+            est = BinFHEAnalysisGroup([est, mem])
         analyzer = BinFHEAnalyzer(calibration.params, est)
         case.run_and_exit_if_unsupported(analyzer)
 
@@ -63,7 +82,11 @@ def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_
         )
         return
 
-    for fname, annotation in annot_rpt.annotation_dicts():
+    peak_lines = peak_rpt.peak_by_line()
+    fnames = list(annot_rpt.runtimes.keys())
+    fnames += [fname for fname in peak_lines if fname not in annot_rpt.runtimes]
+    for fname in fnames:
+        annotation = annot_rpt.annotation_for(fname)
         fpath = Path(fname).absolute()
         if ann_root in fpath.parents:
             fname_out = case_output.joinpath(fpath.relative_to(ann_root))
@@ -71,6 +94,9 @@ def annotate_main(sample_file: str, file: str, test_case: str, output: str, ann_
             os.makedirs(fname_out.parent, exist_ok=True)
 
             annotation = {line: format_ns(ns) for (line, ns) in annotation.items()}
+            for line, size in peak_lines.get(fname, {}).items():
+                peak = f"{format_bytes(size)} live at peak"
+                annotation[line] = f"{annotation[line]}, {peak}" if line in annotation else peak
             annotate_lines(
                 fname,
                 fname_out,
@@ -0,0 +1,56 @@
+import json
+import sys
+
+from dioptra.binfhe.analyzer import BinFHEAnalyzer
+from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.binfhe.runtime import RuntimeEstimate
+from dioptra.estimate import estimation_cases
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.runtime import Runtime
+from dioptra.report.runtime import RuntimeFlameGraph
+from dioptra.utils.file_loading import load_calibration_data, load_files
+from dioptra.utils.scheme_type import SchemeType
+
+
+def flamegraph_main(
+    sample_file: str, file: str, test_case: str, output: str, format: str
+) -> None:
+    calibration = load_calibration_data(sample_file)
+    load_files([file])
+    case = estimation_cases.get(test_case, None)
+
+    if case is None:
+        print(
+            f"ERROR: Could not find test case '{test_case}' in scope", file=sys.stderr
+        )
+        return
+
+    flame = RuntimeFlameGraph()
+    if case.schemetype == SchemeType.PKE and isinstance(
+        calibration, PKECalibrationData
+    ):
+        analyzer = Analyzer([Runtime(calibration, flame)], calibration.scheme)
+        case.run_and_exit_if_unsupported(analyzer)
+
+    elif case.schemetype == SchemeType.BINFHE and isinstance(
+        calibration, BinFHECalibrationData
+    ):
+        est = RuntimeEstimate(
+            calibration.avg_case(), calibration.ciphertext_size, flame
+        )
+        analyzer = BinFHEAnalyzer(calibration.params, est)
+        case.run_and_exit_if_unsupported(analyzer)
+
+    else:
+        print(
+            f"Calibration data '{sample_file}' is not compatible with estimation case '{test_case}'"
+        )
+        return
+
+    with open(output, "w") as fh:
+        if format == "speedscope":
+            json.dump(flame.speedscope(case.description), fh)
+        else:
+            for line in flame.folded():
+                print(line, file=fh)
@@ -0,0 +1,88 @@
+from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.estimate import estimation_cases
+from dioptra.estimate.report import (
+    print_calibration_notes,
+    print_case_report,
+    print_thread_scaling,
+)
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.trace import (
+    OpTrace,
+    RecordedCase,
+    read_trace_file,
+    write_trace_file,
+)
+from dioptra.utils.code_loc import TraceLoc
+from dioptra.utils.file_loading import load_calibration_data, load_files
+from dioptra.utils.measurement import timedelta_as_ns
+from dioptra.utils.scheme_type import SchemeType
+
+
+def record_main(sample_file: str, files: list[str], outfile: str) -> None:
+    """Run all PKE estimation cases once and write their traces to `outfile`.
+
+    The calibration data is only used for its scheme model (which determines
+    the levels of the values in the trace), so a trace can be priced with any
+    calibration of the same scheme model (including its parameters, such as
+    the CKKS bootstrap level)."""
+    calibration = load_calibration_data(sample_file)
+    if isinstance(calibration, BinFHECalibrationData):
+        print("Recording traces is only supported for PKE calibrations")
+        return
+
+    load_files(files)
+
+    scheme = calibration.get_scheme()
+    cases = []
+    for case in estimation_cases.values():
+        if case.schemetype != SchemeType.PKE:
+            print(f"[SKIP---] {case.description}: not a PKE estimation case")
+            continue
+
+        trace = OpTrace()
+        with TraceLoc() as tloc:
+            analyzer = Analyzer([trace], scheme, tloc)
+            case.run_and_exit_if_unsupported(analyzer)
+
+        limit = None if case.limit is None else timedelta_as_ns(case.limit)
+        cases.append(RecordedCase(case.description, limit, trace))
+        print(f"[RECORD ] {case.description}: {len(trace)} operations")
+
+    write_trace_file(outfile, scheme, cases)
+
+
+def price_main(
+    trace_file: str, sample_files: list[str], threads: int | None = None
+) -> None:
+    """Report runtime and memory estimates of recorded traces for each of the
+    given calibrations, without running any estimation case."""
+    (scheme, cases) = read_trace_file(trace_file)
+
+    for sample_file in sample_files:
+        print(f"=== {sample_file}")
+        calibration = load_calibration_data(sample_file)
+        # the levels in the trace follow from the whole scheme model (e.g. the
+        # CKKS bootstrap level), not just from the scheme name
+        if (
+            isinstance(calibration, BinFHECalibrationData)
+            or calibration.get_scheme().to_dict() != scheme.to_dict()
+        ):
+            print(
+                f"[FAIL---] Cannot price a {scheme.name} trace with this calibration"
+                f" data: the trace was recorded with {scheme.to_dict()}"
+            )
+            continue
+
+        if threads is not None:
+            print_thread_scaling(calibration, threads)
+
+        table = calibration.avg_runtime_table(threads)
+        for case in cases:
+            trace = case.trace
+            table.reset_notes()
+            runtime = int(trace.runtimes(table, calibration.ct_mem).sum())
+            memory = calibration.setup_memory_size + trace.max_value_size(
+                calibration.ct_mem, calibration.pt_mem, calibration.eval_key_mem
+            )
+            print_case_report(case.description, case.limit_ns, runtime, memory)
+            print_calibration_notes(table)
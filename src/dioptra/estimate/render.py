@@ -7,23 +7,28 @@ from pathlib import Path
 from jinja2 import Environment, PackageLoader, select_autoescape
 
 import dioptra
-from dioptra.binfhe.analyzer import BinFHEAnalyzer
+from dioptra.binfhe.analyzer import BinFHEAnalysisGroup, BinFHEAnalyzer
 from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.binfhe.memory import BinFHEMemoryEstimate
 from dioptra.binfhe.runtime import RuntimeEstimate
 from dioptra.estimate import estimation_cases
 from dioptra.pke.analyzer import Analyzer
 from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.memory import PKEMemoryEstimate
 from dioptra.pke.runtime import Runtime
+from dioptra.report.memory import MemoryPeakReport
 from dioptra.report.runtime import RuntimeAnnotation
 from dioptra.utils.code_loc import TraceLoc
 from dioptra.utils.file_loading import load_calibration_data, load_files
-from dioptra.utils.measurement import format_ns
+from dioptra.utils.measurement import format_bytes, format_ns
 from dioptra.utils.scheme_type import SchemeType, calibration_type
 
 SKELETON_DIR = "analysis_site_skeleton"
 
 
-def render_main(sample_file: str, file: str, test_case: str, output: str) -> None:
+def render_main(
+    sample_file: str, file: str, test_case: str, output: str, memory_peak: bool = False
+) -> None:
     with ilr.as_file(ilr.files(dioptra.estimate).joinpath(SKELETON_DIR)) as p:
         shutil.copytree(p, output, dirs_exist_ok=True)
 
@@ -38,14 +43,25 @@ def render_main(sample_file: str, file: str, test_case: str, output: str) -> Non
         return
 
     runtime_analyses: dict[str, dict[int, str]] = {}
+    annot_rpt = RuntimeAnnotation()
+    peak_rpt = MemoryPeakReport(lambda: annot_rpt.total_runtime)
     if case.schemetype == SchemeType.PKE and isinstance(
         calibration, PKECalibrationData
     ):
-        annot_rpt = RuntimeAnnotation()
-        runtime_analysis = Runtime(calibration, annot_rpt)
+        analyses = [Runtime(calibration, annot_rpt)]
+        if memory_peak:
+            analyses.append(
+                PKEMemoryEstimate(
+                    calibration.setup_memory_size,
+                    calibration.ct_mem,
+                    calibration.pt_mem,
+                    peak_rpt,
+                    calibration.eval_key_mem,
+                )
+            )
 
         with TraceLoc() as tloc:
-            analyzer = Analyzer([runtime_analysis], calibration.get_scheme(), tloc)
+            analyzer = Analyzer(analyses, calibration.get_scheme(), tloc)
             case.run_and_exit_if_unsupported(analyzer)
 
             for fname, annotation in annot_rpt.annotation_dicts():
@@ -57,10 +73,15 @@ def render_main(sample_file: str, file: str, test_case: str, output: str) -> Non
     elif case.schemetype == SchemeType.BINFHE and isinstance(
         calibration, BinFHECalibrationData
     ):
-        annot_rpt = RuntimeAnnotation()
         est = RuntimeEstimate(
             calibration.avg_case(), calibration.ciphertext_size, annot_rpt
         )
+        if memory_peak:
+            mem = BinFHEMemoryEstimate(
+                calibration.setup_memory_size, calibration.ciphertext_size, peak_rpt
+            )
+            est = BinFHEAnalysisGroup([est, mem])
+
         with TraceLoc() as tloc:
             analyzer = BinFHEAnalyzer(
                 calibration.params,
@@ -85,13 +106,26 @@ def render_main(sample_file: str, file: str, test_case: str, output: str) -> Non
         print(f"          But estimation case requires a {case.schemetype} context")
         return
 
-    render_results(output, test_case, runtime_analyses)
+    memory_analyses: dict[str, dict[int, str]] = {}
+    curve: list[tuple[int, int]] = []
+    if memory_peak:
+        # files that only allocate values may have been loaded by relative path
+        files = dict((os.path.abspath(fname), fname) for fname in runtime_analyses)
+        for fname, sizes in peak_rpt.peak_by_line().items():
+            fname = files.get(os.path.abspath(fname), os.path.abspath(fname))
+            runtime_analyses.setdefault(fname, {})
+            memory_analyses[fname] = {k - 1: format_bytes(v) for k, v in sizes.items()}
+        curve = peak_rpt.memory_curve()
+
+    render_results(output, test_case, runtime_analyses, memory_analyses, curve)
 
 
 def render_results(
     outdir: str,
     test_case: str,
     runtime_analyses: dict[str, dict[int, str]],
+    memory_analyses: dict[str, dict[int, str]] = {},
+    curve: list[tuple[int, int]] = [],
 ) -> None:
     env = Environment(
         loader=PackageLoader("dioptra.estimate"), autoescape=select_autoescape()
@@ -101,6 +135,7 @@ def render_results(
     case_root = Path(os.path.commonprefix(list(runtime_analyses.keys())))
     sources = {}
     analyses = {}
+    memory = {}
     for fname in runtime_analyses:
         with open(fname) as f:
             f = f.read()
@@ -112,12 +147,24 @@ def render_results(
 
         sources[simple_name] = f
         analyses[simple_name] = runtime_analyses[fname]
+        memory[simple_name] = memory_analyses.get(fname, {})
 
+    peak = max((size for (_, size) in curve), default=0)
+    low = min((size for (_, size) in curve), default=0)
+    end = max((t for (t, _) in curve), default=0)
     with open(Path(outdir).joinpath(f"{test_case}.html"), "w") as rendered_html:
         rendered_html.write(
             template.render(
                 test_case=test_case,
                 sources=sources,
                 analyses=analyses,
+                memory=memory,
+                curve=curve,
+                peak=peak,
+                low=low,
+                end=end,
+                peak_label=format_bytes(peak),
+                low_label=format_bytes(low),
+                end_label=format_ns(end),
             )
         )
@@ -1,21 +1,40 @@
+import json
+
 from dioptra.binfhe.analyzer import BinFHEAnalysisGroup, BinFHEAnalyzer
 from dioptra.binfhe.calibration import BinFHECalibrationData
+from dioptra.binfhe.gates import GateGraph
 from dioptra.binfhe.memory import BinFHEMemoryEstimate
 from dioptra.binfhe.runtime import RuntimeEstimate
 from dioptra.estimate import estimation_cases
 from dioptra.pke.analyzer import Analyzer
-from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.calibration import PKECalibrationData, RuntimeTable
+from dioptra.pke.liveness import Liveness
 from dioptra.pke.memory import PKEMemoryEstimate
+from dioptra.pke.parallel import Parallelism
 from dioptra.pke.runtime import Runtime
-from dioptra.report.memory import MemoryMaxReport
+from dioptra.pke.trace import OpTrace
+from dioptra.report.memory import MemoryMaxReport, MemoryPeakReport
 from dioptra.report.runtime import RuntimeTotal
 from dioptra.utils.code_loc import TraceLoc
 from dioptra.utils.file_loading import load_calibration_data, load_files
 from dioptra.utils.measurement import format_bytes, format_ns_approx, timedelta_as_ns
+from dioptra.utils.schedule import TaskGraph
 from dioptra.utils.scheme_type import SchemeType, calibration_type
 
 
-def report_main(sample_file: str, files: list[str], print_meta: bool) -> None:
+def report_main(
+    sample_file: str,
+    files: list[str],
+    print_meta: bool,
+    batch: bool = False,
+    sample_loops: bool = False,
+    track_values: bool = True,
+    threads: int | None = None,
+    memory_peak: bool = False,
+    memory_curve: str | None = None,
+    liveness: bool = False,
+    cores: int | None = None,
+) -> None:
     calibration = load_calibration_data(sample_file)
     if print_meta:
         if calibration.metadata is not None:
@@ -25,47 +44,104 @@ def report_main(sample_file: str, files: list[str], print_meta: bool) -> None:
         else:
             print("No calibration metadata found!")
 
+    if threads is not None and isinstance(calibration, PKECalibrationData):
+        print_thread_scaling(calibration, threads)
+
     load_files(files)
 
+    curves = []
     for case in estimation_cases.values():
         runtime = None
-        maxmem = MemoryMaxReport()
+        runtime_error = 0
+        table = None
+        liveness_analysis = None
+        parallelism = None
+        gates = None
+        total = RuntimeTotal()
+        if memory_peak or memory_curve is not None:
+            maxmem = MemoryPeakReport(total.clocks.now)
+        else:
+            maxmem = MemoryMaxReport()
+
+        if (
+            batch
+            and case.schemetype == SchemeType.PKE
+            and isinstance(calibration, PKECalibrationData)
+        ):
+            trace = OpTrace()
+            with TraceLoc() as tloc:
+                analyzer = Analyzer(
+                    [trace], calibration.get_scheme(), tloc, track_values=track_values
+                )
+                case.run_and_exit_if_unsupported(analyzer)
+
+            table = calibration.avg_runtime_table(threads)
+            trace.report_runtime(table, calibration.ct_mem, total)
+            runtime = total.total_runtime
+            maxmem.record_setup_size(calibration.setup_memory_size)
+            maxmem.max_value_size = trace.max_value_size(
+                calibration.ct_mem, calibration.pt_mem, calibration.eval_key_mem
+            )
 
-        if case.schemetype == SchemeType.PKE and isinstance(
+        elif case.schemetype == SchemeType.PKE and isinstance(
             calibration, PKECalibrationData
         ):
-            total = RuntimeTotal()
-            runtime_analysis = Runtime(calibration, total)
+            runtime_analysis = Runtime(calibration, total, threads)
             memory_analysis = PKEMemoryEstimate(
                 calibration.setup_memory_size,
                 calibration.ct_mem,
                 calibration.pt_mem,
                 maxmem,
+                calibration.eval_key_mem,
             )
+            analyses = [runtime_analysis, memory_analysis]
+            if liveness:
+                liveness_analysis = Liveness(
+                    calibration.ct_mem,
+                    calibration.pt_mem,
+                    total.clocks.now,
+                    calibration.eval_key_mem,
+                )
+                analyses.append(liveness_analysis)
+            if cores is not None:
+                parallelism = Parallelism(calibration, threads)
+                analyses.append(parallelism)
 
             with TraceLoc() as tloc:
                 analyzer = Analyzer(
-                    [runtime_analysis, memory_analysis], calibration.get_scheme(), tloc
+                    analyses,
+                    calibration.get_scheme(),
+                    tloc,
+                    sample_loops,
+                    track_values,
+                    total.clocks,
                 )
                 case.run_and_exit_if_unsupported(analyzer)
                 runtime = total.total_runtime
+                runtime_error = total.error_bound
+                table = runtime_analysis.runtime_table
 
         elif case.schemetype == SchemeType.BINFHE and isinstance(
             calibration, BinFHECalibrationData
         ):
             avg_runtime = calibration.avg_case()
-            total = RuntimeTotal()
             runtime_analysis = RuntimeEstimate(
                 avg_runtime, calibration.ciphertext_size, total
             )
             memory_analysis = BinFHEMemoryEstimate(
                 calibration.setup_memory_size, calibration.ciphertext_size, maxmem
             )
+            binfhe_analyses = [runtime_analysis, memory_analysis]
+            if cores is not None:
+                gates = GateGraph(avg_runtime, calibration.ciphertext_size)
+                binfhe_analyses.append(gates)
+
             with TraceLoc() as tloc:
                 analyzer = BinFHEAnalyzer(
                     calibration.params,
-                    BinFHEAnalysisGroup([runtime_analysis, memory_analysis]),
+                    BinFHEAnalysisGroup(binfhe_analyses),
                     tloc,
+                    total.clocks,
                 )
                 case.run_and_exit_if_unsupported(analyzer)
                 runtime = total.total_runtime
@@ -80,16 +156,163 @@ def report_main(sample_file: str, files: list[str], print_meta: bool) -> None:
             print(f"          But estimation case requires a {case.schemetype} context")
             continue
 
-        if case.limit is None:
-            status = "[-------]"
+        limit = None if case.limit is None else timedelta_as_ns(case.limit)
+        print_case_report(
+            case.description,
+            limit,
+            runtime,
+            maxmem.max_value_size + maxmem.setup_size,
+            runtime_error,
+        )
+        if table is not None:
+            print_calibration_notes(table)
 
-        elif runtime <= timedelta_as_ns(case.limit):
-            status = "[OK     ]"
+        if liveness_analysis is not None:
+            print_liveness(liveness_analysis, maxmem.setup_size)
 
-        else:
-            status = "[TIMEOUT]"
+        if parallelism is not None and cores is not None:
+            print_parallelism(parallelism.graph, cores)
+
+        if gates is not None and cores is not None:
+            print_gates(gates)
+            print_parallelism(gates.graph, cores)
+
+        if isinstance(maxmem, MemoryPeakReport):
+            if memory_peak:
+                print_memory_peak(maxmem)
+            curves.append(
+                {
+                    "description": case.description,
+                    "setup": maxmem.setup_size,
+                    "peak": maxmem.setup_size + maxmem.max_value_size,
+                    "curve": maxmem.memory_curve(),
+                }
+            )
+
+    if memory_curve is not None:
+        with open(memory_curve, "w") as fh:
+            json.dump({"cases": curves}, fh)
+
+
+def print_case_report(
+    description: str,
+    limit_ns: int | None,
+    runtime: int,
+    memory: int,
+    runtime_error: int = 0,
+) -> None:
+    if limit_ns is None:
+        status = "[-------]"
+
+    elif runtime <= limit_ns:
+        status = "[OK     ]"
+
+    else:
+        status = "[TIMEOUT]"
+
+    print(f"{status} {description}")
+    print(f"  Runtime:     {format_ns_approx(runtime)}")
+    if runtime_error > 0:
+        print(f"  (Sampled):   +/- {format_ns_approx(runtime_error)}")
+    print(f"  Max Memory:  {format_bytes(memory)}")
+
+
+def print_thread_scaling(calibration: PKECalibrationData, threads: int) -> None:
+    counts = calibration.thread_counts()
+    if len(counts) > 1:
+        measured = ", ".join(str(t) for t in counts)
+        print(f"Runtimes scaled to {threads} threads (measured at {measured})")
+
+    elif counts and counts[0] != threads:
+        print(
+            f"Calibration was only measured at {counts[0]} threads, runtimes are"
+            f" not scaled to {threads} threads"
+        )
+
+    elif not counts:
+        print(f"Calibration has no thread count, runtimes are not scaled to {threads}")
+
+
+def print_memory_peak(report: MemoryPeakReport, min_share: float = 0.05) -> None:
+    """Print the bytes live at the peak by call stack, as a tree of the stack
+    frames that (transitively) allocated at least `min_share` of them."""
+    totals = report.peak_inclusive()
+    peak = totals.get((), 0)
+    if peak == 0:
+        return
+
+    print("  Peak Memory by allocation site:")
+    children: dict[tuple, list[tuple]] = {}
+    for stack in totals:
+        if stack and totals[stack] >= min_share * peak:
+            children.setdefault(stack[:-1], []).append(stack)
+
+    def show(stack: tuple) -> None:
+        for child in sorted(children.get(stack, []), key=lambda s: -totals[s]):
+            indent = "  " * len(child)
+            print(f"  {indent}{format_bytes(totals[child])}  {child[-1]}")
+            show(child)
+
+    show(())
+    unattributed = peak - sum(totals[s] for s in children.get((), []))
+    if unattributed > 0:
+        print(f"    {format_bytes(unattributed)}  (other)")
+
+
+def print_liveness(liveness: Liveness, setup_size: int) -> None:
+    """Print the peak memory usage if values were freed right after their last
+    use, and the allocation sites of values that were held the longest after
+    it (weighted by their size)."""
+    ideal = setup_size + liveness.ideal_peak()
+    print(f"  Ideal Memory: {format_bytes(ideal)} (freeing values after last use)")
+
+    held = liveness.held_sites()
+    if not held:
+        return
+
+    print("  Held past last use:")
+    for h in held:
+        loc = "(unknown)" if h.site is None else str(h.site.stack_location())
+        mb_s = h.byte_ns / 10**15
+        print(f"    {mb_s:.6f} MB*s  {loc} ({h.count} values)")
+
+
+def print_parallelism(graph: TaskGraph, cores: int) -> None:
+    """Print the work and span of the dataflow graph of a case, and its
+    (list-scheduled) wall time on `cores` cores."""
+    makespan = graph.makespan(cores)
+    speedup = graph.work / makespan if makespan > 0 else 1.0
+    print(f"  Span:        {format_ns_approx(graph.span)} (critical path)")
+    print(f"  Parallelism: {graph.parallelism:.2f} (work / span)")
+    print(f"  On {cores} cores: {format_ns_approx(makespan)} ({speedup:.2f}x speedup)")
+
+
+def print_gates(gates: GateGraph, levels: int = 16) -> None:
+    """Print the number of gates of a BinFHE case by kind, its depth in gates,
+    and the number of gates at (up to `levels` of) its depths."""
+    kinds = sorted(gates.gate_counts.items(), key=lambda kv: -kv[1])
+    by_kind = ", ".join(
+        f"{kind.name.removeprefix('EVAL_BIN_GATE_')} {n}" for (kind, n) in kinds
+    )
+    print(f"  Gates:       {gates.gates}" + (f" ({by_kind})" if by_kind else ""))
+    print(f"  Depth:       {gates.depth}")
+    if gates.widths:
+        widths = ", ".join(str(w) for w in gates.widths[:levels])
+        more = ", ..." if len(gates.widths) > levels else ""
+        print(f"  Width:       {widths}{more} (max {max(gates.widths)})")
+
+
+def print_calibration_notes(table: RuntimeTable) -> None:
+    """Flag how reliable the calibration behind a runtime estimate is: the
+    confidence interval of the measurements it is based on (if recorded),
+    and the part that is for events that were not calibrated, and so comes
+    from the cost model rather than measurements."""
+    if table.ci_ns > 0:
+        print(f"  (Measured):  +/- {format_ns_approx(int(table.ci_ns))} (95% CI)")
+
+    if not table.modelled_uses:
+        return
 
-        total = maxmem.max_value_size + maxmem.setup_size
-        print(f"{status } {case.description}")
-        print(f"  Runtime:     { format_ns_approx(runtime) }")
-        print(f"  Max Memory:  { format_bytes(total) }")
+    print(f"  (Modelled):  {format_ns_approx(table.modelled_ns)} from uncalibrated:")
+    for e, count in table.modelled_uses.items():
+        print(f"               {e} x{count}")
@@ -1,24 +1,33 @@
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
+import json
 import pathlib
 from typing import Iterable
 
-from dioptra import binfhe, estimate
-from dioptra.binfhe.analyzer import BinFHEAnalyzer
+from dioptra import estimate
+from dioptra.binfhe.analyzer import BinFHEAnalysisGroup, BinFHEAnalyzer
+from dioptra.binfhe.memory import BinFHEMemoryEstimate
+from dioptra.binfhe.runtime import RuntimeEstimate
 from dioptra.estimate.env import Environments, EnvironmentsConfig
 from dioptra.pke.analyzer import Analyzer
 from dioptra.pke.memory import PKEMemoryEstimate
 from dioptra.pke.runtime import Runtime
 from dioptra.report.memory import MemoryMaxReport
-from dioptra.report.runtime import RuntimeTotal
+from dioptra.report.runtime import RuntimeTotal, RuntimeTraceEvents
 from dioptra.utils.code_loc import TraceLoc
 from dioptra.utils.file_loading import load_files
 from dioptra.utils.measurement import format_ns_approx
 from dioptra.utils.scheme_type import SchemeType
 
 class EnvironmentsReport(Environments):
-  def __init__(self, config: EnvironmentsConfig):
+  def __init__(self, config: EnvironmentsConfig, trace: RuntimeTraceEvents | None = None):
     self.config = config
     self.timeline = []
+    self.trace = trace
+
+  def phase(self, name: str, phase: str | None):
+    if self.trace is None:
+      return nullcontext()
+    return self.trace.phase(name, phase or name)
 
   @contextmanager
   def get_pke_ctx(self, name: str, phase: str | None = None) -> Iterable[Analyzer]:
@@ -35,12 +44,15 @@ class EnvironmentsReport(Environments):
       calibration.ct_mem,
       calibration.pt_mem,
       maxmem,
+      calibration.eval_key_mem,
     )
 
-    with TraceLoc() as tloc:
-      analyzer = Analyzer(
-        [runtime_analysis, memory_analysis], calibration.get_scheme(), tloc
-      )
+    analyses = [runtime_analysis, memory_analysis]
+    if self.trace is not None:
+      analyses.append(Runtime(calibration, self.trace))
+
+    with self.phase(name, phase), TraceLoc() as tloc:
+      analyzer = Analyzer(analyses, calibration.get_scheme(), tloc, clocks=total.clocks)
       yield analyzer
 
     self.timeline.append((name, phase, total.total_runtime))
@@ -55,19 +67,23 @@ class EnvironmentsReport(Environments):
     
     maxmem = MemoryMaxReport()
     total = RuntimeTotal()
-    runtime_analysis = binfhe.runtime.RuntimeEstimate(calibration, total)
-    memory_analysis = binfhe.memory.BinFHEMemoryEstimate(
-      calibration.setup_memory_size,
-      calibration.ct_mem,
-      calibration.pt_mem,
-      maxmem,
+    runtime_analysis = RuntimeEstimate(
+      calibration.avg_case(), calibration.ciphertext_size, total
     )
+    memory_analysis = BinFHEMemoryEstimate(
+      calibration.setup_memory_size, calibration.ciphertext_size, maxmem
+    )
+    analyses = [runtime_analysis, memory_analysis]
+    if self.trace is not None:
+      analyses.append(
+        RuntimeEstimate(calibration.avg_case(), calibration.ciphertext_size, self.trace)
+      )
 
-    analysis = binfhe.memory.BinFHEAnalysisGroup([runtime_analysis, memory_analysis])
+    analysis = BinFHEAnalysisGroup(analyses)
 
-    with TraceLoc() as tloc:
+    with self.phase(name, phase), TraceLoc() as tloc:
       analyzer = BinFHEAnalyzer(
-        calibration.params, analysis, tloc
+        calibration.params, analysis, tloc, total.clocks
       )
       yield analyzer
 
@@ -83,14 +99,18 @@ def format_ns_timeline(ns: int) -> str:
 
     return f"{hours}h{minutes}m{seconds}s"
 
-def timeline_main(env_file: pathlib.Path, files: list[pathlib.Path]):
+def timeline_main(env_file: pathlib.Path, files: list[pathlib.Path], trace_events: pathlib.Path | None = None):
   config = EnvironmentsConfig()
   config.load_from_file(env_file)
   load_files(files)
 
+  traces = []
   for case in estimate.env_estimation_cases.values():
-    envs = EnvironmentsReport(config)
+    trace = RuntimeTraceEvents() if trace_events is not None else None
+    envs = EnvironmentsReport(config, trace)
     case.run(envs)
+    if trace is not None:
+      traces.append((case.description, trace))
 
     print(case.description)
     total_time = sum(duration for (_, _, duration) in envs.timeline)
@@ -100,3 +120,21 @@ def timeline_main(env_file: pathlib.Path, files: list[pathlib.Path]):
 
     print(f"Total time: {format_ns_approx(total_time)}")
 
+  if trace_events is not None:
+    write_trace_events(trace_events, traces)
+
+def write_trace_events(file: pathlib.Path, traces: list[tuple[str, RuntimeTraceEvents]]):
+  """Write the timelines of all cases to a single Chrome trace-event file,
+  with the tracks of each case named after it if there are several cases."""
+  events = []
+  pids = 0
+  for (description, trace) in traces:
+    for event in trace.chrome_trace()["traceEvents"]:
+      event["pid"] += pids
+      if len(traces) > 1 and event["name"] == "process_name":
+        event["args"]["name"] = f"{description}: {event['args']['name']}"
+      events.append(event)
+    pids += len(trace.tracks)
+
+  with open(file, "w") as fh:
+    json.dump({"traceEvents": events, "displayTimeUnit": "ns"}, fh)
@@ -1,48 +1,123 @@
 import dis
-import weakref
+import enum
+import itertools
 import math
-from typing import Any, Iterable, Self
+import threading
+from concurrent.futures import ALL_COMPLETED, Future
+from typing import Any, Callable, Iterable, Iterator, Self
+
+import numpy as np
 
 from dioptra.pke.scheme import LevelInfo, SchemeModelPke
-from dioptra.utils import code_loc
+from dioptra.utils import code_loc, threads
 from dioptra.utils.code_loc import Frame, TraceLoc, calling_frame
 from dioptra.utils.error import NotSupportedException
 from dioptra.utils.measurement import BPS
 from dioptra.utils.network import NetworkModel
+from dioptra.utils.threads import VirtualClocks, VirtualThread, VirtualTimeExecutor
 
 
 class VectorMath:
+    """Operations on the slot values of simulated plaintexts and ciphertexts.
+
+    Slot values are read-only NumPy arrays, so values that are not changed by
+    an operation (e.g. by encryption) are shared rather than copied. Integer
+    slots are held as int64 until an operation could overflow it, from then on
+    they are held as Python integers (object arrays) like the plain lists were.
+    """
+
+    INT64_MAX = int(np.iinfo(np.int64).max)
+
     @staticmethod
-    def pw_mul(i1: Iterable | None, i2: Iterable | None) -> Iterable | None:
-        """Pointwise multiplication."""
-        if i1 is None or i2 is None:
+    def slots(values: Iterable | None) -> np.ndarray | None:
+        """Slot values for a list of values given to the analyzer."""
+        if values is None:
             return None
+        array = np.array(values)
+        if array.dtype.kind == "u":
+            # unsigned and signed slots do not mix without becoming floats
+            array = array.astype(object)
+        array.flags.writeable = False
+        return array
 
-        return [v1 * v2 for (v1, v2) in zip(i1, i2)]
+    @staticmethod
+    def _magnitude(i: np.ndarray) -> int:
+        """The largest absolute value of an integer array."""
+        if len(i) == 0:
+            return 0
+        return max(abs(int(i.max())), abs(int(i.min())))
 
     @staticmethod
-    def pw_add(i1: Iterable | None, i2: Iterable | None) -> Iterable | None:
-        """Pointwise addition."""
+    def _exact(i: np.ndarray, bound: int) -> np.ndarray:
+        """`i` as Python integers if results up to `bound` do not fit in int64."""
+        if i.dtype.kind == "i" and bound > VectorMath.INT64_MAX:
+            return i.astype(object)
+        return i
+
+    @staticmethod
+    def _pointwise(
+        op: Callable[[np.ndarray, np.ndarray], np.ndarray],
+        bound: Callable[[int, int], int],
+        i1: np.ndarray | None,
+        i2: np.ndarray | None,
+    ) -> np.ndarray | None:
         if i1 is None or i2 is None:
             return None
-        return [v1 + v2 for (v1, v2) in zip(i1, i2)]
+
+        # like `zip`, only consider the slots both operands have values for
+        n = min(len(i1), len(i2))
+        i1, i2 = i1[:n], i2[:n]
+        if i1.dtype.kind == "i" and i2.dtype.kind == "i":
+            b = bound(VectorMath._magnitude(i1), VectorMath._magnitude(i2))
+            i1 = VectorMath._exact(i1, b)
+        result = op(i1, i2)
+        result.flags.writeable = False
+        return result
 
     @staticmethod
-    def pw_sub(i1: Iterable | None, i2: Iterable | None) -> Iterable | None:
+    def pw_mul(i1: np.ndarray | None, i2: np.ndarray | None) -> np.ndarray | None:
+        """Pointwise multiplication."""
+        return VectorMath._pointwise(np.multiply, lambda m1, m2: m1 * m2, i1, i2)
+
+    @staticmethod
+    def pw_add(i1: np.ndarray | None, i2: np.ndarray | None) -> np.ndarray | None:
+        """Pointwise addition."""
+        return VectorMath._pointwise(np.add, lambda m1, m2: m1 + m2, i1, i2)
+
+    @staticmethod
+    def pw_sub(i1: np.ndarray | None, i2: np.ndarray | None) -> np.ndarray | None:
         """Pointwise subtraction."""
-        if i1 is None or i2 is None:
+        return VectorMath._pointwise(np.subtract, lambda m1, m2: m1 + m2, i1, i2)
+
+    @staticmethod
+    def sum(i: np.ndarray | None, bs: int) -> np.ndarray | None:
+        """Sum of every `bs` consecutive slots (cyclically), computed with
+        log2(bs) rotations and additions like `EvalSum` itself."""
+        if i is None:
             return None
-        return [v1 - v2 for (v1, v2) in zip(i1, i2)]
+
+        # each result slot adds up to the next power of two of `bs` slots
+        span = 1 << max(bs - 1, 0).bit_length()
+        result = i
+        if i.dtype.kind == "i":
+            result = VectorMath._exact(i, VectorMath._magnitude(i) * span)
+        step = 1
+        while step < bs:
+            result = result + np.roll(result, -step)
+            step *= 2
+        result.flags.writeable = False
+        return result
 
 
 class Value:
-    value_id = 0
+    __slots__ = ("id", "__weakref__")
+
+    # `next` on a count is atomic, so values can be created from any thread
+    _ids = itertools.count()
 
     @staticmethod
     def fresh_id() -> int:
-        id = Value.value_id
-        Value.value_id += 1
-        return id
+        return next(Value._ids)
 
     def __init__(self) -> None:
         self.id = Value.fresh_id()
@@ -57,22 +132,38 @@ class Value:
 
 
 class PrivateKey(Value):
-    pass
+    __slots__ = ()
+
+
+# Called with the id and level of a value when it is garbage collected
+Finalizer = Callable[[int, LevelInfo], None]
 
 
 class Ciphertext(Value):
+    # values are freed through `__del__` rather than `weakref.finalize`, which
+    # would cost an extra object and a registry entry per simulated value
+    __slots__ = ("_finalizer", "value", "level")
+
     def __init__(self, level: LevelInfo = LevelInfo(), value: Any = None):
+        self._finalizer: Finalizer | None = None
         super().__init__()
         self.value = value
         self.level = level
 
-    def set_finalizer(self, finalizer: weakref.finalize) -> Self:
+    def set_finalizer(self, finalizer: Finalizer) -> Self:
         self._finalizer = finalizer
         return self
 
+    def __del__(self) -> None:
+        if self._finalizer is not None:
+            self._finalizer(self.id, self.level)
+
 
 class Plaintext(Value):
+    __slots__ = ("_finalizer", "value", "level")
+
     def __init__(self, level: LevelInfo = LevelInfo(), value: Any = None):
+        self._finalizer: Finalizer | None = None
         super().__init__()
         self.value = value
         self.level = level
@@ -81,21 +172,33 @@ class Plaintext(Value):
         if self.value is None:
             raise ValueError("GetPackedValue(): Does not work for arbitrary values")
 
-        return list(self.value)
+        return self.value.tolist()
 
     def GetRealPackedValue(self):
         if self.value is None:
             raise ValueError("GetRealPackedValue(): Does not work for arbitrary values")
 
-        return list(self.value)
+        return self.value.real.tolist()
 
-    def set_finalizer(self, finalizer: weakref.finalize) -> Self:
+    def set_finalizer(self, finalizer: Finalizer) -> Self:
         self._finalizer = finalizer
         return self
 
+    def __del__(self) -> None:
+        if self._finalizer is not None:
+            self._finalizer(self.id, self.level)
+
 
 class PublicKey(Value):
-    pass
+    __slots__ = ()
+
+
+class EvalKeyKind(enum.Enum):
+    """The kinds of evaluation keys, which the context holds once generated."""
+
+    MULT = "mult"
+    ROTATION = "rotation"
+    BOOTSTRAP = "bootstrap"
 
 
 class KeyPair:
@@ -176,6 +279,11 @@ class AnalysisBase:
     ) -> None:
         pass
 
+    def trace_eval_keygen(
+        self, kind: EvalKeyKind, count: int, call_loc: Frame | None
+    ) -> None:
+        pass
+
     def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
         pass
 
@@ -192,6 +300,122 @@ class AnalysisBase:
     ) -> None:
         pass
 
+    # The following are called around `Analyzer.Repeat` loops when sampling:
+    # `trace_repeat_iteration` after every iteration that was run, and
+    # `trace_repeat_skip` when the remaining iterations are to be extrapolated
+    # from the last one. Repeat loops can be nested.
+
+    def trace_repeat_begin(self) -> None:
+        pass
+
+    def trace_repeat_iteration(self) -> None:
+        pass
+
+    def trace_repeat_skip(self, count: int) -> None:
+        raise NotImplementedError(
+            f"{type(self).__name__} cannot extrapolate repeated iterations"
+        )
+
+    def trace_repeat_end(self) -> None:
+        pass
+
+
+class IterationSignature(AnalysisBase):
+    """Records the shape of the operations of a loop iteration: which operation
+    ran at which call site and on which levels."""
+
+    def __init__(self) -> None:
+        self.ops: list[tuple] = []
+
+    def note(self, op: str, call_loc: Frame | None, *levels: LevelInfo) -> None:
+        site = None if call_loc is None else call_loc.site
+        self.ops.append((op, site, *levels))
+
+    def trace_encode(self, dest: Plaintext, level: int, call_loc: Frame | None) -> None:
+        self.note("encode", call_loc, dest.level)
+
+    def trace_send_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self.note("send", call_loc, ct.level)
+
+    def trace_recv_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self.note("recv", call_loc, ct.level)
+
+    def trace_encode_ckks(self, dest: Plaintext, call_loc: Frame | None) -> None:
+        self.note("encode", call_loc, dest.level)
+
+    def trace_encrypt(
+        self, dest: Ciphertext, pt: Plaintext, key: PublicKey, call_loc: Frame | None
+    ) -> None:
+        self.note("encrypt", call_loc, pt.level)
+
+    def trace_decrypt(
+        self, dest: Plaintext, ct1: Ciphertext, key: PrivateKey, call_loc: Frame | None
+    ) -> None:
+        self.note("decrypt", call_loc, ct1.level)
+
+    def trace_bootstrap(
+        self, dest: Ciphertext, ct1: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.note("bootstrap", call_loc, ct1.level)
+
+    def trace_mul_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.note("mul_ctct", call_loc, ct1.level, ct2.level)
+
+    def trace_add_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.note("add_ctct", call_loc, ct1.level, ct2.level)
+
+    def trace_sub_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.note("sub_ctct", call_loc, ct1.level, ct2.level)
+
+    def trace_mul_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.note("mul_ctpt", call_loc, ct.level, pt.level)
+
+    def trace_add_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.note("add_ctpt", call_loc, ct.level, pt.level)
+
+    def trace_sub_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.note("sub_ctpt", call_loc, ct.level, pt.level)
+
+    def trace_sum_ct(
+        self, dest: Ciphertext, ct: Ciphertext, bs: int, call_loc: Frame | None
+    ) -> None:
+        self.note("sum", call_loc, ct.level)
+
+    def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
+        self.note("alloc_ct", call_loc, ct.level)
+
+    def trace_alloc_pt(self, pt: Plaintext, call_loc: Frame | None) -> None:
+        self.note("alloc_pt", call_loc, pt.level)
+
+    def trace_dealloc_ct(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.note("dealloc_ct", call_loc, level)
+
+    def trace_dealloc_pt(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.note("dealloc_pt", call_loc, level)
+
+    def trace_repeat_skip(self, count: int) -> None:
+        self.ops.append(("skip", count))
+
 
 class Network:
     """This class represents a simulated nework and should only ever be
@@ -217,10 +441,27 @@ class Analyzer:
         analysis_list: list[AnalysisBase],
         scheme: SchemeModelPke,
         trace_loc: TraceLoc | None = None,
+        sample_loops: bool = False,
+        track_values: bool = True,
+        clocks: VirtualClocks | None = None,
     ):
         self.analysis_list = analysis_list
         self.scheme = scheme
         self.trace_loc = trace_loc
+        self.sample_loops = sample_loops
+
+        # without tracking, all values are arbitrary and operations on them
+        # cost nothing beyond the analyses themselves
+        self.track_values = track_values
+
+        # the evaluation keys generated so far, by kind, secret key and index
+        # (generating a key again replaces it rather than adding one)
+        self.eval_keys: set[tuple[EvalKeyKind, int, int]] = set()
+
+        # operations may be done from several threads (see `ThreadPoolExecutor`),
+        # so analyses are only ever called by one at a time
+        self.lock = threading.RLock()
+        self.clocks = VirtualClocks() if clocks is None else clocks
 
     def KeyGen(self) -> KeyPair:
         return KeyPair(PrivateKey(), PublicKey())
@@ -230,9 +471,10 @@ class Analyzer:
     ) -> Plaintext:
         caller_loc = code_loc.calling_frame()
         lv = LevelInfo(level, noise_scale_deg).max(self.scheme.min_level())
-        new = self._mk_pt(lv, value, caller_loc)
-        for analysis in self.analysis_list:
-            analysis.trace_encode(new, level, caller_loc)
+        with self.lock:
+            new = self._mk_pt(lv, self._slots(value), caller_loc)
+            for analysis in self.analysis_list:
+                analysis.trace_encode(new, level, caller_loc)
         return new
 
     def MakeCKKSPackedPlaintext(self, *args, **kwargs) -> Plaintext:  # type: ignore
@@ -241,9 +483,11 @@ class Analyzer:
 
         caller_loc = code_loc.calling_frame()
         if isinstance(args[0], list):
-            new = self._mk_pt(LevelInfo(level, noise_scale_deg), args[0], caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_encode_ckks(new, caller_loc)
+            lv = LevelInfo(level, noise_scale_deg)
+            with self.lock:
+                new = self._mk_pt(lv, self._slots(args[0]), caller_loc)
+                for analysis in self.analysis_list:
+                    analysis.trace_encode_ckks(new, caller_loc)
             return new
         raise NotSupportedException(
             "MakeCKKSPackedPlaintext: analyzer does not implement this overload",
@@ -252,9 +496,12 @@ class Analyzer:
 
     def Encrypt(self, public_key: PublicKey, plaintext: Plaintext) -> Ciphertext:
         caller_loc = code_loc.calling_frame()
-        new = self._mk_ct(level=plaintext.level, value=plaintext.value, loc=caller_loc)
-        for analysis in self.analysis_list:
-            analysis.trace_encrypt(new, plaintext, public_key, caller_loc)
+        with self.lock:
+            new = self._mk_ct(
+                level=plaintext.level, value=plaintext.value, loc=caller_loc
+            )
+            for analysis in self.analysis_list:
+                analysis.trace_encrypt(new, plaintext, public_key, caller_loc)
         return new
 
     def Decrypt(self, *args, **kwargs):
@@ -262,9 +509,10 @@ class Analyzer:
         if isinstance(args[0], PrivateKey) and isinstance(args[1], Ciphertext):
             pkey = args[0]
             ct = args[1]
-            new = self._mk_pt(ct.level, ct.value, caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_decrypt(new, ct, pkey, caller_loc)
+            with self.lock:
+                new = self._mk_pt(ct.level, ct.value, caller_loc)
+                for analysis in self.analysis_list:
+                    analysis.trace_decrypt(new, ct, pkey, caller_loc)
             return new
 
         raise NotSupportedException(
@@ -274,19 +522,23 @@ class Analyzer:
     def EvalMult(self, *args, **kwargs) -> Ciphertext:  # type: ignore
         caller_loc = code_loc.calling_frame()
         if isinstance(args[0], Ciphertext) and isinstance(args[1], Ciphertext):
-            level = self.scheme.mul_level(args[0].level, args[1].level)
-            new = self._mk_ct(level, VectorMath.pw_mul(args[0].value, args), caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_mul_ctct(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.mul_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_mul(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_mul_ctct(new, args[0], args[1], caller_loc)
             return new
 
         elif isinstance(args[0], Ciphertext) and isinstance(args[1], Plaintext):
-            level = self.scheme.mul_level(args[0].level, args[1].level)
-            new = self._mk_ct(
-                level, VectorMath.pw_mul(args[0].value, args[1].value), caller_loc
-            )
-            for analysis in self.analysis_list:
-                analysis.trace_mul_ctpt(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.mul_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_mul(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_mul_ctpt(new, args[0], args[1], caller_loc)
             return new
 
         raise NotSupportedException(
@@ -296,17 +548,23 @@ class Analyzer:
     def EvalAdd(self, *args, **kwargs) -> Ciphertext:  # type: ignore
         caller_loc = code_loc.calling_frame()
         if isinstance(args[0], Ciphertext) and isinstance(args[1], Ciphertext):
-            level = self.scheme.add_level(args[0].level, args[1].level)
-            new = self._mk_ct(level, VectorMath.pw_add(args[0].value, args), caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_add_ctct(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.add_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_add(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_add_ctct(new, args[0], args[1], caller_loc)
             return new
 
         elif isinstance(args[0], Ciphertext) and isinstance(args[1], Plaintext):
-            level = self.scheme.add_level(args[0].level, args[1].level)
-            new = self._mk_ct(level, VectorMath.pw_add(args[0].value, args), caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_add_ctpt(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.add_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_add(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_add_ctpt(new, args[0], args[1], caller_loc)
             return new
 
         raise NotSupportedException(
@@ -317,21 +575,27 @@ class Analyzer:
         caller_loc = code_loc.calling_frame()
 
         if isinstance(args[0], Ciphertext) and isinstance(args[1], Ciphertext):
-            level = self.scheme.add_level(args[0].level, args[1].level)
-            new = self._mk_ct(level, VectorMath.pw_add(args[0].value, args), caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_sub_ctct(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.add_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_sub(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_sub_ctct(new, args[0], args[1], caller_loc)
             return new
 
         elif isinstance(args[0], Ciphertext) and isinstance(args[1], Plaintext):
-            level = self.scheme.add_level(args[0].level, args[1].level)
-            new = self._mk_ct(level, VectorMath.pw_sub(args[0].value, args), caller_loc)
-            for analysis in self.analysis_list:
-                analysis.trace_sub_ctpt(new, args[0], args[1], caller_loc)
+            with self.lock:
+                level = self.scheme.add_level(args[0].level, args[1].level)
+                new = self._mk_ct(
+                    level, VectorMath.pw_sub(args[0].value, args[1].value), caller_loc
+                )
+                for analysis in self.analysis_list:
+                    analysis.trace_sub_ctpt(new, args[0], args[1], caller_loc)
             return new
 
         raise NotSupportedException(
-            "EvalAdd: analyzer does not implement this overload", caller_loc
+            "EvalSub: analyzer does not implement this overload", caller_loc
         )
     
     def EvalSum(
@@ -339,25 +603,15 @@ class Analyzer:
     ) -> Ciphertext:
         call_loc = code_loc.calling_frame()
 
-        new_val = None
-        if ciphertext.value is not None:
-            new_val = [0] * len(ciphertext.value)
-            for i in range(0, len(ciphertext.value)):
-                if bs == 0:
-                    clog2 = 0
-                else:
-                    clog2 = (len(ciphertext.value) - 1).bit_length()
-                for j in range(0, clog2):
-                    new_val[i] = ciphertext.value[(i + j) % len(ciphertext.value)]
-
-        new = self._mk_ct(
-            level=ciphertext.level,
-            value=new_val, # TODO: incorrect
-            loc=call_loc,
-        )
+        with self.lock:
+            new = self._mk_ct(
+                level=ciphertext.level,
+                value=VectorMath.sum(ciphertext.value, bs),
+                loc=call_loc,
+            )
 
-        for analysis in self.analysis_list:
-            analysis.trace_sum_ct(new, ciphertext, bs, call_loc)
+            for analysis in self.analysis_list:
+                analysis.trace_sum_ct(new, ciphertext, bs, call_loc)
 
         return new
 
@@ -365,69 +619,198 @@ class Analyzer:
         self, ciphertext: Ciphertext, _numIterations: int = 1, _precision: int = 0
     ) -> Ciphertext:
         caller_loc = code_loc.calling_frame()
-        new = self._mk_ct(
-            level=self.scheme.bootstrap_level(ciphertext.level),
-            value=ciphertext.value,
-            loc=caller_loc,
-        )
-        for analysis in self.analysis_list:
-            analysis.trace_bootstrap(new, ciphertext, caller_loc)
+        with self.lock:
+            new = self._mk_ct(
+                level=self.scheme.bootstrap_level(ciphertext.level),
+                value=ciphertext.value,
+                loc=caller_loc,
+            )
+            for analysis in self.analysis_list:
+                analysis.trace_bootstrap(new, ciphertext, caller_loc)
         return new
 
+    def EvalMultKeyGen(self, privateKey: PrivateKey) -> None:
+        caller_loc = code_loc.calling_frame()
+        self._eval_keygen(EvalKeyKind.MULT, privateKey, [0], caller_loc)
+
+    def EvalRotateKeyGen(
+        self,
+        privateKey: PrivateKey,
+        indexList: list[int],
+        publicKey: PublicKey | None = None,
+    ) -> None:
+        caller_loc = code_loc.calling_frame()
+        self._eval_keygen(EvalKeyKind.ROTATION, privateKey, indexList, caller_loc)
+
+    def EvalAtIndexKeyGen(
+        self,
+        privateKey: PrivateKey,
+        indexList: list[int],
+        publicKey: PublicKey | None = None,
+    ) -> None:
+        caller_loc = code_loc.calling_frame()
+        self._eval_keygen(EvalKeyKind.ROTATION, privateKey, indexList, caller_loc)
+
+    def EvalBootstrapKeyGen(self, privateKey: PrivateKey, slots: int) -> None:
+        caller_loc = code_loc.calling_frame()
+        self._eval_keygen(EvalKeyKind.BOOTSTRAP, privateKey, [slots], caller_loc)
+
     # -- analyzer specific API
 
     def ArbitraryCT(self, level=0, noiseScaleDeg=1) -> Ciphertext:
         caller_loc = code_loc.calling_frame()
         lv = LevelInfo(level, noiseScaleDeg).max(self.scheme.min_level())
-        return self._mk_ct(lv, None, caller_loc)
+        with self.lock:
+            return self._mk_ct(lv, None, caller_loc)
     
     def ArbitraryPT(self, level=0, noiseScaleDeg=1) -> Plaintext:
         caller_loc = code_loc.calling_frame()
         lv = LevelInfo(level, noiseScaleDeg).max(self.scheme.min_level())
-        return self._mk_pt(lv, None, caller_loc)
+        with self.lock:
+            return self._mk_pt(lv, None, caller_loc)
+
+    def Repeat(self, n: int, samples: int = 2) -> Iterator[int]:
+        """Iterate over `range(n)`, to mark a loop whose iterations all perform
+        the same operations (e.g. processing every row of a large database).
+
+        If the analyzer samples loops, iteration stops as soon as the last
+        `samples` iterations performed identical operations (at the same call
+        sites and on the same levels), and the analyses extrapolate the cost
+        of the remaining iterations from the last one. The skipped iterations
+        do not run, so anything they would have computed is missing afterwards.
+        """
+        if not self.sample_loops:
+            yield from range(n)
+            return
+
+        signature = IterationSignature()
+        self.analysis_list.insert(0, signature)
+        for analysis in self.analysis_list:
+            analysis.trace_repeat_begin()
+
+        try:
+            last: list[tuple] | None = None
+            same = 0
+            for i in range(n):
+                signature.ops = []
+                yield i
+
+                for analysis in self.analysis_list:
+                    analysis.trace_repeat_iteration()
+
+                same = same + 1 if signature.ops == last else 1
+                last = signature.ops
+
+                remaining = n - i - 1
+                if same >= samples and remaining > 0:
+                    for analysis in self.analysis_list:
+                        analysis.trace_repeat_skip(remaining)
+                    break
+
+        finally:
+            self.analysis_list.remove(signature)
+            for analysis in self.analysis_list:
+                analysis.trace_repeat_end()
 
     def MakeNetwork(self, send_bps: BPS, recv_bps: BPS, latency_ms: int) -> Network:
         """Create a simulated network with the given parameters."""
         nm = NetworkModel(send_bps.bps, recv_bps.bps, latency=latency_ms * 10**6)
         return Network(self, nm)
 
+    def ThreadPoolExecutor(
+        self, max_workers: int | None = None, **kwargs: Any
+    ) -> VirtualTimeExecutor:
+        """Stand-in for `concurrent.futures.ThreadPoolExecutor`, whose tasks run
+        concurrently in the estimate: each of the `max_workers` workers has its
+        own simulated clock, and waiting for a future (or for the pool to shut
+        down) waits for its task on the clocks. Other arguments of
+        `ThreadPoolExecutor` are accepted and ignored."""
+        return VirtualTimeExecutor(self.clocks, max_workers)
+
+    def Thread(self, *args: Any, **kwargs: Any) -> VirtualThread:
+        """Stand-in for `threading.Thread`, whose simulated clock starts at the
+        time of the thread that starts it, and which joining waits for on the
+        clocks. Plain threads start at time 0 and are never waited for."""
+        return VirtualThread(self.clocks, *args, **kwargs)
+
+    def wait(
+        self,
+        fs: Iterable[Future],
+        timeout: float | None = None,
+        return_when: str = ALL_COMPLETED,
+    ) -> tuple[set[Future], set[Future]]:
+        """Stand-in for `concurrent.futures.wait`, which also waits for the
+        futures of `ThreadPoolExecutor` on the clocks."""
+        return threads.wait(fs, timeout, return_when)
+
+    def as_completed(
+        self, fs: Iterable[Future], timeout: float | None = None
+    ) -> Iterator[Future]:
+        """Stand-in for `concurrent.futures.as_completed`, which yields the
+        futures of `ThreadPoolExecutor` in the order their tasks finish in the
+        estimate."""
+        return threads.as_completed(fs, timeout)
+
+    def _slots(self, values: list) -> np.ndarray | None:
+        return VectorMath.slots(values) if self.track_values else None
+
     def _dealloc_ct(self, vid: int, level: LevelInfo) -> None:
         loc = None
         if self.trace_loc is not None:
             loc = self.trace_loc.get_current_frame()
 
-        for analysis in self.analysis_list:
-            analysis.trace_dealloc_ct(vid, level, loc)
+        with self.lock:
+            for analysis in self.analysis_list:
+                analysis.trace_dealloc_ct(vid, level, loc)
 
     def _dealloc_pt(self, vid: int, level: LevelInfo) -> None:
         loc = None
         if self.trace_loc is not None:
             loc = self.trace_loc.get_current_frame()
 
-        for analysis in self.analysis_list:
-            analysis.trace_dealloc_pt(vid, level, loc)
+        with self.lock:
+            for analysis in self.analysis_list:
+                analysis.trace_dealloc_pt(vid, level, loc)
 
     def _mk_ct(self, level: LevelInfo, value: Any, loc: Frame | None) -> Ciphertext:
         ct = Ciphertext(level=level, value=value)
         for analysis in self.analysis_list:
             analysis.trace_alloc_ct(ct, loc)
-        ct.set_finalizer(weakref.finalize(ct, self._dealloc_ct, ct.id, level))
+        ct.set_finalizer(self._dealloc_ct)
         return ct
 
     def _mk_pt(self, level: LevelInfo, value: Any, loc: Frame | None) -> Plaintext:
         pt = Plaintext(level=level, value=value)
         for analysis in self.analysis_list:
             analysis.trace_alloc_pt(pt, loc)
-        pt.set_finalizer(weakref.finalize(pt, self._dealloc_ct, pt.id, level))
+        pt.set_finalizer(self._dealloc_pt)
         return pt
 
+    def _eval_keygen(
+        self,
+        kind: EvalKeyKind,
+        key: PrivateKey,
+        indices: Iterable[int],
+        loc: Frame | None,
+    ) -> None:
+        with self.lock:
+            new = set((kind, key.id, i) for i in indices) - self.eval_keys
+            if not new:
+                return
+
+            self.eval_keys |= new
+            for analysis in self.analysis_list:
+                analysis.trace_eval_keygen(kind, len(new), loc)
+
     def _send_ciphertext(self, ct: Ciphertext, nm: NetworkModel, loc: Frame | None):
-        for analysis in self.analysis_list:
-            analysis.trace_send_ct(ct, nm, loc)
+        with self.lock:
+            for analysis in self.analysis_list:
+                analysis.trace_send_ct(ct, nm, loc)
 
     def _recv_ciphertext(self, ct: Ciphertext, nm: NetworkModel, loc: Frame | None):
-        for analysis in self.analysis_list:
-            analysis.trace_recv_ct(ct, nm, loc)
+        with self.lock:
+            for analysis in self.analysis_list:
+                analysis.trace_recv_ct(ct, nm, loc)
 
     all_context_fns = set(
         [
@@ -1,13 +1,19 @@
+import bisect
 from collections import OrderedDict
 import enum
 import json
-import time
+import math
+import os
+import random
+import threading
 from typing import Any, Callable, Iterable, TextIO
 
 import openfhe
 import psutil
 
 import dioptra_native
+from dioptra.pke.analyzer import EvalKeyKind
+from dioptra.pke.cost_model import LinearCostModel, SizeTable
 from dioptra.pke.scheme import (
     LevelInfo,
     SchemeModelBFV,
@@ -15,7 +21,9 @@ from dioptra.pke.scheme import (
     SchemeModelCKKS,
     SchemeModelPke,
 )
-from dioptra.utils.measurement import format_ns
+from dioptra.utils.measurement import format_ns, merge_setup_memory
+from dioptra.utils.sampling import SamplingPolicy
+from dioptra.utils.threads import omp_threads, scale_to_threads
 
 
 class EventKind(enum.Enum):
@@ -45,29 +53,42 @@ class Event:
         ]
     )
 
-    def __init__(
-        self,
+    __slots__ = ("kind", "arg_level1", "arg_level2")
+
+    _interned: dict[tuple[EventKind, LevelInfo | None, LevelInfo | None], "Event"] = {}
+    _lock = threading.Lock()
+
+    kind: EventKind
+    arg_level1: LevelInfo | None
+    arg_level2: LevelInfo | None
+
+    def __new__(
+        cls,
         kind: EventKind,
         arg_level1: LevelInfo | None = None,
         arg_level2: LevelInfo | None = None,
-    ):
-        self.kind = kind
-
-        # if arg_depth2 is specified, arg_depth1 must be specified as well
-        assert arg_level2 is None or arg_level1 is not None
-        self.arg_level1 = arg_level1
-        self.arg_level2 = arg_level2
+    ) -> "Event":
+        # events are interned (like `LevelInfo`) and so compare by identity
+        key = (kind, arg_level1, arg_level2)
+        e = cls._interned.get(key)
+        if e is None:
+            # if arg_depth2 is specified, arg_depth1 must be specified as well
+            assert arg_level2 is None or arg_level1 is not None
+            with cls._lock:
+                e = cls._interned.get(key)
+                if e is None:
+                    e = object.__new__(cls)
+                    object.__setattr__(e, "kind", kind)
+                    object.__setattr__(e, "arg_level1", arg_level1)
+                    object.__setattr__(e, "arg_level2", arg_level2)
+                    cls._interned[key] = e
+        return e
 
-    def __eq__(self, value: object) -> bool:
-        return (
-            isinstance(value, Event)
-            and self.kind == value.kind
-            and self.arg_level1 == value.arg_level1
-            and self.arg_level2 == value.arg_level2
-        )
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Event is immutable (cannot set '{name}')")
 
-    def __hash__(self) -> int:
-        return hash((self.kind, self.arg_level1, self.arg_level2))
+    def __reduce__(self):
+        return (Event, (self.kind, self.arg_level1, self.arg_level2))
 
     def to_dict(self) -> dict[str, Any]:
         return {
@@ -82,11 +103,11 @@ class Event:
 
     def __str__(self) -> str:
         if self.arg_level2 is not None:
-            return f"Event(f{self.kind.name}, f{self.arg_level1}, f{self.arg_level2})"
+            return f"Event({self.kind.name}, {self.arg_level1}, {self.arg_level2})"
         elif self.arg_level1 is not None:
-            return f"Event(f{self.kind.name}, f{self.arg_level1})"
+            return f"Event({self.kind.name}, {self.arg_level1})"
         else:
-            return f"Event(f{self.kind.name})"
+            return f"Event({self.kind.name})"
 
     def is_commutative(self) -> bool:
         return self.kind in Event.commutative_event_kinds
@@ -102,17 +123,65 @@ class Event:
 
             return LevelInfo.from_dict(d[s])
 
-        e = Event(EventKind.ENCODE)
-        e.kind = EventKind(d["kind"])
-        e.arg_level1 = read_level("arg_level1")
-        e.arg_level2 = read_level("arg_level2")
-        return e
+        return Event(
+            EventKind(d["kind"]), read_level("arg_level1"), read_level("arg_level2")
+        )
 
 
 class RuntimeTable:
-    def __init__(self, runtimes: dict[Event, int], is_bfv: bool = False):
+    """Average runtime of each calibrated event.
+
+    Lookups go through a dense table indexed by event kind and the `index` of
+    both argument levels, which has commutativity and (for BFV) the
+    normalisation of the noise scale degree folded in. The table is compiled
+    on first use, and the entries of levels it has not seen are filled in when
+    they show up (growing the table geometrically, so that traces which keep
+    creating levels do not rebuild it every time).
+
+    Events that were not calibrated are filled in from `model` (if given),
+    and every lookup of such an event is counted in `modelled_uses`. If the
+    calibration recorded confidence intervals (`ci`), `ci_ns` is the 95%
+    confidence interval of the sum of all looked up runtimes: the intervals
+    of all lookups of an event add up (they share the same measured average),
+    while those of different events, which were measured independently, are
+    combined as the root of the sum of their squares.
+    """
+
+    def __init__(
+        self,
+        runtimes: dict[Event, int],
+        is_bfv: bool = False,
+        model: LinearCostModel | None = None,
+        ci: dict[Event, float] | None = None,
+    ):
         self.runtimes = runtimes
         self.is_bfv = is_bfv
+        self.model = model
+        self.ci = {} if ci is None else ci
+        self.event_ids = {e: i for (i, e) in enumerate(runtimes)}
+        self.kind_count = max(k.value for k in EventKind) + 1
+        # the number of levels that are filled in, and the number of levels
+        # there is room for in the table
+        self.level_count = 0
+        self.stride = 0
+        self.dense: list[int] = []
+        self.modelled = bytearray()
+        self.dense_ci: list[float] = []
+        # the id (in `event_ids`) of the event each entry of `dense_ci` is for
+        self.dense_event: list[int] = []
+
+        self.modelled_uses: dict[Event, int] = {}
+        self.modelled_ns = 0
+        # the summed up absolute confidence interval of every event id
+        self.ci_uses: dict[int, float] = {}
+
+        # the events at every (table) level, and the indices of all levels
+        # that are looked up as a given table level
+        self.events_at: dict[LevelInfo | None, list[Event]] = {}
+        for e in runtimes:
+            for lv in {e.arg_level1, e.arg_level2}:
+                self.events_at.setdefault(lv, []).append(e)
+        self.indices: dict[LevelInfo | None, list[int]] = {}
 
     def reset_noise_scale_deg(self, level: LevelInfo | None) -> LevelInfo | None:
         if level is None:
@@ -121,38 +190,199 @@ class RuntimeTable:
         else:
             return LevelInfo(level.level, 1)
 
-    def get_runtime_ns(self, e: Event) -> int:
-        if self.is_bfv:
-            e = Event(
-                e.kind,
-                self.reset_noise_scale_deg(e.arg_level1),
-                self.reset_noise_scale_deg(e.arg_level2),
+    def key(self, level: LevelInfo | None) -> LevelInfo | None:
+        return self.reset_noise_scale_deg(level) if self.is_bfv else level
+
+    def compile(self) -> None:
+        """Fill in the entries of all levels interned since the last call,
+        growing the table (by at least doubling it) if it is too small."""
+        levels: list[LevelInfo | None] = [None]
+        levels.extend(LevelInfo.interned())
+        n = len(levels)
+        old = self.level_count
+        if n <= old:
+            return
+
+        if n > self.stride:
+            self.grow(max(n, 2 * self.stride))
+        stride = self.stride
+        dense = self.dense
+        dense_ci = self.dense_ci
+        dense_event = self.dense_event
+
+        keys = [self.key(lv) for lv in levels]
+        for i in range(old, n):
+            self.indices.setdefault(keys[i], []).append(i)
+
+        def fill(kind: EventKind, lev1: LevelInfo | None, lev2: LevelInfo | None, e):
+            base = kind.value * stride * stride
+            indices2 = self.indices.get(lev2, [])
+            # the indices are in order, so the new ones are at the end
+            new2 = indices2[bisect.bisect_left(indices2, old) :]
+            for i1 in self.indices.get(lev1, []):
+                for i2 in indices2 if i1 >= old else new2:
+                    dense[base + i1 * stride + i2] = self.runtimes[e]
+                    if dense_ci:
+                        dense_ci[base + i1 * stride + i2] = self.ci.get(e, 0.0)
+                        dense_event[base + i1 * stride + i2] = self.event_ids[e]
+
+        # only events at one of the new levels can fill in new entries
+        events = {e for k in set(keys[old:]) for e in self.events_at.get(k, [])}
+
+        # swapped arguments first, so that exact matches take precedence
+        for e in events:
+            if e.arg_level2 is not None and e.is_commutative():
+                fill(e.kind, e.arg_level2, e.arg_level1, e)
+
+        for e in events:
+            fill(e.kind, e.arg_level1, e.arg_level2, e)
+
+        if self.model is not None:
+            for kind in EventKind:
+                base = kind.value * stride * stride
+                rows = self.model.predict(kind, keys[old:], keys)
+                if rows is None:
+                    continue
+                cols = self.model.predict(kind, keys[:old], keys[old:])
+                assert cols is not None
+
+                def fill_gaps(start: int, predicted: list[int]) -> None:
+                    for i, ns in enumerate(predicted, start):
+                        if dense[i] < 0 and ns >= 0:
+                            dense[i] = ns
+                            self.modelled[i] = 1
+
+                for r, i1 in enumerate(range(old, n)):
+                    fill_gaps(base + i1 * stride, rows[r].tolist())
+                for i1 in range(0, old):
+                    fill_gaps(base + i1 * stride + old, cols[i1].tolist())
+
+        self.level_count = n
+
+    def grow(self, stride: int) -> None:
+        """Move the filled in entries into a table of `stride` levels."""
+        old = self.stride
+        n = self.level_count
+        dense = [-1] * (self.kind_count * stride * stride)
+        modelled = bytearray(len(dense))
+        dense_ci = [0.0] * len(dense) if self.ci else []
+        dense_event = [0] * len(dense) if self.ci else []
+        for k in range(0, self.kind_count):
+            for i in range(0, n):
+                src = (k * old + i) * old
+                dst = (k * stride + i) * stride
+                dense[dst : dst + n] = self.dense[src : src + n]
+                modelled[dst : dst + n] = self.modelled[src : src + n]
+                if dense_ci:
+                    dense_ci[dst : dst + n] = self.dense_ci[src : src + n]
+                    dense_event[dst : dst + n] = self.dense_event[src : src + n]
+
+        self.stride = stride
+        self.dense = dense
+        self.modelled = modelled
+        self.dense_ci = dense_ci
+        self.dense_event = dense_event
+
+    def lookup(
+        self,
+        kind: EventKind,
+        lev1: LevelInfo | None = None,
+        lev2: LevelInfo | None = None,
+    ) -> int:
+        i1 = 0 if lev1 is None else lev1.index
+        i2 = 0 if lev2 is None else lev2.index
+        if i1 >= self.level_count or i2 >= self.level_count:
+            self.compile()
+
+        n = self.stride
+        i = (kind.value * n + i1) * n + i2
+        ns = self.dense[i]
+        if ns < 0:
+            raise NotImplementedError(
+                f"No runtime found for event: {Event(kind, lev1, lev2)}"
             )
 
-        if e in self.runtimes:
-            return self.runtimes[e]
-        elif e.arg_level2 is not None and e.is_commutative():
-            e_swaped = Event(e.kind, e.arg_level2, e.arg_level1)
-            if e_swaped in self.runtimes:
-                return self.runtimes[e_swaped]
+        if self.modelled[i]:
+            self.note_modelled(Event(kind, lev1, lev2), ns)
+
+        if self.dense_ci and self.dense_ci[i] > 0:
+            self.note_ci(self.dense_event[i], ns * self.dense_ci[i])
+
+        return ns
+
+    @property
+    def ci_ns(self) -> float:
+        return math.sqrt(sum(ci * ci for ci in self.ci_uses.values()))
+
+    def reset_notes(self) -> None:
+        """Forget the modelled lookups and confidence intervals noted so far,
+        so that the table can be reused for another estimate."""
+        self.modelled_uses = {}
+        self.modelled_ns = 0
+        self.ci_uses = {}
 
-        raise NotImplementedError(f"No runtime found for event: {e}")
+    def note_ci(self, event_id: int, ci_ns: float) -> None:
+        self.ci_uses[event_id] = self.ci_uses.get(event_id, 0.0) + ci_ns
+
+    def note_modelled(self, e: Event, ns: int, count: int = 1) -> None:
+        self.modelled_uses[e] = self.modelled_uses.get(e, 0) + count
+        self.modelled_ns += ns * count
+
+    def get_runtime_ns(self, e: Event) -> int:
+        return self.lookup(e.kind, e.arg_level1, e.arg_level2)
 
 
 class PKECalibrationData:
     def __init__(self, scheme: SchemeModelPke):
-        self.runtime_samples: dict[Event, list[int]] = {}
+        self._runtime_samples: dict[Event, list[int]] | None = {}
+        # for data loaded lazily: how to load the samples, and their averages
+        self._load_samples: Callable[[], dict[Event, list[int]]] | None = None
+        self._avg_runtimes: dict[Event, int] = {}
         self.scheme: SchemeModelPke = scheme
-        self.ct_mem: dict[int, int] = {}
-        self.pt_mem: dict[int, int] = {}
+        self.ct_mem: dict[int, int] = SizeTable()
+        self.pt_mem: dict[int, int] = SizeTable()
         self.setup_memory_size = 0
+        # the size of one evaluation key of every kind (for bootstrapping, of
+        # all keys generated by one `EvalBootstrapKeyGen`)
+        self.eval_key_mem: dict[EvalKeyKind, int] = {}
         self.metadata: str|None = None
+        self.cost_model: LinearCostModel | None = None
+        # relative 95% confidence interval of the mean runtime of each event
+        # measured with an adaptive sampling policy
+        self.runtime_ci: dict[Event, float] = {}
+        # the number of OpenMP threads the runtimes were measured with, and
+        # the samples measured with other thread counts (if any)
+        self.threads: int | None = None
+        self.thread_samples: dict[int, dict[Event, list[int]]] = {}
+
+    @property
+    def runtime_samples(self) -> dict[Event, list[int]]:
+        if self._runtime_samples is None:
+            assert self._load_samples is not None
+            self._runtime_samples = self._load_samples()
+            self._load_samples = None
+
+        return self._runtime_samples
+
+    @runtime_samples.setter
+    def runtime_samples(self, samples: dict[Event, list[int]]) -> None:
+        self._runtime_samples = samples
+        self._load_samples = None
+
+    def set_lazy_runtime_samples(
+        self, load: Callable[[], dict[Event, list[int]]], avgs: dict[Event, int]
+    ) -> None:
+        """Only load the runtime samples once they are used. Until then, their
+        averages are `avgs`."""
+        self._runtime_samples = None
+        self._load_samples = load
+        self._avg_runtimes = avgs
 
     def set_memory_tables(
         self, pt_data: dict[int, int] = {}, ct_data: dict[int, int] = {}
     ) -> None:
-        self.ct_mem = ct_data
-        self.pt_mem = pt_data
+        self.ct_mem = SizeTable(ct_data)
+        self.pt_mem = SizeTable(pt_data)
 
     def set_setup_memory_estimate(self, size: int) -> None:
         self.setup_memory_size = size
@@ -184,9 +414,33 @@ class PKECalibrationData:
             },
         }
 
+        if self.eval_key_mem:
+            obj["memory"]["eval_keys"] = [
+                (kind.value, size) for (kind, size) in self.eval_key_mem.items()
+            ]
+
         if self.metadata is not None:
             obj["metadata"] = self.metadata
 
+        if self.cost_model is not None:
+            obj["cost_model"] = [
+                (kind.value, *model) for (kind, *model) in self.cost_model.to_list()
+            ]
+
+        if self.runtime_ci:
+            obj["runtime_ci"] = [
+                (evt.to_dict(), ci) for (evt, ci) in self.runtime_ci.items()
+            ]
+
+        if self.threads is not None:
+            obj["threads"] = self.threads
+
+        if self.thread_samples:
+            obj["thread_runtime"] = [
+                (threads, [(evt.to_dict(), ts) for (evt, ts) in smps.items()])
+                for (threads, smps) in self.thread_samples.items()
+            ]
+
         return obj
 
     @staticmethod
@@ -195,14 +449,37 @@ class PKECalibrationData:
         evts = [(Event.from_dict(evt), ts) for (evt, ts) in obj["runtime"]]
         cal = PKECalibrationData(scheme)
         cal.runtime_samples = dict(evts)
-        cal.pt_mem = dict(obj["memory"]["plaintext"])
-        cal.ct_mem = dict(obj["memory"]["ciphertext"])
+        cal.pt_mem = SizeTable(obj["memory"]["plaintext"])
+        cal.ct_mem = SizeTable(obj["memory"]["ciphertext"])
         cal.setup_memory_size = obj["memory"]["setup"]
+        cal.eval_key_mem = dict(
+            (EvalKeyKind(kind), size)
+            for (kind, size) in obj["memory"].get("eval_keys", [])
+        )
         cal.scheme = scheme
 
         if "metadata" in obj:
             cal.metadata = obj["metadata"]
 
+        if "cost_model" in obj:
+            cal.cost_model = LinearCostModel.from_list(
+                (EventKind(kind), *model) for (kind, *model) in obj["cost_model"]
+            )
+
+        if "runtime_ci" in obj:
+            cal.runtime_ci = dict(
+                (Event.from_dict(evt), ci) for (evt, ci) in obj["runtime_ci"]
+            )
+
+        if "threads" in obj:
+            cal.threads = obj["threads"]
+
+        if "thread_runtime" in obj:
+            cal.thread_samples = {
+                threads: dict((Event.from_dict(evt), ts) for (evt, ts) in smps)
+                for (threads, smps) in obj["thread_runtime"]
+            }
+
         return cal
 
     def write_json(self, f: str):
@@ -215,12 +492,120 @@ class PKECalibrationData:
             obj = json.load(fh)
             return PKECalibrationData.from_dict(obj)
 
-    def avg_runtime_table(self) -> RuntimeTable:
+    def merge(self, other: "PKECalibrationData") -> None:
+        """Add the samples of a calibration of another group of events of the
+        same context to this one. Samples measured at a different number of
+        threads than this calibration's are added to its `thread_samples`."""
+        if self.threads is None:
+            self.threads = other.threads
+
+        def samples_at(threads: int | None) -> dict[Event, list[int]]:
+            if threads is None or threads == self.threads:
+                return self.runtime_samples
+            return self.thread_samples.setdefault(threads, {})
+
+        measured = [(other.threads, other.runtime_samples)]
+        for threads, smps in measured + list(other.thread_samples.items()):
+            mine = samples_at(threads)
+            for e, runtimes in smps.items():
+                mine.setdefault(e, []).extend(runtimes)
+
+        # the bootstrapping level is only known once bootstrapping was measured
+        if Event(EventKind.EVAL_BOOTSTRAP) in other.runtime_samples:
+            self.scheme = other.scheme
+
+        if samples_at(other.threads) is self.runtime_samples:
+            self.runtime_ci.update(other.runtime_ci)
+        self.ct_mem.update(other.ct_mem)
+        self.pt_mem.update(other.pt_mem)
+        self.eval_key_mem.update(other.eval_key_mem)
+        self.setup_memory_size = merge_setup_memory(
+            self.setup_memory_size, other.setup_memory_size
+        )
+
+    def validate_cost_model(
+        self, validation_pairs: list[tuple[LevelInfo, LevelInfo]]
+    ) -> dict[EventKind, float]:
+        """Set the cost model, fit to all samples, along with its error on the
+        events at `validation_pairs` when fit to all other samples."""
+        pairs = set(validation_pairs)
+        held_out = set(
+            e for e in self.runtime_samples if (e.arg_level1, e.arg_level2) in pairs
+        )
+        errors = self.fit_cost_model(held_out).errors
+        self.cost_model = self.fit_cost_model()
+        self.cost_model.errors = errors
+        return errors
+
+    def avg_runtimes(self) -> dict[Event, int]:
+        if self._runtime_samples is None:
+            return dict(self._avg_runtimes)
+
         table = {}
         for event, runtimes in self.runtime_samples.items():
             table[event] = sum(runtimes) // len(runtimes)
 
-        return RuntimeTable(table, self.scheme.name == "BFV")
+        return table
+
+    def thread_counts(self) -> list[int]:
+        """The thread counts runtimes were measured with."""
+        counts = set(self.thread_samples.keys())
+        if self.threads is not None:
+            counts.add(self.threads)
+        return sorted(counts)
+
+    def thread_runtimes(self, threads: int) -> dict[Event, int]:
+        """Average runtimes at `threads` OpenMP threads, interpolated (or
+        extrapolated) from the runtimes at the measured thread counts."""
+        tables = {
+            t: dict((e, sum(ts) // len(ts)) for (e, ts) in smps.items())
+            for (t, smps) in self.thread_samples.items()
+        }
+        if self.threads is not None:
+            tables[self.threads] = self.avg_runtimes()
+
+        table = {}
+        for event in set(e for smps in tables.values() for e in smps):
+            runtimes = dict(
+                (t, avgs[event]) for (t, avgs) in tables.items() if event in avgs
+            )
+            table[event] = scale_to_threads(runtimes, threads)
+
+        return table
+
+    def fit_cost_model(self, held_out: set[Event] = set()) -> LinearCostModel:
+        """Fit a cost model to the average runtimes of all events, validated
+        against the `held_out` events (which it is not fit to)."""
+        avgs = self.avg_runtimes()
+        model = LinearCostModel.fit(
+            (e.kind, e.arg_level1, e.arg_level2, ns)
+            for (e, ns) in avgs.items()
+            if e not in held_out
+        )
+        model.validate(
+            (e.kind, e.arg_level1, e.arg_level2, ns)
+            for (e, ns) in avgs.items()
+            if e in held_out
+        )
+        return model
+
+    def avg_runtime_table(self, threads: int | None = None) -> RuntimeTable:
+        """The table of average runtimes, at `threads` OpenMP threads if given
+        and runtimes were measured at several thread counts."""
+        if threads is not None and threads != self.threads and self.thread_samples:
+            runtimes = self.thread_runtimes(threads)
+            model = LinearCostModel.fit(
+                (e.kind, e.arg_level1, e.arg_level2, ns) for (e, ns) in runtimes.items()
+            )
+            return RuntimeTable(runtimes, self.scheme.name == "BFV", model)
+
+        model = self.cost_model
+        if model is None:
+            model = self.fit_cost_model()
+
+        return RuntimeTable(
+            self.avg_runtimes(), self.scheme.name == "BFV", model, self.runtime_ci
+        )
 
     def __eq__(self, value: object) -> bool:
         def key_eq(k: Event) -> bool:
@@ -238,26 +623,100 @@ class PKECalibrationData:
         )
 
 
-class RuntimeSample:
+class CalibrationJournal:
+    """Measurements of a calibration in progress, checkpointed to a file.
+
+    Every `record`ed chunk of calibration data is appended to the file as a
+    line of JSON (and flushed to disk), so that a calibration that was
+    interrupted can be resumed from the chunks recorded so far. A chunk that
+    was only partially written when the calibration was interrupted is
+    ignored, and cut off before recording further chunks."""
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.fh: TextIO | None = None
+
+    def read(self) -> PKECalibrationData | None:
+        """All data recorded so far, or None if nothing was recorded."""
+        if not os.path.exists(self.file):
+            return None
+
+        data = None
+        with open(self.file) as fh:
+            for line in fh:
+                if not line.endswith("\n"):
+                    break
+
+                try:
+                    chunk = PKECalibrationData.from_dict(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+
+                if data is None:
+                    data = chunk
+                else:
+                    data.merge(chunk)
+
+        return data
+
+    def record(self, chunk: PKECalibrationData) -> None:
+        if self.fh is None:
+            self.truncate()
+            self.fh = open(self.file, "a")
+
+        self.fh.write(json.dumps(chunk.to_dict()) + "\n")
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def truncate(self) -> None:
+        """Cut off a partially written chunk at the end of the file, so that
+        chunks recorded after it are not appended to it."""
+        if not os.path.exists(self.file):
+            return
+
+        with open(self.file, "rb+") as fh:
+            content = fh.read()
+            fh.truncate(content.rfind(b"\n") + 1)
+
+    def remove(self) -> None:
+        """Discard the journal, once the calibration data was written."""
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+        if os.path.exists(self.file):
+            os.remove(self.file)
+
+
+class CalibrationPlan(enum.Enum):
+    """Which events to measure during calibration.
+
+    FULL measures binary operations at every pair of levels. SPARSE measures
+    them at all pairs of equal levels, all pairs involving the lowest or
+    highest level, and a random sample of the other pairs of every
+    combination of noise scale degrees. QUICK measures unary operations at
+    every few levels only, and binary operations at the diagonal and edges of
+    those. The runtimes of events that are not measured come from the cost
+    model fit to the ones that are."""
+
+    FULL = "full"
+    SPARSE = "sparse"
+    QUICK = "quick"
+
+
+class CalibrationGroup:
+    """A part of the measurements of a calibration, which can be taken
+    independently of (e.g. in parallel with) the other parts."""
+
     def __init__(
         self,
-        label: Event,
-        samples: PKECalibrationData,
-        on_exit: Callable[[int], None] | None = None,
+        levels: list[LevelInfo],
+        level_pairs: list[tuple[LevelInfo, LevelInfo]],
+        bootstrap: bool,
     ) -> None:
-        self.label = label
-        self.samples = samples
-        self.on_exit = on_exit
-
-    def __enter__(self):
-        self.begin = time.perf_counter_ns()
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        end = time.perf_counter_ns()
-        t = end - self.begin
-        self.samples.add_runtime_sample(self.label, t)
-        if self.on_exit is not None:
-            self.on_exit(t)
+        self.levels = levels
+        self.level_pairs = level_pairs
+        self.bootstrap = bootstrap
 
 
 class PKECalibration:
@@ -271,10 +730,23 @@ class PKECalibration:
         features: Iterable[openfhe.PKESchemeFeature],
         out: TextIO | None = None,
         sample_count: int = 5,
+        plan: CalibrationPlan = CalibrationPlan.FULL,
+        sampling: SamplingPolicy | None = None,
+        done: PKECalibrationData | None = None,
+        journal: CalibrationJournal | None = None,
+        events: set[EventKind] | None = None,
     ) -> None:
         self.params = params
         self.out = out
-        self.sample_count = sample_count
+        self.sampling = (
+            SamplingPolicy.fixed(sample_count) if sampling is None else sampling
+        )
+        self.plan = plan
+        # measurements of an earlier (interrupted) run, which are not repeated
+        self.done = done
+        self.journal = journal
+        # the kinds of events to measure (all, if None)
+        self.events = events
         self.key_pair = keypair
         self.cc = cc
         self.features = set(features)
@@ -286,6 +758,13 @@ class PKECalibration:
             self.scheme = SchemeModelBGV()
         elif self.is_bfv():
             self.scheme = SchemeModelBFV()
+            # BFV contexts are measured at both their levels, without pairs
+            # of different levels to plan or validate a cost model with
+            if plan != CalibrationPlan.FULL:
+                raise ValueError(
+                    f"the '{plan.value}' calibration plan does not apply to BFV"
+                    " contexts, which are always calibrated fully"
+                )
 
     def is_ckks(self) -> bool:
         return isinstance(self.params, openfhe.CCParamsCKKSRNS)
@@ -367,6 +846,82 @@ class PKECalibration:
                 for j in range(i, len(all)):
                     yield (all[i], all[j])
 
+    def plan_levels(self) -> list[LevelInfo]:
+        """The levels at which to measure unary operations."""
+        levels = list(self.all_levels())
+        if self.plan != CalibrationPlan.QUICK:
+            return levels
+
+        # every few levels of each noise scale degree, including the last
+        planned = []
+        for deg in sorted(set(lv.noise_scale_deg for lv in levels)):
+            of_deg = [lv for lv in levels if lv.noise_scale_deg == deg]
+            stride = max(1, len(of_deg) // 5)
+            planned.extend(of_deg[::stride])
+            if of_deg[-1] not in planned:
+                planned.append(of_deg[-1])
+
+        return planned
+
+    def plan_level_pairs(
+        self,
+    ) -> tuple[list[tuple[LevelInfo, LevelInfo]], list[tuple[LevelInfo, LevelInfo]]]:
+        """The pairs of levels at which to measure binary operations, and a
+        set of further pairs to validate the cost model with."""
+        if self.plan == CalibrationPlan.FULL:
+            return (list(self.level_pairs_comm()), [])
+
+        # pairs in the order of `level_pairs_comm`, by position in `all_levels`
+        all = list(self.all_levels())
+        position = {lv: i for (i, lv) in enumerate(all)}
+
+        def ordered(l1: LevelInfo, l2: LevelInfo) -> tuple[LevelInfo, LevelInfo]:
+            return (l1, l2) if position[l1] <= position[l2] else (l2, l1)
+
+        levels = self.plan_levels()
+        lowest = min(levels, key=lambda lv: (lv.level, lv.noise_scale_deg))
+        highest = max(levels, key=lambda lv: (lv.level, lv.noise_scale_deg))
+
+        planned: dict[tuple[LevelInfo, LevelInfo], None] = {}
+        for lv in levels:
+            for pair in [(lv, lv), ordered(lowest, lv), ordered(lv, highest)]:
+                planned[pair] = None
+
+        rest = [pair for pair in self.level_pairs_comm() if pair not in planned]
+        rng = random.Random(0)
+        rng.shuffle(rest)
+
+        if self.plan == CalibrationPlan.SPARSE:
+            strata: dict[tuple[int, int], list[tuple[LevelInfo, LevelInfo]]] = {}
+            for pair in rest:
+                key = (pair[0].noise_scale_deg, pair[1].noise_scale_deg)
+                strata.setdefault(key, []).append(pair)
+
+            per_stratum = max(1, len(levels) // len(strata)) if strata else 0
+            for pairs in strata.values():
+                for pair in pairs[:per_stratum]:
+                    planned[pair] = None
+
+        validation = [pair for pair in rest if pair not in planned]
+        return (list(planned), validation[: max(4, len(levels) // 4)])
+
+    def plan_groups(
+        self, count: int = 1
+    ) -> tuple[list[CalibrationGroup], list[tuple[LevelInfo, LevelInfo]]]:
+        """Split the calibration plan into (at most) `count` groups of about
+        equal size. Also returns the level pairs held out for validation,
+        which are part of the groups."""
+        levels = self.plan_levels()
+        (level_pairs, validation_pairs) = self.plan_level_pairs()
+        pairs = level_pairs + validation_pairs
+
+        groups = [
+            CalibrationGroup(levels[i::count], pairs[i::count], i == 0)
+            for i in range(0, count)
+        ]
+        groups = [g for g in groups if g.bootstrap or g.levels or g.level_pairs]
+        return (groups, validation_pairs)
+
     def gen_metadata(self) -> OrderedDict[str, Any]:
         meta = OrderedDict()
         meta["scheme"] = "Unknown?"
@@ -385,31 +940,112 @@ class PKECalibration:
         meta["plaintext modulus"] = self.params.GetPlaintextModulus()
         meta["ring dimension"] = self.params.GetRingDim()
         meta["num slots"] = self.num_slots()
+        meta["calibration plan"] = self.plan.value
+        meta["sampling"] = str(self.sampling)
+        meta["threads"] = omp_threads()
         return meta
 
-    def calibrate_base(self) -> PKECalibrationData:
+    def is_done(self, e: Event) -> bool:
+        """Whether `e` needs no more samples, as it is not to be measured or
+        was measured in an earlier run."""
+        if self.events is not None and e.kind not in self.events:
+            return True
+
+        if self.done is None or e not in self.done.runtime_samples:
+            return False
+
+        count = len(self.done.runtime_samples[e])
+        if self.sampling.is_adaptive():
+            return e in self.done.runtime_ci and count >= self.sampling.min_samples
+        return count >= self.sampling.min_samples
+
+    def eval_key_sizes(self) -> dict[EvalKeyKind, int]:
+        """The size of one evaluation key of every kind. The keys are generated
+        for fresh secret keys, so that they are measured apart from each other
+        and from the keys the context already holds."""
+        cc = self.cc
+        sizes = {}
+
+        secret_key = cc.KeyGen().secretKey
+        cc.EvalMultKeyGen(secret_key)
+        sizes[EvalKeyKind.MULT] = dioptra_native.eval_mult_keys_size(secret_key)
+
+        cc.EvalRotateKeyGen(secret_key, [1])
+        rotation = dioptra_native.eval_automorphism_key_sizes(secret_key)
+        sizes[EvalKeyKind.ROTATION] = sum(rotation.values()) // max(len(rotation), 1)
+
+        if openfhe.PKESchemeFeature.FHE in self.features and self.is_ckks():
+            secret_key = cc.KeyGen().secretKey
+            try:
+                cc.EvalBootstrapKeyGen(secret_key, self.num_slots())
+                bootstrap = dioptra_native.eval_automorphism_key_sizes(secret_key)
+                sizes[EvalKeyKind.BOOTSTRAP] = sum(bootstrap.values())
+            except Exception:
+                self.log("EvalBootstrapKeyGen threw exception, skipping!")
+
+        for kind, size in sizes.items():
+            self.log(f"Evaluation key {kind.value}: {size}")
+        return sizes
+
+    def calibrate_base(self, group: CalibrationGroup) -> PKECalibrationData:
+        # before generating any keys for measuring their size
         setup_size = psutil.Process().memory_info().rss
         samples = PKECalibrationData(self.scheme)
         samples.set_setup_memory_estimate(setup_size)
+        samples.threads = omp_threads()
         ct_mem: dict[int, int] = {}
         pt_mem: dict[int, int] = {}
 
         def measure(
-            label: EventKind, a1: LevelInfo | None = None, a2: LevelInfo | None = None
-        ):
+            kind: EventKind,
+            op: Callable[[], object],
+            a1: LevelInfo | None = None,
+            a2: LevelInfo | None = None,
+            *,
+            checkpoint: bool = True,
+        ) -> bool:
+            """Measure `op` as event `kind` (and record it in the journal if
+            `checkpoint`). Returns False if the event is already done."""
+            e = Event(kind, a1, a2)
+            if self.is_done(e):
+                return False
+
             if a1 is None and a2 is None:
-                self.log(f"Measuring {label}")
+                self.log(f"Measuring {kind}")
 
             elif a2 is None:
-                self.log(f"Measuring {label} depth={a1}")
+                self.log(f"Measuring {kind} depth={a1}")
 
             else:
-                self.log(f"Measuring {label} level1={a1} level2={a2}")
+                self.log(f"Measuring {kind} level1={a1} level2={a2}")
+
+            (runtimes, ci) = self.sampling.sample(op)
+            for ns in runtimes:
+                samples.add_runtime_sample(e, ns)
+
+            avg = sum(runtimes) // len(runtimes)
+            if self.sampling.is_adaptive():
+                samples.runtime_ci[e] = ci
+                self.log(f"   [{format_ns(avg)} +/- {100 * ci:.1f}%, {len(runtimes)}x]")
+            else:
+                self.log(f"   [{format_ns(avg)}, {len(runtimes)}x]")
+
+            if checkpoint:
+                record(e, runtimes)
+            return True
 
-            def on_exit(ns: int):
-                self.log(f"   [{format_ns(ns)}]")
+        def record(e: Event, runtimes: list[int]) -> None:
+            if self.journal is None:
+                return
 
-            return RuntimeSample(Event(label, a1, a2), samples, on_exit=on_exit)
+            chunk = PKECalibrationData(samples.scheme)
+            chunk.set_setup_memory_estimate(samples.setup_memory_size)
+            chunk.set_memory_tables(pt_mem, ct_mem)
+            chunk.eval_key_mem = samples.eval_key_mem
+            chunk.runtime_samples[e] = runtimes
+            if e in samples.runtime_ci:
+                chunk.runtime_ci[e] = samples.runtime_ci[e]
+            self.journal.record(chunk)
 
         cc = self.cc
         key_pair = self.key_pair
@@ -417,80 +1053,144 @@ class PKECalibration:
         max_mult_depth = self.params.GetMultiplicativeDepth()
         self.log(f"Max multiplicative depth: {max_mult_depth}")
         self.log(f"Slots: {self.num_slots()}")
-        bootstrap_lev = None
 
-        for iteration in range(0, self.sample_count):
-            self.log(f"Iteration {iteration}")
+        measured_keys = self.done is not None and self.done.eval_key_mem
+        if group.bootstrap and self.events is None and not measured_keys:
+            samples.eval_key_mem = self.eval_key_sizes()
 
-            # XXX: is this its own function?
-            if openfhe.PKESchemeFeature.FHE in self.features and self.is_ckks():
-                pt = self.encode(LevelInfo(max_mult_depth - 1, 1))
-                ct = cc.Encrypt(key_pair.publicKey, pt)
-                bsres = None
-                with measure(EventKind.EVAL_BOOTSTRAP):
-                    bsres = cc.EvalBootstrap(ct)
-
-                if bootstrap_lev is None:
-                    bootstrap_lev = LevelInfo(level=bsres.GetLevel(), noise_scale_deg=2)
-                    # update scheme with bootstrapping data
-                    samples.set_scheme(SchemeModelCKKS(bootstrap_lev))
-                    self.log(f"Bootstrap level: {bootstrap_lev}")
-
-            for level in self.all_levels():
-                with measure(EventKind.ENCODE, level):
-                    pt = self.encode(level)
-
-                with measure(EventKind.ENCRYPT, level):
-                    ct = cc.Encrypt(key_pair.publicKey, pt)
-
-                with measure(EventKind.DECRYPT, level):
-                    cc.Decrypt(key_pair.secretKey, ct)
-
-                with measure(EventKind.DECODE, level):
-                    self.decode(pt)
-
-                with measure(EventKind.EVAL_SUM, level):
-                    try:
-                        cc.EvalSum(ct, self.num_slots())
-                    except:
-                        self.log(f"EvalSum threw exception, skipping!")
-
-                if level.level not in ct_mem:
-                    ct_size = dioptra_native.ciphertext_size(ct)
-                    self.log(f"Ciphertext {level}: {ct_size}")
-                    ct_mem[level.level] = ct_size
-
-                if level.level not in pt_mem:
-                    pt_size = dioptra_native.plaintext_size(pt)
-                    self.log(f"Plaintext {level}: {pt_size}")
-                    pt_mem[level.level] = pt_size
+        # XXX: is this its own function?
+        if (
+            group.bootstrap
+            and openfhe.PKESchemeFeature.FHE in self.features
+            and self.is_ckks()
+        ):
+            pt = self.encode(LevelInfo(max_mult_depth - 1, 1))
+            ct = cc.Encrypt(key_pair.publicKey, pt)
+            bsres = None
+
+            def bootstrap():
+                nonlocal bsres
+                bsres = cc.EvalBootstrap(ct)
+
+            if measure(EventKind.EVAL_BOOTSTRAP, bootstrap, checkpoint=False):
+                bootstrap_lev = LevelInfo(level=bsres.GetLevel(), noise_scale_deg=2)
+                # update scheme with bootstrapping data
+                samples.set_scheme(SchemeModelCKKS(bootstrap_lev))
+                self.log(f"Bootstrap level: {bootstrap_lev}")
+                e = Event(EventKind.EVAL_BOOTSTRAP)
+                record(e, samples.runtime_samples[e])
+
+        level_kinds = [
+            EventKind.ENCODE,
+            EventKind.ENCRYPT,
+            EventKind.DECRYPT,
+            EventKind.DECODE,
+            EventKind.EVAL_SUM,
+        ]
+        for level in group.levels:
+            if all(self.is_done(Event(kind, level)) for kind in level_kinds):
+                continue
+
+            pt = self.encode(level)
+            ct = cc.Encrypt(key_pair.publicKey, pt)
+
+            # sizes first, so that they are part of every checkpoint of the level
+            if level.level not in ct_mem:
+                ct_size = dioptra_native.ciphertext_size(ct)
+                self.log(f"Ciphertext {level}: {ct_size}")
+                ct_mem[level.level] = ct_size
+
+            if level.level not in pt_mem:
+                pt_size = dioptra_native.plaintext_size(pt)
+                self.log(f"Plaintext {level}: {pt_size}")
+                pt_mem[level.level] = pt_size
+
+            measure(EventKind.ENCODE, lambda: self.encode(level), level)
+            measure(
+                EventKind.ENCRYPT, lambda: cc.Encrypt(key_pair.publicKey, pt), level
+            )
+            measure(
+                EventKind.DECRYPT, lambda: cc.Decrypt(key_pair.secretKey, ct), level
+            )
+            measure(EventKind.DECODE, lambda: self.decode(pt), level)
 
-            for level1, level2 in self.level_pairs_comm():
-                pt = self.scheme.arbitrary_pt(self.cc, level2)
-                ct1 = self.scheme.arbitrary_ct(self.cc, self.key_pair.publicKey, level1)
-                ct2 = self.scheme.arbitrary_ct(self.cc, self.key_pair.publicKey, level2)
+            try:
+                measure(
+                    EventKind.EVAL_SUM, lambda: cc.EvalSum(ct, self.num_slots()), level
+                )
+            except Exception:
+                self.log("EvalSum threw exception, skipping!")
 
-                with measure(EventKind.EVAL_ADD_CTCT, level1, level2):
-                    cc.EvalAdd(ct1, ct2)
+        pair_kinds = [
+            EventKind.EVAL_ADD_CTCT,
+            EventKind.EVAL_MULT_CTCT,
+            EventKind.EVAL_SUB_CTCT,
+            EventKind.EVAL_MULT_CTPT,
+            EventKind.EVAL_ADD_CTPT,
+            EventKind.EVAL_SUB_CTPT,
+        ]
+        for level1, level2 in group.level_pairs:
+            if all(self.is_done(Event(kind, level1, level2)) for kind in pair_kinds):
+                continue
+
+            pt = self.scheme.arbitrary_pt(self.cc, level2)
+            ct1 = self.scheme.arbitrary_ct(self.cc, self.key_pair.publicKey, level1)
+            ct2 = self.scheme.arbitrary_ct(self.cc, self.key_pair.publicKey, level2)
+
+            ops = [
+                lambda: cc.EvalAdd(ct1, ct2),
+                lambda: cc.EvalMult(ct1, ct2),
+                lambda: cc.EvalSub(ct1, ct2),
+                lambda: cc.EvalMult(ct1, pt),
+                lambda: cc.EvalAdd(ct1, pt),
+                lambda: cc.EvalSub(ct1, pt),
+            ]
+            for kind, op in zip(pair_kinds, ops):
+                measure(kind, op, level1, level2)
 
-                with measure(EventKind.EVAL_MULT_CTCT, level1, level2):
-                    cc.EvalMult(ct1, ct2)
+        samples.set_memory_tables(pt_mem, ct_mem)
+        return samples
 
-                with measure(EventKind.EVAL_SUB_CTCT, level1, level2):
-                    cc.EvalSub(ct1, ct2)
+    def log_plan(
+        self,
+        groups: list[CalibrationGroup],
+        validation_pairs: list[tuple[LevelInfo, LevelInfo]],
+    ) -> None:
+        levels = sum(len(g.levels) for g in groups)
+        pairs = sum(len(g.level_pairs) for g in groups) - len(validation_pairs)
+        self.log(
+            f"Calibration plan: {self.plan.value} ({levels} levels, {pairs} level"
+            f" pairs, {len(validation_pairs)} for validation)"
+        )
 
-                with measure(EventKind.EVAL_MULT_CTPT, level1, level2):
-                    cc.EvalMult(ct1, pt)
+    def finish(
+        self,
+        samples: PKECalibrationData,
+        validation_pairs: list[tuple[LevelInfo, LevelInfo]],
+    ) -> None:
+        """Fit the cost model of a calibration whose plan held out
+        `validation_pairs`, once all groups have been measured."""
+        if not validation_pairs:
+            return
 
-                with measure(EventKind.EVAL_ADD_CTPT, level1, level2):
-                    cc.EvalMult(ct1, pt)
+        for kind, error in samples.validate_cost_model(validation_pairs).items():
+            self.log(f"Cost model error for {kind.name}: {100 * error:.1f}%")
 
-                with measure(EventKind.EVAL_ADD_CTPT, level1, level2):
-                    cc.EvalSub(ct1, pt)
+    def resume(self, samples: PKECalibrationData) -> PKECalibrationData:
+        """The measurements of the earlier run (if any) followed by `samples`."""
+        if self.done is None:
+            return samples
 
-        samples.set_memory_tables(pt_mem, ct_mem)
-        return samples
+        self.done.merge(samples)
+        return self.done
 
     def calibrate(self) -> PKECalibrationData:
         self.log("Beginning calibration...")
-        return self.calibrate_base()
+        ([group], validation_pairs) = self.plan_groups()
+        self.log_plan([group], validation_pairs)
+        if self.done is not None:
+            self.log(f"Resuming: {len(self.done.runtime_samples)} events measured")
+
+        samples = self.resume(self.calibrate_base(group))
+        self.finish(samples, validation_pairs)
+        return samples
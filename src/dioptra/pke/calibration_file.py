@@ -0,0 +1,186 @@
+"""Binary PKE calibration files.
+
+A binary calibration file starts with a fixed header (magic bytes, format
+version and the length of a JSON metadata block), followed by the metadata
+and then by raw little-endian arrays, each aligned to `_ALIGN` bytes. The
+metadata holds everything that is small (scheme, memory tables, cost model,
+...) along with the offset, type and shape of every array, so that the arrays
+can be memory-mapped rather than read.
+
+For every table of samples (the runtimes, and the runtimes at every other
+thread count) there are arrays of
+- `events`: the kind, and level and noise scale degree of both arguments
+  (-1 for missing arguments) of every event,
+- `offsets`: where the samples of every event start in `samples` (with one
+  more entry for the end of the last event's samples),
+- `samples`: the runtimes (in ns) of all samples,
+- `mean`: the average runtime of every event,
+- `ci`: the recorded confidence interval of every event (NaN if none).
+
+Converting to and from JSON is lossless. Loading only maps the file, and the
+samples are only turned into Python objects once they are accessed, since
+estimates only need the averages.
+"""
+
+import json
+import struct
+from typing import Any
+
+import numpy as np
+
+from dioptra.pke.calibration import Event, EventKind, PKECalibrationData
+from dioptra.pke.scheme import LevelInfo
+
+CALIBRATION_FILE_MAGIC = b"DIOPTCAL"
+CALIBRATION_FILE_VERSION = 1
+
+# magic, version, length of the metadata
+_HEADER = struct.Struct("<8sIQ")
+_ALIGN = 64
+
+
+def is_binary_calibration(file: str) -> bool:
+    with open(file, "rb") as fh:
+        return fh.read(len(CALIBRATION_FILE_MAGIC)) == CALIBRATION_FILE_MAGIC
+
+
+def _pack_events(
+    samples: dict[Event, list[int]], ci: dict[Event, float]
+) -> dict[str, np.ndarray]:
+    def level(lv: LevelInfo | None) -> tuple[int, int]:
+        return (-1, -1) if lv is None else (lv.level, lv.noise_scale_deg)
+
+    events = np.array(
+        [(e.kind.value, *level(e.arg_level1), *level(e.arg_level2)) for e in samples],
+        dtype=np.int64,
+    ).reshape(-1, 5)
+    counts = np.array([len(ts) for ts in samples.values()], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    flat = np.fromiter(
+        (t for ts in samples.values() for t in ts), dtype=np.int64, count=offsets[-1]
+    )
+    sums = np.add.reduceat(flat, offsets[:-1]) if len(flat) > 0 else counts
+    arrays = {
+        "events": events,
+        "offsets": offsets,
+        "samples": flat,
+        "mean": sums // np.maximum(counts, 1),
+        "ci": np.array([ci.get(e, np.nan) for e in samples], dtype=np.float64),
+    }
+    return dict((k, a.astype(a.dtype.newbyteorder("<"))) for (k, a) in arrays.items())
+
+
+def _unpack_events(events: np.ndarray) -> list[Event]:
+    # there are few distinct kinds and levels, so look each up only once
+    kinds = dict((kind.value, kind) for kind in EventKind)
+    levels: dict[tuple[int, int], LevelInfo | None] = {}
+    for lv, deg in np.unique(events[:, 1:].reshape(-1, 2), axis=0).tolist():
+        levels[(lv, deg)] = None if lv < 0 else LevelInfo(lv, deg)
+
+    return [
+        Event(kinds[kind], levels[(lv1, deg1)], levels[(lv2, deg2)])
+        for (kind, lv1, deg1, lv2, deg2) in events.tolist()
+    ]
+
+
+def _unpack_samples(arrays: dict[str, np.ndarray]) -> dict[Event, list[int]]:
+    events = _unpack_events(arrays["events"])
+    samples = arrays["samples"].tolist()
+    offsets = arrays["offsets"].tolist()
+    return dict(
+        (e, samples[offsets[i] : offsets[i + 1]]) for (i, e) in enumerate(events)
+    )
+
+
+def _unpack_ci(arrays: dict[str, np.ndarray]) -> dict[Event, float]:
+    ci = arrays["ci"]
+    keep = np.flatnonzero(~np.isnan(ci))
+    if len(keep) == 0:
+        return {}
+
+    events = _unpack_events(arrays["events"][keep])
+    return dict(zip(events, ci[keep].tolist()))
+
+
+def write_binary_calibration(file: str, cal: PKECalibrationData) -> None:
+    obj = cal.to_dict()
+    for key in ["runtime", "runtime_ci", "thread_runtime"]:
+        obj.pop(key, None)
+
+    tables = {"runtime": _pack_events(cal.runtime_samples, cal.runtime_ci)}
+    for threads, smps in cal.thread_samples.items():
+        tables[f"threads{threads}"] = _pack_events(smps, {})
+
+    layout: dict[str, dict[str, Any]] = {}
+    offset = 0
+    for table, arrays in tables.items():
+        for name, array in arrays.items():
+            layout[f"{table}.{name}"] = {
+                "offset": offset,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+            }
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    meta = json.dumps(
+        {
+            "calibration": obj,
+            "thread_counts": list(cal.thread_samples.keys()),
+            "arrays": layout,
+        }
+    ).encode()
+    # the arrays start at the first aligned offset after the metadata
+    start = -(-(_HEADER.size + len(meta)) // _ALIGN) * _ALIGN
+
+    with open(file, "wb") as fh:
+        header = (CALIBRATION_FILE_MAGIC, CALIBRATION_FILE_VERSION, len(meta))
+        fh.write(_HEADER.pack(*header))
+        fh.write(meta)
+        for table, arrays in tables.items():
+            for name, array in arrays.items():
+                fh.seek(start + layout[f"{table}.{name}"]["offset"])
+                fh.write(array.tobytes())
+
+        # pad the file to the end of the last array
+        fh.truncate(start + offset)
+
+
+def read_binary_calibration(file: str) -> PKECalibrationData:
+    with open(file, "rb") as fh:
+        (magic, version, meta_len) = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != CALIBRATION_FILE_MAGIC:
+            raise ValueError(f"{file} is not a binary Dioptra calibration file")
+        if version != CALIBRATION_FILE_VERSION:
+            raise ValueError(f"{file}: unsupported calibration file version {version}")
+        meta = json.loads(fh.read(meta_len).decode())
+
+    start = -(-(_HEADER.size + meta_len) // _ALIGN) * _ALIGN
+    mapped = np.memmap(file, dtype=np.uint8, mode="r")
+
+    def table(name: str) -> dict[str, np.ndarray]:
+        arrays = {}
+        for key, spec in meta["arrays"].items():
+            (prefix, array) = key.split(".")
+            if prefix != name:
+                continue
+
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            begin = start + spec["offset"]
+            data = mapped[begin : begin + count * dtype.itemsize].view(dtype)
+            arrays[array] = data.reshape(spec["shape"])
+        return arrays
+
+    cal = PKECalibrationData.from_dict({**meta["calibration"], "runtime": []})
+
+    runtime = table("runtime")
+    cal.runtime_ci = _unpack_ci(runtime)
+    cal.set_lazy_runtime_samples(
+        lambda: _unpack_samples(runtime),
+        dict(zip(_unpack_events(runtime["events"]), runtime["mean"].tolist())),
+    )
+
+    for threads in meta["thread_counts"]:
+        cal.thread_samples[threads] = _unpack_samples(table(f"threads{threads}"))
+
+    return cal
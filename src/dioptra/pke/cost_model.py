@@ -0,0 +1,163 @@
+from typing import Hashable, Iterable
+
+import numpy as np
+
+from dioptra.pke.scheme import LevelInfo
+
+# an event kind, its argument levels and its runtime (in ns)
+Sample = tuple[Hashable, LevelInfo | None, LevelInfo | None, int]
+
+
+class LinearCostModel:
+    """Runtime of events at levels that were not calibrated.
+
+    The runtime of each event kind is fit (by least squares over the
+    calibrated averages) as a linear function of the higher and lower level
+    of its arguments and of whether an argument has a noise scale degree
+    above 1. Since the number of remaining RNS towers goes down by one with
+    every level, this is linear in the number of towers the operation works
+    on, which is what dominates the cost of all calibrated operations.
+    """
+
+    def __init__(self, models: dict[Hashable, tuple[np.ndarray, bool, bool]]) -> None:
+        # coefficients, and whether the first/second argument level is used
+        self.models = models
+
+        # mean relative error of each model on events it was not fit to
+        self.errors: dict[Hashable, float] = {}
+
+    @staticmethod
+    def features(
+        level1: np.ndarray, deg1: np.ndarray, level2: np.ndarray, deg2: np.ndarray
+    ) -> np.ndarray:
+        """The features of events with the given argument levels and noise
+        scale degrees (as arrays, 0 and 1 for a missing argument)."""
+        (level1, deg1, level2, deg2) = np.broadcast_arrays(level1, deg1, level2, deg2)
+        return np.stack(
+            [
+                np.ones(level1.shape),
+                np.maximum(level1, level2),
+                np.minimum(level1, level2),
+                (np.maximum(deg1, deg2) > 1).astype(float),
+            ],
+            axis=-1,
+        )
+
+    @staticmethod
+    def level_features(levels: list[LevelInfo | None]) -> tuple[np.ndarray, np.ndarray]:
+        level = np.array([0 if lv is None else lv.level for lv in levels], dtype=float)
+        deg = np.array(
+            [1 if lv is None else lv.noise_scale_deg for lv in levels], dtype=float
+        )
+        return (level, deg)
+
+    @staticmethod
+    def fit(samples: Iterable[Sample]) -> "LinearCostModel":
+        by_kind: dict[Hashable, list[Sample]] = {}
+        for sample in samples:
+            by_kind.setdefault(sample[0], []).append(sample)
+
+        models = {}
+        for kind, points in by_kind.items():
+            (level1, deg1) = LinearCostModel.level_features([p[1] for p in points])
+            (level2, deg2) = LinearCostModel.level_features([p[2] for p in points])
+            x = LinearCostModel.features(level1, deg1, level2, deg2)
+            y = np.array([p[3] for p in points], dtype=float)
+
+            # features that never change can't be told apart from the
+            # constant term, and would make extrapolation arbitrary
+            x[:, 1:][:, np.ptp(x[:, 1:], axis=0) == 0] = 0
+            (coefficients, _, _, _) = np.linalg.lstsq(x, y, rcond=None)
+
+            models[kind] = (
+                coefficients,
+                points[0][1] is not None,
+                points[0][2] is not None,
+            )
+
+        return LinearCostModel(models)
+
+    def predict(
+        self,
+        kind: Hashable,
+        levels: list[LevelInfo | None],
+        columns: list[LevelInfo | None] | None = None,
+    ) -> np.ndarray | None:
+        """Predicted runtimes (in ns) of `kind` for every pair of `levels` (or
+        of a level in `levels` and one in `columns`), as an array indexed by
+        both positions in which combinations that do not fit the arguments of
+        `kind` are -1. Returns None if there is no model for `kind`."""
+        if kind not in self.models:
+            return None
+
+        if columns is None:
+            columns = levels
+
+        (coefficients, uses_level1, uses_level2) = self.models[kind]
+        (level1, deg1) = LinearCostModel.level_features(levels)
+        (level2, deg2) = LinearCostModel.level_features(columns)
+        x = LinearCostModel.features(
+            level1[:, None], deg1[:, None], level2[None, :], deg2[None, :]
+        )
+        predicted = np.maximum(np.rint(x @ coefficients), 0).astype(np.int64)
+
+        applies1 = np.array([lv is not None for lv in levels]) == uses_level1
+        applies2 = np.array([lv is not None for lv in columns]) == uses_level2
+        return np.where(applies1[:, None] & applies2[None, :], predicted, -1)
+
+    def predict_one(
+        self, kind: Hashable, lev1: LevelInfo | None, lev2: LevelInfo | None
+    ) -> int | None:
+        predicted = self.predict(kind, [lev1, lev2])
+        if predicted is None or predicted[0, 1] < 0:
+            return None
+        return int(predicted[0, 1])
+
+    def validate(self, samples: Iterable[Sample]) -> None:
+        """Record the error of the model on the given (held out) samples."""
+        errors: dict[Hashable, list[float]] = {}
+        for kind, lev1, lev2, ns in samples:
+            predicted = self.predict_one(kind, lev1, lev2)
+            if predicted is not None and ns > 0:
+                errors.setdefault(kind, []).append(abs(predicted - ns) / ns)
+
+        self.errors = {kind: float(np.mean(errs)) for (kind, errs) in errors.items()}
+
+    def to_list(self) -> list[tuple[Hashable, list[float], bool, bool, float | None]]:
+        return [
+            (kind, coefficients.tolist(), uses1, uses2, self.errors.get(kind))
+            for (kind, (coefficients, uses1, uses2)) in self.models.items()
+        ]
+
+    @staticmethod
+    def from_list(
+        items: Iterable[tuple[Hashable, list[float], bool, bool, float | None]],
+    ) -> "LinearCostModel":
+        model = LinearCostModel({})
+        for kind, coefficients, uses1, uses2, error in items:
+            model.models[kind] = (np.array(coefficients), uses1, uses2)
+            if error is not None:
+                model.errors[kind] = error
+        return model
+
+
+class SizeTable(dict[int, int]):
+    """Sizes (in bytes) of ciphertexts or plaintexts by level.
+
+    Sizes of levels that were not calibrated are extrapolated linearly, as
+    every level drops one RNS tower of the same size."""
+
+    # the calibrated sizes the line was fit to, and the line
+    _fit: tuple[tuple[tuple[int, int], ...], float, float] | None = None
+
+    def __missing__(self, level: int) -> int:
+        if len(self) < 2:
+            raise KeyError(level)
+
+        sizes = tuple(self.items())
+        if self._fit is None or self._fit[0] != sizes:
+            (slope, intercept) = np.polyfit(list(self.keys()), list(self.values()), 1)
+            self._fit = (sizes, float(slope), float(intercept))
+
+        (_, slope, intercept) = self._fit
+        return max(int(round(slope * level + intercept)), 0)
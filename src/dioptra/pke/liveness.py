@@ -0,0 +1,224 @@
+"""When values are last used, as opposed to when they are freed.
+
+The memory estimate frees a simulated value when CPython drops the last
+reference to it, which depends on how long the program keeps it in a variable
+rather than on when the value is actually needed. `Liveness` records the last
+use of every value to estimate the peak memory usage if every value was freed
+right after its last use, and which allocation sites hold on to values past
+their last use the longest (weighted by the size of the values).
+
+Evaluation keys are needed for as long as the context exists, so they are
+charged from their generation on and never freed.
+"""
+
+from array import array
+from typing import Callable
+
+import numpy as np
+
+from dioptra.pke.analyzer import (
+    AnalysisBase,
+    Ciphertext,
+    EvalKeyKind,
+    Plaintext,
+    PrivateKey,
+    PublicKey,
+)
+from dioptra.pke.scheme import LevelInfo
+from dioptra.utils.code_loc import CallSite, Frame
+from dioptra.utils.network import NetworkModel
+
+
+class HeldValues:
+    """The values allocated at a call site, and how long (in ns of simulated
+    time) they were held after their last use, weighted by their size."""
+
+    def __init__(self, site: CallSite | None) -> None:
+        self.site = site
+        self.count = 0
+        self.byte_ns = 0
+
+
+class Liveness(AnalysisBase):
+    def __init__(
+        self,
+        ct_size: dict[int, int],
+        pt_size: dict[int, int],
+        clock: Callable[[], int] = lambda: 0,
+        key_size: dict[EvalKeyKind, int] | None = None,
+    ) -> None:
+        self.ct_size = ct_size
+        self.pt_size = pt_size
+        self.clock = clock
+        self.key_size = {} if key_size is None else key_size
+
+        # events (allocations and uses) are numbered to order them
+        self.step = 0
+
+        # the size, allocation site and step, and the step and time of the
+        # last use of every live value
+        self.live: dict[int, tuple[int, CallSite | None, int, int, int]] = {}
+
+        # the size, allocation step and last-use step of every freed value
+        self.sizes = array("q")
+        self.allocated = array("q")
+        self.last_used = array("q")
+
+        # the size and generation step of all evaluation keys
+        self.key_sizes = array("q")
+        self.key_steps = array("q")
+
+        self.held: dict[CallSite | None, HeldValues] = {}
+
+    def alloc(self, vid: int, size: int, call_loc: Frame | None) -> None:
+        site = call_loc.call_site() if call_loc is not None else None
+        self.step += 1
+        self.live[vid] = (size, site, self.step, self.step, self.clock())
+
+    def use(self, *values: Ciphertext | Plaintext) -> None:
+        self.step += 1
+        now = self.clock()
+        for value in values:
+            entry = self.live.get(value.id)
+            if entry is not None:
+                (size, site, allocated, _, _) = entry
+                self.live[value.id] = (size, site, allocated, self.step, now)
+
+    def free(self, vid: int) -> None:
+        entry = self.live.pop(vid, None)
+        if entry is None:
+            return
+
+        (size, site, allocated, last_step, last_ns) = entry
+        held = self.held.get(site)
+        if held is None:
+            held = self.held[site] = HeldValues(site)
+        held.count += 1
+        held.byte_ns += size * (self.clock() - last_ns)
+
+        self.sizes.append(size)
+        self.allocated.append(allocated)
+        self.last_used.append(last_step)
+
+    def trace_eval_keygen(
+        self, kind: EvalKeyKind, count: int, call_loc: Frame | None
+    ) -> None:
+        self.step += 1
+        self.key_sizes.append(count * self.key_size.get(kind, 0))
+        self.key_steps.append(self.step)
+
+    def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
+        self.alloc(ct.id, self.ct_size[ct.level.level], call_loc)
+
+    def trace_alloc_pt(self, pt: Plaintext, call_loc: Frame | None) -> None:
+        self.alloc(pt.id, self.pt_size[pt.level.level], call_loc)
+
+    def trace_dealloc_ct(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.free(vid)
+
+    def trace_dealloc_pt(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.free(vid)
+
+    def trace_encrypt(
+        self, dest: Ciphertext, pt: Plaintext, key: PublicKey, call_loc: Frame | None
+    ) -> None:
+        self.use(pt)
+
+    def trace_decrypt(
+        self, dest: Plaintext, ct1: Ciphertext, key: PrivateKey, call_loc: Frame | None
+    ) -> None:
+        self.use(ct1)
+
+    def trace_bootstrap(
+        self, dest: Ciphertext, ct1: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct1)
+
+    def trace_mul_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct1, ct2)
+
+    def trace_add_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct1, ct2)
+
+    def trace_sub_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct1, ct2)
+
+    def trace_mul_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct, pt)
+
+    def trace_add_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct, pt)
+
+    def trace_sub_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self.use(ct, pt)
+
+    def trace_sum_ct(
+        self, dest: Ciphertext, ct: Ciphertext, bs: int, call_loc: Frame | None
+    ) -> None:
+        self.use(ct)
+
+    def trace_send_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self.use(ct)
+
+    def trace_recv_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self.use(ct)
+
+    def ideal_peak(self) -> int:
+        """The peak total size (in bytes) of all values if each of them was
+        freed right after its last use (or allocation, if it was never used).
+        Values that are still live are taken to be freed after their last use
+        as well, while evaluation keys are never freed."""
+        sizes = array("q", self.sizes)
+        allocated = array("q", self.allocated)
+        last_used = array("q", self.last_used)
+        for size, _, alloc_step, last_step, _ in self.live.values():
+            sizes.append(size)
+            allocated.append(alloc_step)
+            last_used.append(last_step)
+
+        if len(sizes) == 0 and len(self.key_sizes) == 0:
+            return 0
+
+        # a value is freed after the step of its last use, so it is still
+        # live while the result of that operation is allocated
+        size = np.frombuffer(sizes, dtype=np.int64)
+        steps = np.concatenate(
+            [
+                2 * np.frombuffer(allocated, dtype=np.int64),
+                2 * np.frombuffer(last_used, dtype=np.int64) + 1,
+                2 * np.frombuffer(self.key_steps, dtype=np.int64),
+            ]
+        )
+        deltas = np.concatenate(
+            [size, -size, np.frombuffer(self.key_sizes, dtype=np.int64)]
+        )
+
+        usage = np.cumsum(deltas[np.argsort(steps, kind="stable")])
+        return max(0, int(usage.max()))
+
+    def held_sites(self, count: int = 10) -> list[HeldValues]:
+        """The allocation sites whose values were held past their last use the
+        longest, weighted by their size (i.e. by wasted bytes x ns)."""
+        held = [h for h in self.held.values() if h.byte_ns > 0]
+        held.sort(key=lambda h: -h.byte_ns)
+        return held[:count]
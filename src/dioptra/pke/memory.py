@@ -1,4 +1,10 @@
-from dioptra.pke.analyzer import AnalysisBase, Ciphertext, Plaintext
+from dioptra.pke.analyzer import (
+    AnalysisBase,
+    Ciphertext,
+    EvalKeyKind,
+    Plaintext,
+    Value,
+)
 from dioptra.pke.scheme import LevelInfo
 from dioptra.report.memory import AllocationType, MemoryReport
 from dioptra.utils.code_loc import Frame
@@ -11,32 +17,95 @@ class PKEMemoryEstimate(AnalysisBase):
         ct_size: dict[int, int],
         pt_size: dict[int, int],
         report: MemoryReport,
+        key_size: dict[EvalKeyKind, int] | None = None,
     ):
         self.ct_size = ct_size
         self.pt_size = pt_size
+        self.key_size = {} if key_size is None else key_size
         self.report = report
         report.record_setup_size(setup_size)
 
-    def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
+        # size changes in the current/last iteration of enclosing repeat loops
+        self.repeats: list[tuple[list[int], list[int]]] = []
+
+    def record_size_change(self, delta: int) -> None:
+        for current, _ in self.repeats:
+            current.append(delta)
+
+    def trace_eval_keygen(
+        self, kind: EvalKeyKind, count: int, call_loc: Frame | None
+    ) -> None:
+        # keys stay in the context until it is destroyed, so they are never freed
+        size = count * self.key_size.get(kind, 0)
         self.report.record_alloc(
-            AllocationType.CIPHERTEXT, ct.id, self.ct_size[ct.level.level], call_loc
+            AllocationType.EVAL_KEY, Value.fresh_id(), size, call_loc
         )
+        if self.repeats:
+            self.record_size_change(size)
+
+    def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
+        size = self.ct_size[ct.level.level]
+        self.report.record_alloc(AllocationType.CIPHERTEXT, ct.id, size, call_loc)
+        if self.repeats:
+            self.record_size_change(size)
 
     def trace_dealloc_ct(
         self, vid: int, level: LevelInfo, call_loc: Frame | None
     ) -> None:
-        self.report.record_dealloc(
-            AllocationType.CIPHERTEXT, vid, self.ct_size[level.level], call_loc
-        )
+        size = self.ct_size[level.level]
+        self.report.record_dealloc(AllocationType.CIPHERTEXT, vid, size, call_loc)
+        if self.repeats:
+            self.record_size_change(-size)
 
     def trace_alloc_pt(self, pt: Plaintext, call_loc: Frame | None) -> None:
-        self.report.record_alloc(
-            AllocationType.PLAINTEXT, pt.id, self.pt_size[pt.level.level], call_loc
-        )
+        size = self.pt_size[pt.level.level]
+        self.report.record_alloc(AllocationType.PLAINTEXT, pt.id, size, call_loc)
+        if self.repeats:
+            self.record_size_change(size)
 
     def trace_dealloc_pt(
         self, vid: int, level: LevelInfo, call_loc: Frame | None
     ) -> None:
-        self.report.record_dealloc(
-            AllocationType.PLAINTEXT, vid, self.pt_size[level.level], call_loc
-        )
+        size = self.pt_size[level.level]
+        self.report.record_dealloc(AllocationType.PLAINTEXT, vid, size, call_loc)
+        if self.repeats:
+            self.record_size_change(-size)
+
+    def trace_repeat_begin(self) -> None:
+        self.repeats.append(([], []))
+
+    def trace_repeat_iteration(self) -> None:
+        (current, _) = self.repeats[-1]
+        self.repeats[-1] = ([], current)
+
+    def trace_repeat_skip(self, count: int) -> None:
+        """Account for `count` more iterations like the last one.
+
+        Rather than replaying every allocation, this reports a short-lived
+        allocation reaching the peak that the skipped iterations would have
+        reached, and (if iterations grow memory) a block holding the growth,
+        which stays live since the values that make it up never exist."""
+        (_, last) = self.repeats[-1]
+
+        growth = 0
+        peak = 0
+        for delta in last:
+            growth += delta
+            peak = max(peak, growth)
+
+        if growth > 0:
+            peak += (count - 1) * growth
+
+        if peak > 0:
+            vid = Value.fresh_id()
+            self.report.record_alloc(AllocationType.CIPHERTEXT, vid, peak, None)
+            self.report.record_dealloc(AllocationType.CIPHERTEXT, vid, peak, None)
+
+        if growth > 0:
+            self.report.record_alloc(
+                AllocationType.CIPHERTEXT, Value.fresh_id(), count * growth, None
+            )
+            self.record_size_change(count * growth)
+
+    def trace_repeat_end(self) -> None:
+        self.repeats.pop()
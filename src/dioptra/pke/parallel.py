@@ -0,0 +1,144 @@
+"""How much of an estimation case could run concurrently.
+
+`Parallelism` builds the dataflow graph of a case from the values every
+operation uses and produces, with the same costs as the runtime estimate, to
+estimate its wall time on several cores (see `dioptra.utils.schedule`).
+Values that were not produced by a costed operation (such as arbitrary
+ciphertexts) are available from the start.
+"""
+
+from dioptra.pke.analyzer import Ciphertext, Plaintext, PrivateKey, PublicKey
+from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.runtime import Runtime
+from dioptra.pke.scheme import LevelInfo
+from dioptra.report.runtime import RuntimeReport
+from dioptra.utils.code_loc import Frame
+from dioptra.utils.network import NetworkModel
+from dioptra.utils.schedule import TaskGraph
+
+
+class Parallelism(Runtime):
+    def __init__(
+        self, calibration: PKECalibrationData, threads: int | None = None
+    ) -> None:
+        super().__init__(calibration, RuntimeReport(), threads)
+        self.graph = TaskGraph()
+
+        # the operation that produced every live value
+        self.producer: dict[int, int] = {}
+
+        # the cost of the operation being traced
+        self.cost = 0
+
+    def estimate(
+        self,
+        call_loc: Frame | None,
+        ns: int,
+        op: str = "operation",
+        category: str = "compute",
+    ):
+        self.cost += ns
+
+    def node(self, dest: Ciphertext | Plaintext | None, *args: Ciphertext | Plaintext):
+        deps = [self.producer[a.id] for a in args if a.id in self.producer]
+        node = self.graph.add(self.cost, deps)
+        self.cost = 0
+        if dest is not None:
+            self.producer[dest.id] = node
+
+    def trace_encode(self, dest: Plaintext, level: int, call_loc: Frame) -> None:
+        super().trace_encode(dest, level, call_loc)
+        self.node(dest)
+
+    def trace_encode_ckks(self, dest: Plaintext, call_loc: Frame) -> None:
+        super().trace_encode_ckks(dest, call_loc)
+        self.node(dest)
+
+    def trace_encrypt(
+        self, dest: Ciphertext, pt: Plaintext, key: PublicKey, call_loc: Frame
+    ) -> None:
+        super().trace_encrypt(dest, pt, key, call_loc)
+        self.node(dest, pt)
+
+    def trace_decrypt(
+        self, dest: Plaintext, ct: Ciphertext, key: PrivateKey, call_loc: Frame
+    ) -> None:
+        super().trace_decrypt(dest, ct, key, call_loc)
+        self.node(dest, ct)
+
+    def trace_mul_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
+    ) -> None:
+        super().trace_mul_ctct(dest, ct1, ct2, call_loc)
+        self.node(dest, ct1, ct2)
+
+    def trace_add_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
+    ) -> None:
+        super().trace_add_ctct(dest, ct1, ct2, call_loc)
+        self.node(dest, ct1, ct2)
+
+    def trace_sub_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
+    ) -> None:
+        super().trace_sub_ctct(dest, ct1, ct2, call_loc)
+        self.node(dest, ct1, ct2)
+
+    def trace_mul_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        super().trace_mul_ctpt(dest, ct, pt, call_loc)
+        self.node(dest, ct, pt)
+
+    def trace_add_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        super().trace_add_ctpt(dest, ct, pt, call_loc)
+        self.node(dest, ct, pt)
+
+    def trace_sub_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        super().trace_sub_ctpt(dest, ct, pt, call_loc)
+        self.node(dest, ct, pt)
+
+    def trace_bootstrap(
+        self, dest: Ciphertext, ct: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        super().trace_bootstrap(dest, ct, call_loc)
+        self.node(dest, ct)
+
+    def trace_sum_ct(
+        self, dest: Ciphertext, ct: Ciphertext, bs: int, call_loc: Frame | None
+    ) -> None:
+        super().trace_sum_ct(dest, ct, bs, call_loc)
+        self.node(dest, ct)
+
+    def trace_send_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        super().trace_send_ct(ct, nm, call_loc)
+        self.node(None, ct)
+
+    def trace_recv_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        # the ciphertext is only available once it has been received
+        super().trace_recv_ct(ct, nm, call_loc)
+        self.node(ct, ct)
+
+    def trace_dealloc_ct(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.producer.pop(vid, None)
+
+    def trace_dealloc_pt(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.producer.pop(vid, None)
+
+    def trace_repeat_skip(self, count: int) -> None:
+        raise NotImplementedError(
+            "Parallelism cannot extrapolate sampled loops, as it needs the values "
+            "every operation uses"
+        )
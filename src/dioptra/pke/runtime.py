@@ -7,28 +7,67 @@ from dioptra.pke.analyzer import (
     PublicKey,
 )
 from dioptra.pke.calibration import Event, EventKind, PKECalibrationData
+from dioptra.pke.scheme import LevelInfo
 from dioptra.report.runtime import RuntimeReport
 from dioptra.utils.code_loc import Frame
 from dioptra.utils.network import NetworkModel
 
 
+class RepeatState:
+    """Runtime estimates of the iterations of a sampled `Analyzer.Repeat` loop."""
+
+    def __init__(self) -> None:
+        self.current: list[tuple[Frame | None, int, str, str]] = []
+        self.last: list[tuple[Frame | None, int, str, str]] = []
+        self.totals: list[int] = []
+
+        # error bounds of loops nested in the current/last iteration
+        self.current_error = 0
+        self.last_error = 0
+
+
 class Runtime(AnalysisBase):
     def __init__(
-        self, runtime_samples: PKECalibrationData, report: RuntimeReport
+        self,
+        runtime_samples: PKECalibrationData,
+        report: RuntimeReport,
+        threads: int | None = None,
     ) -> None:
-        self.runtime_table = runtime_samples.avg_runtime_table()
+        self.runtime_table = runtime_samples.avg_runtime_table(threads)
         self.where: dict[dis.Positions, int] = {}
         self.ct_size = runtime_samples.ct_mem
         self.report = report
+        self.repeats: list[RepeatState] = []
+
+    def estimate(
+        self,
+        call_loc: Frame | None,
+        ns: int,
+        op: str = "operation",
+        category: str = "compute",
+    ):
+        self.report.runtime_op(op, call_loc, ns, category)
+        for repeat in self.repeats:
+            repeat.current.append((call_loc, ns, op, category))
 
     def report_event(self, event: Event, call_loc: Frame | None):
-        self.report.runtime_estimate(call_loc, self.runtime_table.get_runtime_ns(event))
+        ns = self.runtime_table.get_runtime_ns(event)
+        self.estimate(call_loc, ns, event.kind.name)
+
+    def report_cost(
+        self,
+        kind: EventKind,
+        lev1: LevelInfo | None,
+        lev2: LevelInfo | None,
+        call_loc: Frame | None,
+    ):
+        self.estimate(call_loc, self.runtime_table.lookup(kind, lev1, lev2), kind.name)
 
     def trace_encode(self, dest: Plaintext, level: int, call_loc: Frame) -> None:
-        self.report_event(Event(EventKind.ENCODE, dest.level), call_loc)
+        self.report_cost(EventKind.ENCODE, dest.level, None, call_loc)
 
     def trace_encode_ckks(self, dest: Plaintext, call_loc: Frame) -> None:
-        self.report_event(Event(EventKind.ENCODE, dest.level), call_loc)
+        self.report_cost(EventKind.ENCODE, dest.level, None, call_loc)
 
     def trace_encrypt(
         self,
@@ -37,7 +76,7 @@ class Runtime(AnalysisBase):
         publicKey: PublicKey,
         call_loc: Frame,
     ) -> None:
-        self.report_event(Event(EventKind.ENCRYPT, plaintext.level), call_loc)
+        self.report_cost(EventKind.ENCRYPT, plaintext.level, None, call_loc)
 
     def trace_decrypt(
         self,
@@ -46,60 +85,83 @@ class Runtime(AnalysisBase):
         publicKey: PublicKey,
         call_loc: Frame,
     ) -> None:
-        self.report_event(Event(EventKind.DECRYPT, ciphertext.level), call_loc)
+        self.report_cost(EventKind.DECRYPT, ciphertext.level, None, call_loc)
 
     def trace_mul_ctct(
         self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
     ) -> None:
-        self.report_event(
-            Event(EventKind.EVAL_MULT_CTCT, ct1.level, ct2.level), call_loc
-        )
+        self.report_cost(EventKind.EVAL_MULT_CTCT, ct1.level, ct2.level, call_loc)
 
     def trace_add_ctct(
         self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
     ) -> None:
-        self.report_event(
-            Event(EventKind.EVAL_ADD_CTCT, ct1.level, ct2.level), call_loc
-        )
+        self.report_cost(EventKind.EVAL_ADD_CTCT, ct1.level, ct2.level, call_loc)
 
     def trace_sub_ctct(
         self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame
     ) -> None:
-        self.report_event(
-            Event(EventKind.EVAL_SUB_CTCT, ct1.level, ct2.level), call_loc
-        )
+        self.report_cost(EventKind.EVAL_SUB_CTCT, ct1.level, ct2.level, call_loc)
 
     def trace_mul_ctpt(
         self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
     ) -> None:
-        self.report_event(Event(EventKind.EVAL_MULT_CTPT, ct.level, pt.level), call_loc)
+        self.report_cost(EventKind.EVAL_MULT_CTPT, ct.level, pt.level, call_loc)
 
     def trace_add_ctpt(
         self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
     ) -> None:
-        self.report_event(Event(EventKind.EVAL_ADD_CTPT, ct.level, pt.level), call_loc)
+        self.report_cost(EventKind.EVAL_ADD_CTPT, ct.level, pt.level, call_loc)
 
     def trace_sub_ctpt(
         self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
     ) -> None:
-        self.report_event(Event(EventKind.EVAL_SUB_CTPT, ct.level, pt.level), call_loc)
+        self.report_cost(EventKind.EVAL_SUB_CTPT, ct.level, pt.level, call_loc)
 
     def trace_bootstrap(
         self, dest: Ciphertext, ct: Ciphertext, call_loc: Frame | None
     ) -> None:
-        self.report_event(Event(EventKind.EVAL_BOOTSTRAP), call_loc)
+        self.report_cost(EventKind.EVAL_BOOTSTRAP, None, None, call_loc)
 
     def trace_sum_ct(self, dest: Ciphertext, ct: Ciphertext, bs: int, call_loc: Frame | None) -> None:
-        self.report_event(Event(EventKind.EVAL_SUM, ct.level), call_loc)
+        self.report_cost(EventKind.EVAL_SUM, ct.level, None, call_loc)
 
     def trace_send_ct(
         self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
     ) -> None:
         runtime = nm.send_latency_ns(self.ct_size[ct.level.level])
-        self.report.runtime_estimate(call_loc, runtime)
+        self.estimate(call_loc, runtime, "SendCiphertext", "network")
 
     def trace_recv_ct(
         self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
     ) -> None:
         runtime = nm.recv_latency_ns(self.ct_size[ct.level.level])
-        self.report.runtime_estimate(call_loc, runtime)
+        self.estimate(call_loc, runtime, "RecvCiphertext", "network")
+
+    def trace_repeat_begin(self) -> None:
+        self.repeats.append(RepeatState())
+
+    def trace_repeat_iteration(self) -> None:
+        repeat = self.repeats[-1]
+        repeat.totals.append(sum(ns for (_, ns, _, _) in repeat.current))
+        repeat.last = repeat.current
+        repeat.last_error = repeat.current_error
+        repeat.current = []
+        repeat.current_error = 0
+
+    def trace_repeat_skip(self, count: int) -> None:
+        """Estimate `count` more iterations like the last one. The error bound
+        assumes that the skipped iterations cost no more (or less) than the
+        most (or least) expensive iteration that was run."""
+        repeat = self.repeats[-1]
+        extrapolated = 0
+        for call_loc, ns, op, category in repeat.last:
+            self.estimate(call_loc, ns * count, op, category)
+            extrapolated += ns * count
+
+        error = count * (max(repeat.totals) - min(repeat.totals) + repeat.last_error)
+        self.report.runtime_extrapolated(extrapolated, error)
+        for outer in self.repeats[:-1]:
+            outer.current_error += error
+
+    def trace_repeat_end(self) -> None:
+        self.repeats.pop()
@@ -1,28 +1,67 @@
+import threading
 from typing import Any
 
 import openfhe
 
 
 class LevelInfo:
-    def __init__(self, level: int = 0, noise_scale_deg: int = 1):
-        self.noise_scale_deg = noise_scale_deg  # rename to is mul result?
-        self.level = level
-
-    def __hash__(self) -> int:
-        return hash((self.noise_scale_deg, self.level))
-
-    def __eq__(self, value: object) -> bool:
-        return (
-            isinstance(value, LevelInfo)
-            and self.noise_scale_deg == value.noise_scale_deg
-            and self.level == value.level
-        )
+    """The level and noise scale degree of a ciphertext or plaintext.
+
+    Level infos are immutable and interned: constructing the same
+    `(level, noise_scale_deg)` pair twice yields the same object, so they are
+    compared and hashed by identity and cost nothing to share between the
+    (possibly very many) values that an analyzer keeps alive.
+
+    Each level info also gets a small, dense `index` (starting at 1, so that
+    0 can stand for "no level") which can be used to index into tables.
+    """
+
+    __slots__ = ("level", "noise_scale_deg", "index", "_incr")
+
+    _interned: dict[tuple[int, int], "LevelInfo"] = {}
+    # interning a new level info must not race with another thread doing so
+    _lock = threading.Lock()
+
+    level: int
+    noise_scale_deg: int  # rename to is mul result?
+    index: int
+
+    def __new__(cls, level: int = 0, noise_scale_deg: int = 1) -> "LevelInfo":
+        key = (level, noise_scale_deg)
+        lv = cls._interned.get(key)
+        if lv is None:
+            with cls._lock:
+                lv = cls._interned.get(key)
+                if lv is None:
+                    lv = object.__new__(cls)
+                    object.__setattr__(lv, "level", level)
+                    object.__setattr__(lv, "noise_scale_deg", noise_scale_deg)
+                    object.__setattr__(lv, "index", len(cls._interned) + 1)
+                    object.__setattr__(lv, "_incr", None)
+                    cls._interned[key] = lv
+        return lv
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"LevelInfo is immutable (cannot set '{name}')")
+
+    def __reduce__(self):
+        return (LevelInfo, (self.level, self.noise_scale_deg))
+
+    @staticmethod
+    def interned() -> list["LevelInfo"]:
+        """All level infos created so far, ordered by `index`."""
+        return list(LevelInfo._interned.values())
 
     def levelled_incr(self) -> "LevelInfo":
-        if self.noise_scale_deg < 2:
-            return LevelInfo(self.level, self.noise_scale_deg + 1)
-        else:
-            return LevelInfo(self.level + 1, self.noise_scale_deg)
+        incr = self._incr
+        if incr is None:
+            if self.noise_scale_deg < 2:
+                incr = LevelInfo(self.level, self.noise_scale_deg + 1)
+            else:
+                incr = LevelInfo(self.level + 1, self.noise_scale_deg)
+            object.__setattr__(self, "_incr", incr)
+
+        return incr
 
     def max(self, other: "LevelInfo") -> "LevelInfo":
         if self.level < other.level or (
@@ -34,7 +73,7 @@ class LevelInfo:
 
     def min(self, other: "LevelInfo") -> "LevelInfo":
         mx = self.max(other)
-        return self if mx == other else other
+        return self if mx is other else other
 
     def to_dict(self) -> dict[str, Any]:
         return {"noise_scale_deg": self.noise_scale_deg, "level": self.level}
@@ -43,7 +82,7 @@ class LevelInfo:
     def from_dict(d: dict[str, Any]) -> "LevelInfo":
         return LevelInfo(level=d["level"], noise_scale_deg=d["noise_scale_deg"])
 
-    def __str__(self):
+    def __repr__(self):
         return f"LevelInfo(level={self.level}, noise_scale_deg={self.noise_scale_deg})"
 
     def copy(
@@ -58,10 +97,18 @@ class LevelInfo:
 
 
 class SchemeModelPke:
-    """This class encodes information about different PKE schemes"""
+    """This class encodes information about different PKE schemes.
+
+    Subclasses define the level arithmetic in `compute_mul_level` and
+    `compute_add_level`; `mul_level` and `add_level` memoize the results, so
+    each point of the `(level, noise_scale_deg)` lattice actually reached by
+    a program is only computed once.
+    """
 
     def __init__(self, name: str) -> None:
         self.name = name
+        self._mul_levels: dict[LevelInfo, dict[LevelInfo, LevelInfo]] = {}
+        self._add_levels: dict[LevelInfo, dict[LevelInfo, LevelInfo]] = {}
 
     def min_level(self) -> LevelInfo:
         raise NotImplementedError(
@@ -69,11 +116,33 @@ class SchemeModelPke:
         )
 
     def mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+        row = self._mul_levels.get(lev1)
+        if row is None:
+            row = self._mul_levels[lev1] = {}
+
+        lev = row.get(lev2)
+        if lev is None:
+            lev = row[lev2] = self.compute_mul_level(lev1, lev2)
+
+        return lev
+
+    def add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+        row = self._add_levels.get(lev1)
+        if row is None:
+            row = self._add_levels[lev1] = {}
+
+        lev = row.get(lev2)
+        if lev is None:
+            lev = row[lev2] = self.compute_add_level(lev1, lev2)
+
+        return lev
+
+    def compute_mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         raise NotImplementedError(
             f"scheme '{self.name}' does not implement `mul_level`"
         )
 
-    def add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         raise NotImplementedError(
             f"scheme '{self.name}' does not implement `add_level`"
         )
@@ -129,10 +198,10 @@ class SchemeModelCKKS(SchemeModelPke):
     def min_level(self) -> LevelInfo:
         return LevelInfo(0, 1)
 
-    def mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         return lev1.max(lev2).levelled_incr()
 
-    def add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         return lev1.max(lev2)
 
     def num_slots(self, cc: openfhe.CryptoContext) -> int:
@@ -160,10 +229,10 @@ class SchemeModelBGV(SchemeModelPke):
         return LevelInfo(0, 2)
 
     # TODO: raise an error if ciphertext level is not the same level
-    def mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         return lev1.max(lev2).levelled_incr()
 
-    def add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         return lev1.max(lev2)
 
     def num_slots(self, cc: openfhe.CryptoContext) -> int:
@@ -185,11 +254,11 @@ class SchemeModelBFV(SchemeModelPke):
     def min_level(self) -> LevelInfo:
         return LevelInfo(0, 1)
 
-    def mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_mul_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         mx = lev1.max(lev2)
         return LevelInfo(mx.level, mx.noise_scale_deg + 1)
 
-    def add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
+    def compute_add_level(self, lev1: LevelInfo, lev2: LevelInfo) -> LevelInfo:
         return lev1.max(lev2)
 
     def num_slots(self, cc: openfhe.CryptoContext) -> int:
@@ -0,0 +1,569 @@
+"""Recording PKE programs as columnar operation traces.
+
+`OpTrace` is an analysis that does nothing but append each operation it sees
+to a handful of integer columns. Once a case has run, runtime, memory and
+multiplicative depth can be computed from those columns in batch (and as
+often as needed, e.g. for several calibrations) without re-executing it.
+
+Recording a trace is not cheaper than running the live analyses: the analyzer
+still calls a hook per operation. Traces are worth it when the same run is
+priced more than once, as with `dioptra estimate record` and `price`.
+"""
+
+import dis
+import enum
+import itertools
+import json
+from array import array
+from typing import Any
+
+import numpy as np
+
+from dioptra.pke.analyzer import (
+    AnalysisBase,
+    Ciphertext,
+    EvalKeyKind,
+    Plaintext,
+    PrivateKey,
+    PublicKey,
+)
+from dioptra.pke.calibration import Event, EventKind, RuntimeTable
+from dioptra.pke.scheme import LevelInfo, SchemeModelPke
+from dioptra.report.runtime import RuntimeReport
+from dioptra.utils.code_loc import CallSite, Frame, SourceLocation, StackLocation
+from dioptra.utils.network import NetworkModel
+
+
+class TraceOp(enum.IntEnum):
+    # operations with a calibrated runtime share the values of `EventKind`
+    ENCODE = EventKind.ENCODE.value
+    DECODE = EventKind.DECODE.value
+    ENCRYPT = EventKind.ENCRYPT.value
+    DECRYPT = EventKind.DECRYPT.value
+    EVAL_MULT_CTCT = EventKind.EVAL_MULT_CTCT.value
+    EVAL_ADD_CTCT = EventKind.EVAL_ADD_CTCT.value
+    EVAL_SUB_CTCT = EventKind.EVAL_SUB_CTCT.value
+    EVAL_BOOTSTRAP = EventKind.EVAL_BOOTSTRAP.value
+    EVAL_MULT_CTPT = EventKind.EVAL_MULT_CTPT.value
+    EVAL_ADD_CTPT = EventKind.EVAL_ADD_CTPT.value
+    EVAL_SUB_CTPT = EventKind.EVAL_SUB_CTPT.value
+    EVAL_SUM = EventKind.EVAL_SUM.value
+
+    ALLOC_CT = 32
+    FREE_CT = 33
+    ALLOC_PT = 34
+    FREE_PT = 35
+    SEND_CT = 36
+    RECV_CT = 37
+    EVAL_KEYGEN = 38
+
+
+COLUMNS = ["op", "dest", "arg1", "arg2", "level1", "level2", "site"]
+
+OP_COUNT = max(op.value for op in TraceOp) + 1
+
+# Which of the recorded argument levels the runtime of an operation depends on
+_USES_LEVEL1 = np.zeros(OP_COUNT, dtype=bool)
+_USES_LEVEL2 = np.zeros(OP_COUNT, dtype=bool)
+for _op in TraceOp:
+    if _op < len(EventKind) + 1 and _op != TraceOp.EVAL_BOOTSTRAP:
+        _USES_LEVEL1[_op] = True
+for _op in [
+    TraceOp.EVAL_MULT_CTCT,
+    TraceOp.EVAL_ADD_CTCT,
+    TraceOp.EVAL_SUB_CTCT,
+    TraceOp.EVAL_MULT_CTPT,
+    TraceOp.EVAL_ADD_CTPT,
+    TraceOp.EVAL_SUB_CTPT,
+]:
+    _USES_LEVEL2[_op] = True
+
+
+class OpTrace(AnalysisBase):
+    """Records every operation as one row of the following columns:
+
+    - `op`: the `TraceOp`
+    - `dest`, `arg1`, `arg2`: value ids of the result and arguments (or -1)
+    - `level1`, `level2`: `LevelInfo.index` of the arguments (or 0); for
+      allocations and frees, `level1` is the level of the value itself
+    - `site`: index into `sites` of the call site of the operation
+
+    For network operations, `arg2` is an index into `networks`. For evaluation
+    key generation, `arg1` is the index of the `EvalKeyKind` and `arg2` the
+    number of keys generated.
+    """
+
+    # the number of rows buffered before they are packed into `rows`
+    FLUSH_ROWS = 1 << 16
+
+    def __init__(self) -> None:
+        # rows are stored back to back, but recorded rows are first buffered
+        # as tuples: appending one is much cheaper than converting it to int64
+        # columns, which is done in bulk
+        self._rows = array("q")
+        self.pending: list[tuple[int, ...]] = []
+
+        self.sites: list[CallSite | None] = [None]
+        self.site_ids: dict[CallSite, int] = {}
+        self.networks: list[NetworkModel] = []
+
+        # the resolved call sites of a trace read back from a file
+        self.saved_locations: list[StackLocation | None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows) // len(COLUMNS) + len(self.pending)
+
+    @property
+    def rows(self) -> array:
+        """All rows, back to back."""
+        self.flush()
+        return self._rows
+
+    def flush(self) -> None:
+        if self.pending:
+            packed = np.fromiter(
+                itertools.chain.from_iterable(self.pending),
+                dtype=np.int64,
+                count=len(self.pending) * len(COLUMNS),
+            )
+            self._rows.frombytes(packed.tobytes())
+            self.pending.clear()
+
+    def site_id(self, call_loc: Frame | None) -> int:
+        if call_loc is None:
+            return 0
+
+        site = call_loc.site
+        sid = self.site_ids.get(site)
+        if sid is None:
+            sid = self.site_ids[site] = len(self.sites)
+            self.sites.append(site)
+
+        return sid
+
+    def record(
+        self,
+        op: TraceOp,
+        dest: int,
+        arg1: int,
+        arg2: int,
+        level1: int,
+        level2: int,
+        call_loc: Frame | None,
+    ) -> None:
+        # site ids start at 1, so a missing site is never mistaken for a hit
+        sid = (
+            0
+            if call_loc is None
+            else self.site_ids.get(call_loc.site) or self.site_id(call_loc)
+        )
+        self.pending.append((op, dest, arg1, arg2, level1, level2, sid))
+        if len(self.pending) >= OpTrace.FLUSH_ROWS:
+            self.flush()
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """Zero-copy numpy views of the trace columns."""
+        rows = np.frombuffer(self.rows, dtype=np.int64).reshape(-1, len(COLUMNS))
+        return {name: rows[:, i] for (i, name) in enumerate(COLUMNS)}
+
+    def locations(self) -> list[StackLocation | None]:
+        """The source locations of `sites`, indexed like them."""
+        if self.saved_locations is not None:
+            return self.saved_locations
+
+        return [None if site is None else site.stack_location() for site in self.sites]
+
+    # -- recording
+
+    def trace_encode(self, dest: Plaintext, level: int, call_loc: Frame | None) -> None:
+        self.record(TraceOp.ENCODE, dest.id, -1, -1, dest.level.index, 0, call_loc)
+
+    def trace_encode_ckks(self, dest: Plaintext, call_loc: Frame | None) -> None:
+        self.record(TraceOp.ENCODE, dest.id, -1, -1, dest.level.index, 0, call_loc)
+
+    def trace_encrypt(
+        self, dest: Ciphertext, pt: Plaintext, key: PublicKey, call_loc: Frame | None
+    ) -> None:
+        self.record(TraceOp.ENCRYPT, dest.id, pt.id, -1, pt.level.index, 0, call_loc)
+
+    def trace_decrypt(
+        self, dest: Plaintext, ct1: Ciphertext, key: PrivateKey, call_loc: Frame | None
+    ) -> None:
+        self.record(TraceOp.DECRYPT, dest.id, ct1.id, -1, ct1.level.index, 0, call_loc)
+
+    def trace_bootstrap(
+        self, dest: Ciphertext, ct1: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self.record(
+            TraceOp.EVAL_BOOTSTRAP, dest.id, ct1.id, -1, ct1.level.index, 0, call_loc
+        )
+
+    def _binary(
+        self,
+        op: TraceOp,
+        dest: Ciphertext,
+        v1: Ciphertext,
+        v2: Ciphertext | Plaintext,
+        call_loc: Frame | None,
+    ) -> None:
+        self.record(op, dest.id, v1.id, v2.id, v1.level.index, v2.level.index, call_loc)
+
+    def trace_mul_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_MULT_CTCT, dest, ct1, ct2, call_loc)
+
+    def trace_add_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_ADD_CTCT, dest, ct1, ct2, call_loc)
+
+    def trace_sub_ctct(
+        self, dest: Ciphertext, ct1: Ciphertext, ct2: Ciphertext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_SUB_CTCT, dest, ct1, ct2, call_loc)
+
+    def trace_mul_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_MULT_CTPT, dest, ct, pt, call_loc)
+
+    def trace_add_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_ADD_CTPT, dest, ct, pt, call_loc)
+
+    def trace_sub_ctpt(
+        self, dest: Ciphertext, ct: Ciphertext, pt: Plaintext, call_loc: Frame | None
+    ) -> None:
+        self._binary(TraceOp.EVAL_SUB_CTPT, dest, ct, pt, call_loc)
+
+    def trace_sum_ct(
+        self, dest: Ciphertext, ct: Ciphertext, bs: int, call_loc: Frame | None
+    ) -> None:
+        self.record(TraceOp.EVAL_SUM, dest.id, ct.id, -1, ct.level.index, 0, call_loc)
+
+    def trace_eval_keygen(
+        self, kind: EvalKeyKind, count: int, call_loc: Frame | None
+    ) -> None:
+        kind_index = list(EvalKeyKind).index(kind)
+        self.record(TraceOp.EVAL_KEYGEN, -1, kind_index, count, 0, 0, call_loc)
+
+    def trace_alloc_ct(self, ct: Ciphertext, call_loc: Frame | None) -> None:
+        self.record(TraceOp.ALLOC_CT, ct.id, -1, -1, ct.level.index, 0, call_loc)
+
+    def trace_alloc_pt(self, pt: Plaintext, call_loc: Frame | None) -> None:
+        self.record(TraceOp.ALLOC_PT, pt.id, -1, -1, pt.level.index, 0, call_loc)
+
+    def trace_dealloc_ct(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.record(TraceOp.FREE_CT, vid, -1, -1, level.index, 0, call_loc)
+
+    def trace_dealloc_pt(
+        self, vid: int, level: LevelInfo, call_loc: Frame | None
+    ) -> None:
+        self.record(TraceOp.FREE_PT, vid, -1, -1, level.index, 0, call_loc)
+
+    def _network(
+        self, op: TraceOp, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        for i, known in enumerate(self.networks):
+            if known is nm:
+                break
+        else:
+            i = len(self.networks)
+            self.networks.append(nm)
+
+        self.record(op, -1, ct.id, i, ct.level.index, 0, call_loc)
+
+    def trace_send_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self._network(TraceOp.SEND_CT, ct, nm, call_loc)
+
+    def trace_recv_ct(
+        self, ct: Ciphertext, nm: NetworkModel, call_loc: Frame | None
+    ) -> None:
+        self._network(TraceOp.RECV_CT, ct, nm, call_loc)
+
+    # -- batch analyses
+
+    def runtimes(self, table: RuntimeTable, ct_size: dict[int, int]) -> np.ndarray:
+        """The estimated runtime (in ns) of every row of the trace."""
+        cols = self.columns()
+        op = cols["op"]
+        if len(op) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        max_index = max(cols["level1"].max(), cols["level2"].max())
+        if max_index >= table.level_count:
+            table.compile()
+
+        n = table.stride
+        level1 = np.where(_USES_LEVEL1[op], cols["level1"], 0)
+        level2 = np.where(_USES_LEVEL2[op], cols["level2"], 0)
+
+        costed = op < table.kind_count
+        index = np.where(costed, (op * n + level1) * n + level2, 0)
+        dense = np.asarray(table.dense, dtype=np.int64)
+        runtimes = np.where(costed, dense[index], 0)
+
+        missing = np.flatnonzero(runtimes < 0)
+        if len(missing) > 0:
+            row = missing[0]
+            levels = [None, *LevelInfo.interned()]
+            evt = Event(EventKind(op[row]), levels[level1[row]], levels[level2[row]])
+            raise NotImplementedError(f"No runtime found for event: {evt}")
+
+        modelled = np.frombuffer(table.modelled, dtype=bool)[index] & costed
+        if modelled.any():
+            levels = [None, *LevelInfo.interned()]
+            (_, rows, counts) = np.unique(
+                index[modelled], return_index=True, return_counts=True
+            )
+            for row, count in zip(np.flatnonzero(modelled)[rows], counts):
+                evt = Event(
+                    EventKind(op[row]), levels[level1[row]], levels[level2[row]]
+                )
+                table.note_modelled(evt, int(runtimes[row]), int(count))
+
+        if table.dense_ci:
+            ci = np.where(costed, np.asarray(table.dense_ci)[index], 0.0) * runtimes
+            event = np.asarray(table.dense_event)[index]
+            uncertain = ci > 0
+            per_event = np.bincount(event[uncertain], weights=ci[uncertain])
+            for event_id in np.flatnonzero(per_event).tolist():
+                table.note_ci(event_id, float(per_event[event_id]))
+
+        network = np.flatnonzero((op == TraceOp.SEND_CT) | (op == TraceOp.RECV_CT))
+        if len(network) > 0:
+            levels = LevelInfo.interned()
+            for row in network.tolist():
+                nm = self.networks[cols["arg2"][row]]
+                size = ct_size[levels[cols["level1"][row] - 1].level]
+                if op[row] == TraceOp.SEND_CT:
+                    runtimes[row] = nm.send_latency_ns(size)
+                else:
+                    runtimes[row] = nm.recv_latency_ns(size)
+
+        return runtimes
+
+    def value_sizes(
+        self,
+        ct_size: dict[int, int],
+        pt_size: dict[int, int],
+        key_size: dict[EvalKeyKind, int] | None = None,
+    ) -> np.ndarray:
+        """The total size (in bytes) of all live values (and evaluation keys)
+        after every row."""
+        if key_size is None:
+            key_size = {}
+
+        cols = self.columns()
+        op = cols["op"]
+        level = cols["level1"]
+
+        levels = LevelInfo.interned()
+        delta = np.zeros(len(op), dtype=np.int64)
+        for alloc, free, size in [
+            (TraceOp.ALLOC_CT, TraceOp.FREE_CT, ct_size),
+            (TraceOp.ALLOC_PT, TraceOp.FREE_PT, pt_size),
+        ]:
+            is_alloc = op == alloc
+            is_free = op == free
+
+            # sizes indexed by `LevelInfo.index`
+            nbytes = np.zeros(len(levels) + 1, dtype=np.int64)
+            for i in np.unique(level[is_alloc | is_free]).tolist():
+                nbytes[i] = size[levels[i - 1].level]
+
+            delta += np.where(is_alloc, nbytes[level], 0)
+            delta -= np.where(is_free, nbytes[level], 0)
+
+        # evaluation keys are never freed
+        keys = np.array([key_size.get(kind, 0) for kind in EvalKeyKind], dtype=np.int64)
+        is_keygen = op == TraceOp.EVAL_KEYGEN
+        kind = np.where(is_keygen, cols["arg1"], 0)
+        delta += np.where(is_keygen, keys[kind] * cols["arg2"], 0)
+
+        return np.cumsum(delta)
+
+    def max_value_size(
+        self,
+        ct_size: dict[int, int],
+        pt_size: dict[int, int],
+        key_size: dict[EvalKeyKind, int] | None = None,
+    ) -> int:
+        sizes = self.value_sizes(ct_size, pt_size, key_size)
+        return max(0, int(sizes.max())) if len(sizes) > 0 else 0
+
+    def mult_depths(self) -> np.ndarray:
+        """The multiplicative depth of the result of every row (-1 for rows that
+        do not get one), by the same rules as `MultDepth`: encoded and encrypted
+        values start at the level of their plaintext, multiplications add one to
+        the depth of their deepest argument, bootstrapped ciphertexts have depth
+        0, decryption keeps the depth of the ciphertext, and additions and
+        subtractions get the largest depth of any value so far."""
+        cols = self.columns()
+        depths = np.full(len(cols["op"]), -1, dtype=np.int64)
+
+        levels = [0] + [lv.level for lv in LevelInfo.interned()]
+        mults = (TraceOp.EVAL_MULT_CTCT, TraceOp.EVAL_MULT_CTPT)
+        adds = (
+            TraceOp.EVAL_ADD_CTCT,
+            TraceOp.EVAL_SUB_CTCT,
+            TraceOp.EVAL_ADD_CTPT,
+            TraceOp.EVAL_SUB_CTPT,
+        )
+        depth: dict[int, int] = {}
+        max_depth = 0
+        for row, (op, dest, arg1, arg2, level1) in enumerate(
+            zip(
+                cols["op"].tolist(),
+                cols["dest"].tolist(),
+                cols["arg1"].tolist(),
+                cols["arg2"].tolist(),
+                cols["level1"].tolist(),
+            )
+        ):
+            if op == TraceOp.ENCODE or op == TraceOp.ENCRYPT:
+                d = levels[level1]
+            elif op in mults:
+                d = max(depth.get(arg1, 0), depth.get(arg2, 0)) + 1
+            elif op in adds:
+                d = max_depth
+            elif op == TraceOp.EVAL_BOOTSTRAP:
+                d = 0
+            elif op == TraceOp.DECRYPT:
+                d = depth.get(arg1, 0)
+            else:
+                if op == TraceOp.FREE_CT or op == TraceOp.FREE_PT:
+                    depth.pop(dest, None)
+                continue
+
+            depth[dest] = depths[row] = d
+            max_depth = max(max_depth, d)
+
+        return depths
+
+    def report_runtime(
+        self, table: RuntimeTable, ct_size: dict[int, int], report: RuntimeReport
+    ) -> None:
+        for site, ns in self.site_totals(self.runtimes(table, ct_size)).items():
+            report.site_runtime_estimate(site, ns)
+
+    def site_totals(self, per_row: np.ndarray) -> dict[CallSite | None, int]:
+        """Sum a per-row quantity (e.g. `runtimes`) by call site."""
+        totals = np.zeros(len(self.sites), dtype=np.int64)
+        np.add.at(totals, self.columns()["site"], per_row)
+        by_site: dict[CallSite | None, int] = {}
+        for i in np.flatnonzero(totals).tolist():
+            site = self.sites[i]
+            by_site[site] = by_site.get(site, 0) + int(totals[i])
+
+        return by_site
+
+
+class RecordedCase:
+    """The trace of an estimation case, as stored in a trace file."""
+
+    def __init__(self, description: str, limit_ns: int | None, trace: OpTrace):
+        self.description = description
+        self.limit_ns = limit_ns
+        self.trace = trace
+
+
+TRACE_FILE_FORMAT = "dioptra-pke-trace"
+TRACE_FILE_VERSION = 1
+
+
+def _location_to_dict(loc: StackLocation | None) -> dict[str, Any] | None:
+    if loc is None or loc.source_location.is_unknown:
+        return None
+
+    pos = loc.source_location.position
+    return {
+        "filename": loc.source_location.filename,
+        "function": loc.function_name,
+        "position": [pos.lineno, pos.end_lineno, pos.col_offset, pos.end_col_offset],
+    }
+
+
+def _location_from_dict(d: dict[str, Any] | None) -> StackLocation | None:
+    if d is None:
+        return None
+
+    loc = SourceLocation(d["filename"], dis.Positions(*d["position"]))
+    return StackLocation(loc, d["function"])
+
+
+def write_trace_file(
+    file: str, scheme: SchemeModelPke, cases: list[RecordedCase]
+) -> None:
+    """Write the traces of several cases to a single (numpy `.npz`) file.
+
+    Level indices are only meaningful within a process, so the file also holds
+    the `(level, noise_scale_deg)` of every index, along with the resolved call
+    sites and network models of each trace."""
+    meta = {
+        "format": TRACE_FILE_FORMAT,
+        "version": TRACE_FILE_VERSION,
+        "scheme": scheme.to_dict(),
+        "levels": [[lv.level, lv.noise_scale_deg] for lv in LevelInfo.interned()],
+        "cases": [
+            {
+                "description": case.description,
+                "limit_ns": case.limit_ns,
+                "sites": [_location_to_dict(loc) for loc in case.trace.locations()],
+                "networks": [
+                    [nm.send_bits_per_second, nm.recv_bits_per_second, nm.latency]
+                    for nm in case.trace.networks
+                ],
+            }
+            for case in cases
+        ],
+    }
+
+    arrays = {"meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)}
+    for i, case in enumerate(cases):
+        cols = np.frombuffer(case.trace.rows, dtype=np.int64)
+        arrays[f"case{i}"] = cols.reshape(-1, len(COLUMNS))
+
+    # writing to a handle stops numpy from appending `.npz` to the name
+    with open(file, "wb") as fh:
+        np.savez_compressed(fh, **arrays)
+
+
+def read_trace_file(file: str) -> tuple[SchemeModelPke, list[RecordedCase]]:
+    with np.load(file) as npz:
+        meta = json.loads(npz["meta"].tobytes().decode())
+        if meta.get("format") != TRACE_FILE_FORMAT:
+            raise ValueError(f"{file} is not a Dioptra trace file")
+        if meta["version"] != TRACE_FILE_VERSION:
+            raise ValueError(
+                f"{file}: unsupported trace file version {meta['version']}"
+            )
+
+        # map the level indices of the recording process to ours
+        remap = np.array(
+            [0] + [LevelInfo(lv, deg).index for (lv, deg) in meta["levels"]],
+            dtype=np.int64,
+        )
+        level1 = COLUMNS.index("level1")
+        level2 = COLUMNS.index("level2")
+
+        cases = []
+        for i, case in enumerate(meta["cases"]):
+            rows = npz[f"case{i}"]
+            rows[:, level1] = remap[rows[:, level1]]
+            rows[:, level2] = remap[rows[:, level2]]
+
+            trace = OpTrace()
+            trace.rows.frombytes(np.ascontiguousarray(rows).tobytes())
+            trace.saved_locations = [_location_from_dict(d) for d in case["sites"]]
+            trace.sites = [None] * len(trace.saved_locations)
+            trace.networks = [NetworkModel(*nm) for nm in case["networks"]]
+            cases.append(RecordedCase(case["description"], case["limit_ns"], trace))
+
+    return (SchemeModelPke.from_dict(meta["scheme"]), cases)
@@ -1,11 +1,16 @@
+from array import array
 from enum import Enum
+from typing import Callable
 
-from dioptra.utils.code_loc import Frame
+import numpy as np
+
+from dioptra.utils.code_loc import CallSite, Frame, StackLocation
 
 
 class AllocationType(Enum):
     CIPHERTEXT = 1
     PLAINTEXT = 2
+    EVAL_KEY = 3
 
 
 class MemoryReport:
@@ -42,3 +47,127 @@ class MemoryMaxReport(MemoryReport):
         self, ty: AllocationType, value_id: int, size: int, loc: Frame | None
     ):
         self.value_size -= size
+
+
+# The call stack of an allocation within the estimation case, outermost frame
+# first
+AllocationStack = tuple[CallSite, ...]
+
+
+class MemoryPeakReport(MemoryMaxReport):
+    """Attributes the peak memory usage to the call stacks that allocated the
+    values live at the peak, and records the memory usage over simulated
+    time, as given by `clock` (in ns)."""
+
+    def __init__(self, clock: Callable[[], int] = lambda: 0):
+        super().__init__()
+        self.clock = clock
+
+        # the stack and size of every live value, and the live bytes by stack
+        self.live: dict[int, tuple[AllocationStack, int]] = {}
+        self.live_by_stack: dict[AllocationStack, int] = {}
+
+        # the live bytes by stack are copied once usage drops from a new peak,
+        # rather than on every allocation that reaches one
+        self.at_peak = False
+        self.peak_by_stack: dict[AllocationStack, int] = {}
+
+        # simulated time and total size of the live values after every change
+        self.times = array("q")
+        self.sizes = array("q")
+
+    @staticmethod
+    def allocation_stack(loc: Frame | None) -> AllocationStack:
+        if loc is None:
+            return ()
+
+        return tuple(reversed(loc.user_call_stack()))
+
+    def record_change(self) -> None:
+        self.times.append(self.clock())
+        self.sizes.append(self.value_size)
+
+    def record_alloc(
+        self, ty: AllocationType, value_id: int, size: int, loc: Frame | None
+    ):
+        super().record_alloc(ty, value_id, size, loc)
+        stack = self.allocation_stack(loc)
+        self.live[value_id] = (stack, size)
+        self.live_by_stack[stack] = self.live_by_stack.get(stack, 0) + size
+        if self.value_size == self.max_value_size and size > 0:
+            self.at_peak = True
+        self.record_change()
+
+    def record_dealloc(
+        self, ty: AllocationType, value_id: int, size: int, loc: Frame | None
+    ):
+        if self.at_peak:
+            self.peak_by_stack = dict(self.live_by_stack)
+            self.at_peak = False
+
+        super().record_dealloc(ty, value_id, size, loc)
+        (stack, size) = self.live.pop(value_id, ((), size))
+        left = self.live_by_stack.get(stack, 0) - size
+        if left > 0:
+            self.live_by_stack[stack] = left
+        else:
+            self.live_by_stack.pop(stack, None)
+        self.record_change()
+
+    def peak_stacks(self) -> dict[AllocationStack, int]:
+        """The bytes live at the peak, by the stack that allocated them."""
+        if self.at_peak:
+            return dict(self.live_by_stack)
+        return dict(self.peak_by_stack)
+
+    def peak_inclusive(self) -> dict[tuple[StackLocation, ...], int]:
+        """The bytes live at the peak by stack prefix (outermost frame first),
+        i.e. including the values allocated by everything it called."""
+        totals: dict[tuple[StackLocation, ...], int] = {}
+        for stack, size in self.peak_stacks().items():
+            locs = tuple(site.stack_location() for site in stack)
+            for i in range(0, len(locs) + 1):
+                totals[locs[:i]] = totals.get(locs[:i], 0) + size
+
+        return totals
+
+    def peak_by_line(self) -> dict[str, dict[int, int]]:
+        """The bytes live at the peak by source file and line, including the
+        values allocated by everything called from the line."""
+        lines: dict[str, dict[int, int]] = {}
+        for stack, size in self.peak_stacks().items():
+            # count a line once even if it is on the stack more than once
+            seen = set()
+            for site in stack:
+                loc = site.source_location()
+                if loc.is_unknown or loc.position.lineno is None:
+                    continue
+                seen.add((loc.filename, loc.position.lineno))
+
+            for filename, lineno in seen:
+                file_dict = lines.setdefault(filename, {})
+                file_dict[lineno] = file_dict.get(lineno, 0) + size
+
+        return lines
+
+    def memory_curve(self, points: int = 500) -> list[tuple[int, int]]:
+        """The memory usage (setup and live values, in bytes) over simulated
+        time (in ns), downsampled to (at most) `points` intervals of equal
+        length, each with the highest usage within it."""
+        times = np.frombuffer(self.times, dtype=np.int64)
+        sizes = np.frombuffer(self.sizes, dtype=np.int64) + self.setup_size
+        # with several threads, the clock of the thread making a change can be
+        # behind that of the thread that made the one before
+        order = np.argsort(times, kind="stable")
+        (times, sizes) = (times[order], sizes[order])
+        if len(times) <= points:
+            return list(zip(times.tolist(), sizes.tolist()))
+
+        (start, end) = (int(times[0]), int(times[-1]))
+        width = max(1, -(-(end - start + 1) // points))
+        bucket = (times - start) // width
+        peaks = np.full(points, -1, dtype=np.int64)
+        np.maximum.at(peaks, bucket, sizes)
+
+        used = np.flatnonzero(peaks >= 0)
+        return list(zip((start + used * width).tolist(), peaks[used].tolist()))
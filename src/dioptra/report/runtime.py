@@ -1,40 +1,94 @@
-from typing import Iterable
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
 
-from dioptra.utils.code_loc import Frame, SourceLocation, StackLocation
+from dioptra.utils.code_loc import CallSite, Frame, SourceLocation
+from dioptra.utils.threads import VirtualClocks
 
 
 class RuntimeReport:
     def runtime_estimate(self, frame: Frame | None, ns: int):
         pass
 
+    def runtime_op(
+        self, op: str, frame: Frame | None, ns: int, category: str = "compute"
+    ):
+        """Like `runtime_estimate`, for an operation named `op` (such as
+        "EVAL_MULT_CTCT"), in `category` ("compute" or "network")."""
+        self.runtime_estimate(frame, ns)
+
+    def runtime_extrapolated(self, ns: int, error_ns: int):
+        """Called when `ns` of the runtime reported so far was extrapolated
+        from sampled loop iterations, with the given error bound."""
+        pass
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        """Report runtime attributed to a call site rather than a live frame, as
+        done by analyses over recorded traces."""
+        pass
+
 
 class RuntimeTotal(RuntimeReport):
-    def __init__(self):
-        self.total_runtime = 0
+    """The wall time of an estimation case: operations advance the simulated
+    clock of the thread doing them, and the total is the latest clock (which
+    is the sum of all runtimes if the case has a single thread)."""
+
+    def __init__(self, clocks: VirtualClocks | None = None):
+        self.clocks = VirtualClocks() if clocks is None else clocks
+        self.extrapolated_runtime = 0
+        self.error_bound = 0
+
+    @property
+    def total_runtime(self) -> int:
+        return self.clocks.wall_time()
 
     def runtime_estimate(self, frame: Frame | None, ns: int):
-        self.total_runtime += ns
+        self.clocks.advance(ns)
+
+    def runtime_extrapolated(self, ns: int, error_ns: int):
+        self.extrapolated_runtime += ns
+        self.error_bound += error_ns
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        self.clocks.advance(ns)
 
 
 class RuntimeAnnotation(RuntimeReport):
     def __init__(self):
-        self.runtimes: dict[str, dict[int, int]] = {}
-        self.unaccounted_time = 0
+        self.site_runtimes: dict[CallSite | None, int] = {}
+        self.total_runtime = 0
 
     def runtime_estimate(self, frame: Frame | None, ns: int):
-        loc = frame.source_location() if frame is not None else SourceLocation.unknown()
-        if loc == SourceLocation.unknown() or loc.position.lineno is None:
-            self.unaccounted_time += ns
-            return
+        site = frame.call_site() if frame is not None else None
+        self.site_runtimes[site] = self.site_runtimes.get(site, 0) + ns
+        self.total_runtime += ns
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        self.site_runtimes[site] = self.site_runtimes.get(site, 0) + ns
+        self.total_runtime += ns
+
+    @property
+    def runtimes(self) -> dict[str, dict[int, int]]:
+        runtimes: dict[str, dict[int, int]] = {}
+        for site, ns in self.site_runtimes.items():
+            loc = site.source_location() if site is not None else None
+            if loc is None or loc.is_unknown or loc.position.lineno is None:
+                continue
 
-        if loc.filename not in self.runtimes:
-            self.runtimes[loc.filename] = {}
+            file_dict = runtimes.setdefault(loc.filename, {})
+            lineno = loc.position.lineno
+            file_dict[lineno] = file_dict.get(lineno, 0) + ns
 
-        file_dict = self.runtimes[loc.filename]
-        if loc.position.lineno not in file_dict:
-            file_dict[loc.position.lineno] = 0
+        return runtimes
 
-        file_dict[loc.position.lineno] += ns
+    @property
+    def unaccounted_time(self) -> int:
+        total = 0
+        for site, ns in self.site_runtimes.items():
+            loc = site.source_location() if site is not None else None
+            if loc is None or loc.is_unknown or loc.position.lineno is None:
+                total += ns
+
+        return total
 
     def annotation_dicts(self) -> Iterable[tuple[str, dict[int, int]]]:
         for n, v in self.runtimes.items():
@@ -46,18 +100,234 @@ class RuntimeAnnotation(RuntimeReport):
 
 class RuntimeLocSummary(RuntimeReport):
     def __init__(self):
-        self.runtimes: dict[SourceLocation, int] = {}
+        self.site_runtimes: dict[CallSite | None, int] = {}
 
     def runtime_estimate(self, frame: Frame | None, ns: int):
-        loc = frame.source_location() if frame is not None else SourceLocation.unknown()
-        cur = self.runtimes.get(loc, 0)
-        self.runtimes[loc] = cur + ns
+        site = frame.call_site() if frame is not None else None
+        self.site_runtimes[site] = self.site_runtimes.get(site, 0) + ns
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        self.site_runtimes[site] = self.site_runtimes.get(site, 0) + ns
+
+    @property
+    def runtimes(self) -> dict[SourceLocation, int]:
+        runtimes: dict[SourceLocation, int] = {}
+        for site, ns in self.site_runtimes.items():
+            loc = (
+                site.source_location() if site is not None else SourceLocation.unknown()
+            )
+            runtimes[loc] = runtimes.get(loc, 0) + ns
+
+        return runtimes
+
+
+class FlameNode:
+    """A node of the flame graph: a call site reached through the call sites
+    of its ancestors, with the simulated runtime and number of operations
+    attributed to it and to its callees."""
+
+    __slots__ = ("site", "children", "ns", "count", "self_ns", "self_count")
+
+    def __init__(self, site: CallSite | None) -> None:
+        self.site = site
+        self.children: dict[CallSite | None, FlameNode] = {}
+        self.ns = 0
+        self.count = 0
+        self.self_ns = 0
+        self.self_count = 0
+
+    def child(self, site: CallSite | None) -> "FlameNode":
+        node = self.children.get(site)
+        if node is None:
+            node = self.children[site] = FlameNode(site)
+        return node
+
+    def walk(
+        self, stack: tuple["FlameNode", ...] = ()
+    ) -> Iterable[tuple[tuple["FlameNode", ...], "FlameNode"]]:
+        """All nodes below this one (depth first), with the path to them."""
+        for node in self.children.values():
+            path = (*stack, node)
+            yield (path, node)
+            yield from node.walk(path)
 
 
 class RuntimeFlameGraph(RuntimeReport):
+    """Aggregates runtime estimates by call stack, into a prefix tree of the
+    call sites from the estimation case down to each operation. Stacks are
+    cut at Dioptra's own frames, so they start in the estimation case."""
+
     def __init__(self):
-        self.flame_graph: list[tuple[list[StackLocation], int]] = []
+        self.root = FlameNode(None)
+
+    def add(self, sites: list[CallSite], ns: int) -> None:
+        node = self.root
+        node.ns += ns
+        node.count += 1
+        for site in reversed(sites):
+            node = node.child(site)
+            node.ns += ns
+            node.count += 1
+        node.self_ns += ns
+        node.self_count += 1
 
     def runtime_estimate(self, frame: Frame | None, ns: int):
-        loc = frame.stack_location() if frame is not None else []
-        self.flame_graph.append((loc, ns))
+        self.add(frame.user_call_stack() if frame is not None else [], ns)
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        self.add([site] if site is not None else [], ns)
+
+    @property
+    def total_runtime(self) -> int:
+        return self.root.ns
+
+    @staticmethod
+    def frame_name(site: CallSite | None) -> str:
+        if site is None:
+            return "<unknown>"
+        loc = site.source_location()
+        if loc.is_unknown:
+            return site.fn_name
+        return f"{site.fn_name} ({loc.filename}:{loc.position.lineno})"
+
+    def folded(self) -> Iterable[str]:
+        """The flame graph as Brendan Gregg's folded stacks: one line per
+        stack, with its frames separated by semicolons followed by the
+        runtime (in ns) of operations done directly at the stack."""
+        if self.root.self_ns > 0:
+            yield f"<unknown> {self.root.self_ns}"
+        for path, node in self.root.walk():
+            if node.self_count > 0:
+                names = (self.frame_name(n.site).replace(";", ",") for n in path)
+                yield f"{';'.join(names)} {node.self_ns}"
+
+    def speedscope(self, name: str) -> dict[str, Any]:
+        """The flame graph as a speedscope profile, with one weighted sample
+        per stack (in the order operations were first done there)."""
+        frames: list[dict[str, Any]] = []
+        index: dict[CallSite | None, int] = {}
+
+        def frame_index(site: CallSite | None) -> int:
+            i = index.get(site)
+            if i is None:
+                i = index[site] = len(frames)
+                loc = site.source_location() if site is not None else None
+                if site is None or loc is None or loc.is_unknown:
+                    frame: dict[str, Any] = {"name": self.frame_name(site)}
+                else:
+                    frame = {"name": site.fn_name, "file": loc.filename}
+                    frame["line"] = loc.position.lineno
+                    if loc.position.col_offset is not None:
+                        frame["col"] = loc.position.col_offset + 1
+                frames.append(frame)
+            return i
+
+        samples: list[list[int]] = []
+        weights: list[int] = []
+        if self.root.self_count > 0:
+            samples.append([frame_index(None)])
+            weights.append(self.root.self_ns)
+        for path, node in self.root.walk():
+            if node.self_count > 0:
+                samples.append([frame_index(n.site) for n in path])
+                weights.append(node.self_ns)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "nanoseconds",
+                    "startValue": 0,
+                    "endValue": self.root.ns,
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": name,
+            "exporter": "dioptra",
+        }
+
+
+class RuntimeTraceEvents(RuntimeReport):
+    """Lays estimated operations out one after another on a simulated clock,
+    on named tracks (such as environments), and exports them as Chrome trace
+    events (which Perfetto and chrome://tracing can open). Phases are spans of
+    operations on a track."""
+
+    def __init__(self, track: str = ""):
+        self.now = 0
+        self.track = track
+        self.tracks: dict[str, int] = {}
+
+        # track, category, name, start, duration and call site of every event
+        self.events: list[tuple[str, str, str, int, int, CallSite | None]] = []
+
+    def runtime_op(
+        self, op: str, frame: Frame | None, ns: int, category: str = "compute"
+    ):
+        site = frame.call_site() if frame is not None else None
+        self.add(category, op, ns, site)
+
+    def runtime_estimate(self, frame: Frame | None, ns: int):
+        self.runtime_op("operation", frame, ns)
+
+    def site_runtime_estimate(self, site: CallSite | None, ns: int):
+        self.add("compute", "operation", ns, site)
+
+    def add(self, category: str, name: str, ns: int, site: CallSite | None) -> None:
+        self.tracks.setdefault(self.track, len(self.tracks))
+        self.events.append((self.track, category, name, self.now, ns, site))
+        self.now += ns
+
+    @contextmanager
+    def phase(self, track: str, name: str) -> Iterator[None]:
+        """Attribute the operations done in the context to `track`, and record
+        a span named `name` on it around them."""
+        (outer, self.track) = (self.track, track)
+        self.tracks.setdefault(track, len(self.tracks))
+        start = self.now
+        try:
+            yield
+        finally:
+            self.events.append((track, "phase", name, start, self.now - start, None))
+            self.track = outer
+
+    # thread ids of the categories within the process of a track
+    THREADS = {"phase": 0, "compute": 1, "network": 2}
+
+    def chrome_trace(self) -> dict[str, Any]:
+        events: list[dict[str, Any]] = []
+        for track, pid in self.tracks.items():
+            events.append(
+                {"ph": "M", "name": "process_name", "pid": pid, "args": {"name": track}}
+            )
+            for category, tid in self.THREADS.items():
+                events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": pid,
+                        "tid": tid,
+                        "args": {"name": category},
+                    }
+                )
+
+        for track, category, name, start, ns, site in self.events:
+            event = {
+                "ph": "X",
+                "name": name,
+                "cat": category,
+                "pid": self.tracks[track],
+                "tid": self.THREADS[category],
+                # in us, as trace event timestamps are
+                "ts": start / 1000,
+                "dur": ns / 1000,
+            }
+            if site is not None:
+                event["args"] = {"location": str(site.source_location())}
+            events.append(event)
+
+        return {"traceEvents": events, "displayTimeUnit": "ns"}
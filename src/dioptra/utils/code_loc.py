@@ -1,7 +1,10 @@
 import dis
 import inspect
-import sys
-from typing import Any, Optional
+import itertools
+import os
+import weakref
+from types import CodeType
+from typing import Optional
 
 
 class SourceLocation:
@@ -57,39 +60,129 @@ class StackLocation:
         return f"{self.function_name} at {self.source_location}"
 
 
+class CallSite:
+    """A call site, identified by a code object and an instruction offset.
+
+    Call sites are interned, so capturing one is a single dictionary lookup.
+    The corresponding source location is only computed (and then cached) when
+    it is asked for, which keeps `inspect`/`linecache` out of the hot path of
+    the analyzers.
+    """
+
+    __slots__ = ("code", "lasti", "_source_location", "_stack_location")
+
+    _interned: dict[tuple[CodeType, int], "CallSite"] = {}
+
+    def __init__(self, code: CodeType, lasti: int):
+        self.code = code
+        self.lasti = lasti
+        self._source_location: SourceLocation | None = None
+        self._stack_location: StackLocation | None = None
+
+    @staticmethod
+    def of(code: CodeType, lasti: int) -> "CallSite":
+        key = (code, lasti)
+        site = CallSite._interned.get(key)
+        if site is None:
+            site = CallSite(code, lasti)
+            CallSite._interned[key] = site
+        return site
+
+    @property
+    def filename(self) -> str:
+        return inspect.getsourcefile(self.code) or inspect.getfile(self.code)
+
+    @property
+    def fn_name(self) -> str:
+        return self.code.co_name
+
+    @property
+    def positions(self) -> dis.Positions | None:
+        if self.lasti < 0:
+            return None
+
+        # there is one entry in `co_positions` per 2-byte code unit
+        pos = next(itertools.islice(self.code.co_positions(), self.lasti // 2, None))
+        return dis.Positions(*pos)
+
+    def source_location(self) -> SourceLocation:
+        if self._source_location is None:
+            positions = self.positions
+            if positions is None:
+                self._source_location = SourceLocation.unknown()
+            else:
+                self._source_location = SourceLocation(self.filename, positions)
+
+        return self._source_location
+
+    def stack_location(self) -> StackLocation:
+        if self._stack_location is None:
+            self._stack_location = StackLocation(self.source_location(), self.fn_name)
+
+        return self._stack_location
+
+
 class Frame:
+    __slots__ = ("frame", "site")
+
     def __init__(self, frame):
         if frame is None:
             raise ValueError("Frame should not be none")
         self.frame = frame
-        cur_frame = inspect.getframeinfo(self.frame)
-        self.filename = cur_frame.filename
-        self.positions = cur_frame.positions
-        self.fn_name = cur_frame.function
+        self.site = CallSite.of(frame.f_code, frame.f_lasti)
+
+    @property
+    def filename(self) -> str:
+        return self.site.filename
+
+    @property
+    def positions(self) -> dis.Positions | None:
+        return self.site.positions
+
+    @property
+    def fn_name(self) -> str:
+        return self.site.fn_name
 
     def caller(self) -> Optional["Frame"]:
         if self.frame.f_back is None:
             return None
         return Frame(self.frame.f_back)
 
+    def call_site(self) -> CallSite:
+        return self.site
+
     # TODO: deprecate
     def location(self) -> tuple[str, dis.Positions | None]:
         return (self.filename, self.positions)
 
     def source_location(self) -> SourceLocation:
-        if self.positions is None:
-            return SourceLocation.unknown()
-        else:
-            return SourceLocation(self.filename, self.positions)
+        return self.site.source_location()
 
-    def stack_location(self) -> list[StackLocation]:
-        lst = []
-        frame: Optional["Frame"] = self
+    def call_stack(self) -> list[CallSite]:
+        """Capture the call sites of this frame and all of its callers without
+        resolving any of them."""
+        sites = []
+        frame = self.frame
         while frame is not None:
-            lst.append(StackLocation(frame.source_location(), frame.fn_name))
-            frame = frame.caller()
+            sites.append(CallSite.of(frame.f_code, frame.f_lasti))
+            frame = frame.f_back
+
+        return sites
 
-        return lst
+    def user_call_stack(self) -> list[CallSite]:
+        """The call sites of this frame and its callers (innermost first), up
+        to the first frame of Dioptra itself, i.e. the one running the
+        estimation case."""
+        sites = []
+        frame = self.frame
+        while frame is not None and not is_internal_code(frame.f_code):
+            sites.append(CallSite.of(frame.f_code, frame.f_lasti))
+            frame = frame.f_back
+
+        return sites
+
+    def stack_location(self) -> list[StackLocation]:
+        return [site.stack_location() for site in self.call_stack()]
 
 
 class MaybeFrame:
@@ -125,35 +218,61 @@ def calling_frame() -> Frame | None:
     cur_frame = inspect.currentframe()
     if cur_frame is None:
         return None
-    else:
-        return Frame(cur_frame.f_back).caller()
+
+    try:
+        frame = cur_frame.f_back
+        if frame is not None:
+            frame = frame.f_back
+        return None if frame is None else Frame(frame)
+    finally:
+        # break the reference cycle through this frame's locals, which would
+        # otherwise keep the analyzer's values alive until the next collection
+        del cur_frame
+
+
+# Code living in these files belongs to Dioptra (or to the machinery that runs
+# finalizers) rather than to the program being analyzed
+_INTERNAL_ROOTS = (os.path.dirname(os.path.dirname(os.path.abspath(__file__))),)
+_INTERNAL_FILES = frozenset([weakref.__file__])
+_internal_code: dict[CodeType, bool] = {}
+
+
+def is_internal_code(code: CodeType) -> bool:
+    internal = _internal_code.get(code)
+    if internal is None:
+        filename = os.path.abspath(code.co_filename)
+        internal = filename in _INTERNAL_FILES or any(
+            filename.startswith(root + os.sep) for root in _INTERNAL_ROOTS
+        )
+        _internal_code[code] = internal
+
+    return internal
 
 
 class TraceLoc:
-    def __init__(self):
-        self.stack = []
-        self.prev_trace = None
+    """Locates the user code that is running when an analyzer callback fires
+    (e.g. the line that dropped the last reference to a ciphertext).
+
+    The frame is reconstructed on demand by walking the calling thread's stack
+    past Dioptra's own frames, so no trace function is installed and the
+    program under analysis runs at full speed.
+    """
 
-    def __enter__(self):
-        self.prev_trace = sys.gettrace()
-        sys.settrace(self.trace)
+    current_traceloc: "TraceLoc | None" = None
+
+    def __enter__(self) -> "TraceLoc":
         TraceLoc.current_traceloc = self
+        return self
 
     def __exit__(self, type, val, tb):
-        sys.settrace(self.prev_trace)
+        TraceLoc.current_traceloc = None
 
     def get_current_frame(self) -> Frame | None:
-        if len(self.stack) == 0:
-            return None
-
-        return Frame(self.stack[-1])
-
-    def trace(self, frame, event: str, arg: Any):
-        if event == "call":
-            frame.f_trace_lines = False
-            self.stack.append(frame)
-
-        if event == "return":
-            self.stack.pop()
-
-        return self.trace
+        frame = inspect.currentframe()
+        try:
+            while frame is not None and is_internal_code(frame.f_code):
+                frame = frame.f_back
+
+            return None if frame is None else Frame(frame)
+        finally:
+            del frame
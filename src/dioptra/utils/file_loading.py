@@ -5,6 +5,10 @@ import sys
 
 from dioptra.binfhe.calibration import BinFHECalibrationData
 from dioptra.pke.calibration import PKECalibrationData
+from dioptra.pke.calibration_file import (
+    is_binary_calibration,
+    read_binary_calibration,
+)
 
 
 def load_files(files: list[str]) -> None:
@@ -16,6 +20,9 @@ def load_files(files: list[str]) -> None:
 
 
 def load_calibration_data(file: str) -> PKECalibrationData | BinFHECalibrationData:
+    if is_binary_calibration(file):
+        return read_binary_calibration(file)
+
     with open(file) as handle:
         obj = json.load(handle)
         if obj["scheme"]["name"] == "BINFHE":
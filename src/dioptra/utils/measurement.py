@@ -134,3 +134,11 @@ class BPS:
 
         if self.bps <= 0:
             raise ValueError("BPS must be greater than zero.")
+
+
+def merge_setup_memory(size1: int, size2: int) -> int:
+    """Combine two measurements of the memory used to set up the same context
+    (0 if not measured). Anything else a process did before adds to what it
+    measures, so the smallest measurement is the closest."""
+    measured = [size for size in (size1, size2) if size > 0]
+    return min(measured, default=0)
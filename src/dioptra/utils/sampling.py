@@ -0,0 +1,127 @@
+import math
+import statistics
+import time
+from typing import Callable
+
+# two-sided 95% quantiles of Student's t distribution, by degrees of freedom
+_T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+def t95(df: int) -> float:
+    return _T95[df - 1] if df <= len(_T95) else 1.96
+
+
+def relative_ci(samples: list[int]) -> float:
+    """Half width of the 95% confidence interval of the mean of `samples`,
+    relative to the mean."""
+    if len(samples) < 2:
+        return math.inf
+
+    mean = statistics.fmean(samples)
+    if mean == 0:
+        return 0.0
+
+    sem = statistics.stdev(samples) / math.sqrt(len(samples))
+    return t95(len(samples) - 1) * sem / mean
+
+
+def reject_outliers(samples: list[int], threshold: float = 3.5) -> list[int]:
+    """The samples whose modified z-score (based on the median absolute
+    deviation) is within `threshold`, i.e. without e.g. samples that were
+    interrupted by the OS."""
+    if len(samples) < 3:
+        return samples
+
+    median = statistics.median(samples)
+    mad = statistics.median(abs(s - median) for s in samples)
+    if mad == 0:
+        return samples
+
+    return [s for s in samples if 0.6745 * abs(s - median) / mad <= threshold]
+
+
+class SamplingPolicy:
+    """How often to measure each calibration event.
+
+    A fixed policy (the default) takes exactly `min_samples` samples. An
+    adaptive policy (with a `target_ci`) first runs `warmup` unmeasured
+    iterations, then keeps sampling until the relative 95% confidence
+    interval of the mean (over the samples that are not outliers) is at most
+    `target_ci`, `max_samples` were taken or `budget_ns` ran out, whichever
+    comes first (but takes at least `min_samples`)."""
+
+    def __init__(
+        self,
+        min_samples: int = 5,
+        max_samples: int | None = None,
+        target_ci: float | None = None,
+        budget_ns: int | None = None,
+        warmup: int = 0,
+    ) -> None:
+        self.min_samples = min_samples
+        self.max_samples = min_samples if max_samples is None else max_samples
+        self.target_ci = target_ci
+        self.budget_ns = budget_ns
+        self.warmup = warmup
+
+    @staticmethod
+    def fixed(count: int) -> "SamplingPolicy":
+        return SamplingPolicy(count)
+
+    @staticmethod
+    def adaptive(
+        target_ci: float,
+        budget_ns: int | None,
+        min_samples: int = 3,
+        max_samples: int = 1000,
+        warmup: int = 2,
+    ) -> "SamplingPolicy":
+        return SamplingPolicy(min_samples, max_samples, target_ci, budget_ns, warmup)
+
+    def is_adaptive(self) -> bool:
+        return self.target_ci is not None
+
+    def __str__(self) -> str:
+        if self.target_ci is None:
+            return f"fixed ({self.min_samples} samples)"
+
+        budget = "" if self.budget_ns is None else f", {self.budget_ns / 1e9:g}s budget"
+        return f"adaptive ({100 * self.target_ci:g}% target CI{budget})"
+
+    def sample(
+        self,
+        op: Callable[[], object],
+        clock: Callable[[], int] = time.perf_counter_ns,
+    ) -> tuple[list[int], float]:
+        """Measure `op` (in ns, by `clock`), returning the samples to keep and
+        the relative confidence interval they achieve."""
+        for _ in range(0, self.warmup):
+            op()
+
+        samples: list[int] = []
+        spent = 0
+        while len(samples) < self.max_samples:
+            begin = clock()
+            op()
+            ns = clock() - begin
+            samples.append(ns)
+            spent += ns
+
+            if len(samples) < self.min_samples or not self.is_adaptive():
+                continue
+
+            assert self.target_ci is not None
+            if relative_ci(reject_outliers(samples)) <= self.target_ci:
+                break
+
+            if self.budget_ns is not None and spent >= self.budget_ns:
+                break
+
+        if self.is_adaptive():
+            samples = reject_outliers(samples)
+
+        return (samples, relative_ci(samples))
@@ -0,0 +1,96 @@
+"""Dataflow graphs of operations, and how fast they could run on several cores.
+
+Operations are added to a `TaskGraph` in the order they were done, with the
+operations whose results they use, so the graph is always in topological
+order. The total cost of all operations is the work, and the cost of the most
+expensive chain of dependent operations (the critical path) is the span: no
+number of cores can run the graph faster than its span, and work / span is the
+parallelism available in it. `TaskGraph.makespan` list-schedules the graph on a
+given number of cores, always starting the ready operation with the longest
+path to the end of the graph first.
+"""
+
+import heapq
+from array import array
+from typing import Iterable
+
+
+class TaskGraph:
+    def __init__(self) -> None:
+        self.costs = array("q")
+
+        # the earliest time every operation can finish, on unlimited cores
+        self.finish = array("q")
+
+        # the dependencies of operation `i` are `deps[dep_start[i]:dep_start[i+1]]`
+        self.dep_start = array("q", [0])
+        self.deps = array("q")
+
+        self.work = 0
+        self.span = 0
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    def add(self, cost: int, deps: Iterable[int]) -> int:
+        """Add an operation taking `cost` ns which uses the results of the
+        operations `deps`, returning its index."""
+        start = 0
+        for dep in deps:
+            self.deps.append(dep)
+            start = max(start, self.finish[dep])
+
+        node = len(self.costs)
+        self.costs.append(cost)
+        self.finish.append(start + cost)
+        self.dep_start.append(len(self.deps))
+        self.work += cost
+        self.span = max(self.span, start + cost)
+        return node
+
+    def dependencies(self, node: int) -> array:
+        return self.deps[self.dep_start[node] : self.dep_start[node + 1]]
+
+    @property
+    def parallelism(self) -> float:
+        return self.work / self.span if self.span > 0 else 1.0
+
+    def makespan(self, cores: int) -> int:
+        """The time it takes to run the graph on `cores` cores, scheduling
+        ready operations by the length of their path to the end of the graph."""
+        if cores < 1:
+            raise ValueError(f"Cannot schedule on {cores} cores")
+
+        n = len(self.costs)
+        if cores == 1 or n == 0:
+            return self.work
+
+        # the cost of the longest path from every operation to the end
+        tail = array("q", self.costs)
+        successors: list[list[int]] = [[] for _ in range(0, n)]
+        waiting = array("q", bytes(8 * n))
+        for node in range(n - 1, -1, -1):
+            for dep in self.dependencies(node):
+                tail[dep] = max(tail[dep], self.costs[dep] + tail[node])
+                successors[dep].append(node)
+                waiting[node] += 1
+
+        ready = [(-tail[i], i) for i in range(0, n) if waiting[i] == 0]
+        heapq.heapify(ready)
+        running: list[tuple[int, int]] = []
+        now = 0
+        while ready or running:
+            while ready and len(running) < cores:
+                (_, node) = heapq.heappop(ready)
+                heapq.heappush(running, (now + self.costs[node], node))
+
+            # complete everything that finishes next
+            now = running[0][0]
+            while running and running[0][0] == now:
+                (_, node) = heapq.heappop(running)
+                for succ in successors[node]:
+                    waiting[succ] -= 1
+                    if waiting[succ] == 0:
+                        heapq.heappush(ready, (-tail[succ], succ))
+
+        return now
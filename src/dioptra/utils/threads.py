@@ -0,0 +1,244 @@
+import bisect
+import heapq
+import itertools
+import os
+import threading
+import warnings
+from concurrent import futures
+from concurrent.futures import ALL_COMPLETED, Executor, Future
+from typing import Any, Callable, Hashable, Iterable, Iterator
+
+
+def omp_threads() -> int:
+    """The number of threads OpenFHE's OpenMP parallelism runs with in this
+    process: OMP_NUM_THREADS if it is set, and the number of available cores
+    otherwise."""
+    try:
+        return int(os.environ["OMP_NUM_THREADS"])
+    except (KeyError, ValueError):
+        pass
+
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def scale_to_threads(runtimes: dict[int, int], threads: int) -> int:
+    """The runtime (in ns) of an operation at `threads` threads, given its
+    runtimes at (one or more) other thread counts.
+
+    Following Amdahl's law, the runtime at t threads is modelled as s + p / t
+    for a serial part s and a parallel part p, i.e. as linear in 1 / t. The
+    line is fit through the two measured counts nearest to `threads`, which
+    is exact for interpolating between counts that follow the law."""
+    if threads in runtimes:
+        return runtimes[threads]
+
+    counts = sorted(runtimes)
+    if len(counts) == 1:
+        return runtimes[counts[0]]
+
+    i = min(max(bisect.bisect(counts, threads), 1), len(counts) - 1)
+    (lo, hi) = (counts[i - 1], counts[i])
+    parallel = (runtimes[lo] - runtimes[hi]) / (1 / lo - 1 / hi)
+    ns = runtimes[hi] + parallel * (1 / threads - 1 / hi)
+    return max(int(round(ns)), 0)
+
+
+class VirtualClocks:
+    """The simulated time (in ns) of every thread of an estimation case.
+
+    Every thread advances its own clock by the runtime of the operations it
+    does, and so does every worker of a `VirtualTimeExecutor`. Waiting for
+    another thread or worker (e.g. for the result of a future, or joining a
+    `VirtualThread`) moves the clock of the waiting one forward to the time
+    the other got there, so the latest clock is the wall time of the case.
+    A `VirtualThread` starts at the time of the thread that started it.
+
+    Other threads (e.g. plain `threading.Thread`s, or the workers of a real
+    `ThreadPoolExecutor`) cannot be followed, so their work is done on the
+    clock of the thread that created the clocks, as if it ran serially (with
+    a warning)."""
+
+    def __init__(self) -> None:
+        self.clocks: dict[Hashable, int] = {}
+        # guards adding clocks against reading all of them
+        self.lock = threading.Lock()
+
+        # the clock of every thread, or of the worker it is running a task for
+        # (thread ids are reused once threads exit, so they are not used)
+        self.local = threading.local()
+        self.threads = itertools.count()
+
+        # the clock of the thread the clocks are created in, which other
+        # threads that are not followed use as well
+        self.serial = self.local.key = ("thread", next(self.threads))
+        self.warned = False
+
+    def key(self) -> Hashable:
+        try:
+            return self.local.key
+        except AttributeError:
+            pass
+
+        thread = threading.current_thread()
+        if isinstance(thread, VirtualThread):
+            key = self.local.key = ("thread", next(self.threads))
+            return key
+
+        if not self.warned:
+            self.warned = True
+            warnings.warn(
+                f"Thread {thread.name} is not a VirtualThread (see"
+                " Analyzer.Thread), so its runtime is estimated as if it ran"
+                " serially",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+        self.local.key = self.serial
+        return self.serial
+
+    def now(self) -> int:
+        return self.clocks.get(self.key(), 0)
+
+    def advance(self, ns: int) -> None:
+        # only the thread (or worker) itself updates its clock
+        key = self.key()
+        with self.lock:
+            self.clocks[key] = self.clocks.get(key, 0) + ns
+
+    def wait_until(self, ns: int) -> None:
+        key = self.key()
+        if self.clocks.get(key, 0) < ns:
+            with self.lock:
+                self.clocks[key] = ns
+
+    def wall_time(self) -> int:
+        with self.lock:
+            return max(self.clocks.values(), default=0)
+
+
+class VirtualThread(threading.Thread):
+    """A stand-in for `threading.Thread` in estimation cases. The thread's
+    simulated clock starts at the time of the thread that starts it, and
+    joining it waits for it on the simulated clocks as well."""
+
+    def __init__(self, clocks: VirtualClocks, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.clocks = clocks
+        self.started = 0
+        self.finished = 0
+
+    def start(self) -> None:
+        self.started = self.clocks.now()
+        super().start()
+
+    def run(self) -> None:
+        self.clocks.wait_until(self.started)
+        try:
+            super().run()
+        finally:
+            self.finished = self.clocks.now()
+
+    def join(self, timeout: float | None = None) -> None:
+        super().join(timeout)
+        if not self.is_alive():
+            self.clocks.wait_until(self.finished)
+
+
+class VirtualFuture(Future):
+    """A future of a `VirtualTimeExecutor` task. Getting its result (or
+    exception) waits for the task on the simulated clocks as well."""
+
+    def __init__(self, clocks: VirtualClocks) -> None:
+        super().__init__()
+        self.clocks = clocks
+        self.finished = 0
+
+    def result(self, timeout: float | None = None) -> Any:
+        self.clocks.wait_until(self.finished)
+        return super().result(timeout)
+
+    def exception(self, timeout: float | None = None) -> BaseException | None:
+        self.clocks.wait_until(self.finished)
+        return super().exception(timeout)
+
+
+class VirtualTimeExecutor(Executor):
+    """A stand-in for `concurrent.futures.ThreadPoolExecutor` in estimation
+    cases, whose tasks run concurrently in simulated time.
+
+    Every task runs right away when it is submitted (in the submitting thread),
+    on the simulated worker that is free the earliest, starting no earlier than
+    it was submitted, i.e. as a thread pool with a FIFO queue would run it. This
+    keeps the estimate deterministic, but a task cannot wait for anything that
+    happens after it was submitted."""
+
+    def __init__(self, clocks: VirtualClocks, max_workers: int | None = None) -> None:
+        if max_workers is None:
+            # as for ThreadPoolExecutor
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+
+        self.clocks = clocks
+        self.workers = [(0, (id(self), i)) for i in range(0, max_workers)]
+        self.finished = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        future = VirtualFuture(self.clocks)
+        submitted = self.clocks.now()
+        with self.lock:
+            (free, worker) = heapq.heappop(self.workers)
+
+        outer = self.clocks.key()
+        self.clocks.local.key = worker
+        try:
+            self.clocks.wait_until(max(free, submitted))
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            future.finished = self.clocks.now()
+            self.clocks.local.key = outer
+            with self.lock:
+                heapq.heappush(self.workers, (future.finished, worker))
+                self.finished = max(self.finished, future.finished)
+
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if wait:
+            self.clocks.wait_until(self.finished)
+
+
+def wait(
+    fs: Iterable[Future],
+    timeout: float | None = None,
+    return_when: str = ALL_COMPLETED,
+) -> tuple[set[Future], set[Future]]:
+    """Stand-in for `concurrent.futures.wait` that also waits on the simulated
+    clocks: for all `VirtualFuture`s that are done with ALL_COMPLETED, and
+    for the first of them to finish otherwise."""
+    (done, not_done) = futures.wait(fs, timeout, return_when)
+    virtual = [f for f in done if isinstance(f, VirtualFuture)]
+    if virtual:
+        finished = [f.finished for f in virtual]
+        until = max(finished) if return_when == ALL_COMPLETED else min(finished)
+        virtual[0].clocks.wait_until(until)
+    return (done, not_done)
+
+
+def as_completed(
+    fs: Iterable[Future], timeout: float | None = None
+) -> Iterator[Future]:
+    """Stand-in for `concurrent.futures.as_completed`, yielding `VirtualFuture`s
+    in the order they finish in simulated time, each once the clocks waited
+    for it."""
+    done = list(futures.as_completed(list(fs), timeout))
+    done.sort(key=lambda f: f.finished if isinstance(f, VirtualFuture) else 0)
+    for future in done:
+        if isinstance(future, VirtualFuture):
+            future.clocks.wait_until(future.finished)
+        yield future
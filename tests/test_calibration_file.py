@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from dioptra.context.calibrate import write_calibration
+from dioptra.pke.calibration import Event, EventKind, PKECalibrationData
+from dioptra.pke.calibration_file import (
+    is_binary_calibration,
+    read_binary_calibration,
+    write_binary_calibration,
+)
+from dioptra.pke.scheme import LevelInfo, SchemeModelBFV
+from dioptra.utils.file_loading import load_calibration_data
+from tests.test_trace import calibration
+
+
+class TestBinaryCalibration(TestCase):
+    def test_roundtrip(self):
+        cal = calibration()
+        cal.metadata = "scheme: CKKS"
+        cal.runtime_ci[Event(EventKind.EVAL_BOOTSTRAP)] = 0.05
+        cal.threads = 1
+        cal.thread_samples[4] = {Event(EventKind.EVAL_BOOTSTRAP): [300, 310]}
+        cal.cost_model = cal.fit_cost_model()
+
+        with tempfile.TemporaryDirectory() as d:
+            file = os.path.join(d, "cal.dcb")
+            write_binary_calibration(file, cal)
+            self.assertTrue(is_binary_calibration(file))
+            loaded = read_binary_calibration(file)
+
+            # averages are available before the samples are loaded
+            self.assertIsNone(loaded._runtime_samples)
+            self.assertEqual(loaded.avg_runtimes(), cal.avg_runtimes())
+            self.assertEqual(
+                json.dumps(loaded.to_dict(), sort_keys=True),
+                json.dumps(cal.to_dict(), sort_keys=True),
+            )
+
+        lv = LevelInfo(2, 1)
+        self.assertEqual(
+            loaded.avg_runtime_table(2).lookup(EventKind.ENCRYPT, lv),
+            cal.avg_runtime_table(2).lookup(EventKind.ENCRYPT, lv),
+        )
+
+
+class TestTopUp(TestCase):
+    def test_refits_cost_model(self):
+        def measured(kind: EventKind, ns: int) -> PKECalibrationData:
+            data = PKECalibrationData(SchemeModelBFV())
+            for level in range(0, 3):
+                e = Event(kind, LevelInfo(level, 1))
+                data.add_runtime_sample(e, ns - 10 * level)
+            data.cost_model = data.fit_cost_model()
+            return data
+
+        with tempfile.TemporaryDirectory() as d:
+            file = os.path.join(d, "cal.dc")
+            measured(EventKind.ENCRYPT, 100).write_json(file)
+            write_calibration(measured(EventKind.DECRYPT, 50), file, top_up=True)
+            loaded = load_calibration_data(file)
+
+        # the model covers the events of both runs
+        table = loaded.avg_runtime_table()
+        self.assertEqual(table.lookup(EventKind.ENCRYPT, LevelInfo(4, 1)), 60)
+        self.assertEqual(table.lookup(EventKind.DECRYPT, LevelInfo(4, 1)), 10)
@@ -0,0 +1,51 @@
+import inspect
+from unittest import TestCase, mock
+
+from dioptra.utils.code_loc import CallSite, Frame, TraceLoc, calling_frame
+
+
+def where_am_i() -> Frame | None:
+    return calling_frame()
+
+
+class TestCallSite(TestCase):
+    def test_calling_frame_location(self):
+        line = inspect.currentframe().f_lineno + 1
+        frame = where_am_i()
+        self.assertIsNotNone(frame)
+        loc = frame.source_location()
+        self.assertEqual(loc.filename, __file__)
+        self.assertEqual(loc.position.lineno, line)
+        self.assertEqual(frame.fn_name, "test_calling_frame_location")
+
+    def test_calling_frame_at_top(self):
+        # calling_frame called from a frame without callers
+        top = type("TopFrame", (), {"f_back": None})()
+        with mock.patch.object(inspect, "currentframe", return_value=top):
+            self.assertIsNone(calling_frame())
+
+    def test_call_sites_are_interned(self):
+        sites = [where_am_i().call_site() for _ in range(0, 3)]
+        self.assertIs(sites[0], sites[1])
+        self.assertIs(sites[1], sites[2])
+
+        other = where_am_i().call_site()
+        self.assertIsNot(sites[0], other)
+        self.assertIs(CallSite.of(other.code, other.lasti), other)
+
+    def test_stack_location(self):
+        stack = where_am_i().stack_location()
+        self.assertEqual(stack[0].function_name, "test_stack_location")
+        self.assertEqual(stack[0].source_location.filename, __file__)
+
+
+class TestTraceLoc(TestCase):
+    def test_current_frame_is_user_code(self):
+        with TraceLoc() as tloc:
+            self.assertIsNotNone(tloc)
+            line = inspect.currentframe().f_lineno + 1
+            frame = tloc.get_current_frame()
+
+        self.assertIsNotNone(frame)
+        self.assertEqual(frame.fn_name, "test_current_frame_is_user_code")
+        self.assertEqual(frame.source_location().position.lineno, line)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.runtime import Runtime
+from dioptra.report.runtime import RuntimeFlameGraph, RuntimeTotal
+from tests.test_trace import calibration
+
+
+def square(cc: Analyzer, ct):
+    return cc.EvalMult(ct, ct)
+
+
+def program(cc: Analyzer) -> None:
+    ct = cc.ArbitraryCT(level=2)
+    for _ in range(0, 10):
+        square(cc, ct)
+    cc.EvalMult(ct, ct)
+
+
+class TestFlameGraph(TestCase):
+    def test_aggregation(self):
+        cal = calibration()
+        flame = RuntimeFlameGraph()
+        total = RuntimeTotal()
+        program(Analyzer([Runtime(cal, flame), Runtime(cal, total)], cal.scheme))
+
+        self.assertEqual(flame.total_runtime, total.total_runtime)
+
+        # every operation in the loop shares a single node
+        lines = list(flame.folded())
+        squares = [line for line in lines if "square (" in line]
+        self.assertEqual(len(squares), 1)
+        stack = squares[0].rsplit(" ", 1)[0]
+        self.assertEqual(stack.split(";")[-1].split(" ")[0], "square")
+        ns_total = sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+        self.assertEqual(ns_total, total.total_runtime)
+
+        profile = flame.speedscope("program")["profiles"][0]
+        self.assertEqual(sum(profile["weights"]), total.total_runtime)
+        self.assertEqual(len(profile["samples"]), len(lines))
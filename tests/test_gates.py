@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import openfhe
+
+from dioptra.binfhe.analyzer import BinFHEAnalyzer
+from dioptra.binfhe.event import BinFHEEvent, BinFHEEventKind
+from dioptra.binfhe.gates import GateGraph
+from dioptra.binfhe.params import BinFHEParams
+
+
+def runtimes() -> dict[BinFHEEvent, int]:
+    ort = dict((BinFHEEvent(kind), 100) for kind in BinFHEEventKind)
+    ort[BinFHEEvent(BinFHEEventKind.EVAL_NOT)] = 1
+    ort[BinFHEEvent(BinFHEEventKind.ENCRYPT)] = 10
+    return ort
+
+
+class TestGateGraph(TestCase):
+    def test_adder_tree(self):
+        gates = GateGraph(runtimes(), 0)
+        cc = BinFHEAnalyzer(BinFHEParams(10, 1024, 32), gates)
+        sk = cc.KeyGen()
+
+        # reduce 8 bits with a tree of gates, negating the leaves
+        bits = [cc.EvalNOT(cc.Encrypt(sk, i % 2)) for i in range(0, 8)]
+        while len(bits) > 1:
+            bits = [
+                cc.EvalBinGate(openfhe.BINGATE.AND, bits[i], bits[i + 1])
+                for i in range(0, len(bits), 2)
+            ]
+
+        self.assertEqual(gates.gates, 7)
+        self.assertEqual(gates.gate_counts, {BinFHEEventKind.EVAL_BIN_GATE_AND: 7})
+        self.assertEqual(gates.depth, 3)
+        self.assertEqual(gates.widths, [4, 2, 1])
+
+        graph = gates.graph
+        self.assertEqual(graph.work, 8 * 10 + 8 * 1 + 7 * 100)
+        self.assertEqual(graph.span, 10 + 1 + 3 * 100)
+        self.assertEqual(graph.makespan(1), graph.work)
+        self.assertEqual(graph.makespan(8), graph.span)
+        self.assertEqual(graph.makespan(4), 2 * 10 + 2 * 1 + 3 * 100)
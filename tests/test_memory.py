@@ -0,0 +1,119 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer, EvalKeyKind
+from dioptra.pke.liveness import Liveness
+from dioptra.pke.memory import PKEMemoryEstimate
+from dioptra.pke.scheme import LevelInfo
+from dioptra.report.memory import AllocationType, MemoryMaxReport, MemoryPeakReport
+from tests.test_trace import calibration
+
+
+def square_all(cc: Analyzer, cts: list) -> list:
+    return [cc.EvalMult(ct, ct) for ct in cts]
+
+
+def program(cc: Analyzer) -> None:
+    cts = [cc.ArbitraryCT(level=2) for _ in range(0, 3)]
+    squares = square_all(cc, cts)
+    del cts, squares
+    cc.ArbitraryCT()
+
+
+class TestMemoryPeakReport(TestCase):
+    def test_peak_attribution(self):
+        cal = calibration()
+        report = MemoryPeakReport()
+        memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, report)
+        program(Analyzer([memory], cal.get_scheme()))
+
+        # the three inputs and their squares are live at the peak
+        lv = LevelInfo(2, 1)
+        ct_size = cal.ct_mem[2]
+        sq_size = cal.ct_mem[cal.get_scheme().mul_level(lv, lv).level]
+        self.assertEqual(report.max_value_size, 3 * ct_size + 3 * sq_size)
+        totals = report.peak_inclusive()
+        self.assertEqual(totals[()], report.max_value_size)
+
+        by_fn: dict[str, int] = {}
+        for stack, size in totals.items():
+            if len(stack) > 0:
+                fn = stack[-1].function_name
+                by_fn[fn] = by_fn.get(fn, 0) + size
+
+        self.assertEqual(by_fn["square_all"], 3 * sq_size)
+        self.assertEqual(by_fn["program"], 3 * ct_size + 3 * sq_size)
+
+    def test_memory_curve(self):
+        now = 0
+        report = MemoryPeakReport(lambda: now)
+        report.record_setup_size(1000)
+        for i in range(0, 100):
+            now = i
+            report.record_alloc(AllocationType.CIPHERTEXT, i, 1 + (i == 42), None)
+            report.record_dealloc(AllocationType.CIPHERTEXT, i, 1 + (i == 42), None)
+
+        curve = report.memory_curve(10)
+        self.assertLessEqual(len(curve), 10)
+        self.assertEqual(max(size for (_, size) in curve), 1002)
+        self.assertEqual([t for (t, _) in curve], sorted(t for (t, _) in curve))
+
+    def test_memory_curve_out_of_order(self):
+        # changes made by threads whose clocks are behind the latest one
+        now = 0
+        report = MemoryPeakReport(lambda: now)
+        for i in range(0, 100):
+            now = 1000 - i if i % 2 else i
+            report.record_alloc(AllocationType.CIPHERTEXT, i, 1, None)
+
+        curve = report.memory_curve(10)
+        self.assertLessEqual(len(curve), 10)
+        self.assertEqual(max(size for (_, size) in curve), 100)
+        self.assertEqual([t for (t, _) in curve], sorted(t for (t, _) in curve))
+
+
+class TestLiveness(TestCase):
+    def test_ideal_peak(self):
+        cal = calibration()
+        now = 0
+
+        def clock() -> int:
+            return now
+
+        maxmem = MemoryMaxReport()
+        memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, maxmem)
+        liveness = Liveness(cal.ct_mem, cal.pt_mem, clock)
+        cc = Analyzer([memory, liveness], cal.get_scheme())
+
+        # `a` is held until the end, although it is last used for `b`
+        a = cc.ArbitraryCT()
+        b = cc.EvalAdd(a, a)
+        c = cc.EvalAdd(b, b)
+        now = 10
+        del a, b, c
+
+        size = cal.ct_mem[0]
+        self.assertEqual(maxmem.max_value_size, 3 * size)
+        self.assertEqual(liveness.ideal_peak(), 2 * size)
+
+        held = liveness.held_sites()
+        self.assertEqual(sum(h.count for h in held), 3)
+        self.assertEqual(sum(h.byte_ns for h in held), 3 * 10 * size)
+
+    def test_ideal_peak_keys(self):
+        cal = calibration()
+        key_size = {EvalKeyKind.MULT: 1000}
+        maxmem = MemoryMaxReport()
+        memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, maxmem, key_size)
+        liveness = Liveness(cal.ct_mem, cal.pt_mem, key_size=key_size)
+        cc = Analyzer([memory, liveness], cal.get_scheme())
+
+        # the key is charged from its generation on, although it is never used
+        keys = cc.KeyGen()
+        a = cc.ArbitraryCT()
+        cc.EvalMultKeyGen(keys.secretKey)
+        cc.EvalMultKeyGen(keys.secretKey)
+        del a
+
+        size = cal.ct_mem[0]
+        self.assertEqual(maxmem.max_value_size, size + 1000)
+        self.assertEqual(liveness.ideal_peak(), max(size, 1000))
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.memory import PKEMemoryEstimate
+from dioptra.pke.runtime import Runtime
+from dioptra.report.memory import MemoryMaxReport
+from dioptra.report.runtime import RuntimeTotal
+from tests.test_trace import calibration
+
+
+def program(cc: Analyzer) -> None:
+    kp = cc.KeyGen()
+    pt = cc.ArbitraryPT()
+    acc = cc.Encrypt(kp.publicKey, pt)
+    kept = []
+    for _ in cc.Repeat(50):
+        ct = cc.Encrypt(kp.publicKey, pt)
+        ct = cc.EvalAdd(ct, pt)
+        kept.append(ct)
+        for _ in cc.Repeat(10):
+            acc = cc.EvalAdd(acc, pt)
+
+
+def estimate(sample_loops: bool) -> tuple[RuntimeTotal, MemoryMaxReport]:
+    cal = calibration()
+    total = RuntimeTotal()
+    maxmem = MemoryMaxReport()
+    memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, maxmem)
+    cc = Analyzer([Runtime(cal, total), memory], cal.get_scheme(), None, sample_loops)
+    program(cc)
+    return (total, maxmem)
+
+
+class TestRepeat(TestCase):
+    def test_sampled_matches_full(self):
+        (full, full_mem) = estimate(False)
+        (sampled, sampled_mem) = estimate(True)
+
+        self.assertEqual(sampled.total_runtime, full.total_runtime)
+        self.assertGreater(sampled.extrapolated_runtime, 0)
+        self.assertEqual(sampled.error_bound, 0)
+        self.assertEqual(sampled_mem.max_value_size, full_mem.max_value_size)
@@ -0,0 +1,78 @@
+import json
+from unittest import TestCase
+
+from dioptra.pke.calibration import Event, EventKind, PKECalibrationData
+from dioptra.pke.scheme import LevelInfo, SchemeModelBFV
+from dioptra.utils.sampling import SamplingPolicy, reject_outliers, relative_ci
+
+
+class TestSampling(TestCase):
+    def test_fixed(self):
+        calls = []
+        (samples, _) = SamplingPolicy.fixed(4).sample(lambda: calls.append(1))
+        self.assertEqual(len(samples), 4)
+        self.assertEqual(len(calls), 4)
+
+    def test_adaptive(self):
+        # an op that alternately takes 100 and 200ns on a simulated clock
+        now = [0]
+        calls = []
+
+        def op():
+            calls.append(1)
+            now[0] += 100 if len(calls) % 2 else 200
+
+        def clock():
+            return now[0]
+
+        # the CI of the 5 samples 100, 200, 100, 200, 100 is below 50%, but
+        # not that of the first 4
+        policy = SamplingPolicy.adaptive(0.5, None, min_samples=3, warmup=2)
+        (samples, ci) = policy.sample(op, clock)
+        self.assertEqual(len(calls), 7)
+        self.assertEqual(samples, [100, 200, 100, 200, 100])
+        self.assertLessEqual(ci, 0.5)
+
+        # the budget runs out after the fourth sample
+        calls.clear()
+        policy = SamplingPolicy.adaptive(0.0, 500, min_samples=3, warmup=0)
+        (samples, _) = policy.sample(op, clock)
+        self.assertEqual(samples, [100, 200, 100, 200])
+
+        # a budget that is used up immediately stops at the minimum
+        calls.clear()
+        policy = SamplingPolicy.adaptive(0.0, 0, min_samples=3, warmup=0)
+        policy.sample(op, clock)
+        self.assertEqual(len(calls), 3)
+
+    def test_statistics(self):
+        self.assertEqual(reject_outliers([10, 11, 10, 12, 1000]), [10, 11, 10, 12])
+        self.assertEqual(relative_ci([5, 5, 5]), 0.0)
+        self.assertGreater(relative_ci([4, 5, 6]), relative_ci([4, 5, 6] * 4))
+
+    def test_ci_reported(self):
+        cal = PKECalibrationData(SchemeModelBFV())
+        e = Event(EventKind.ENCRYPT, LevelInfo(0, 1))
+        cal.add_runtime_sample(e, 100)
+        cal.runtime_ci[e] = 0.1
+
+        loaded = PKECalibrationData.from_dict(json.loads(json.dumps(cal.to_dict())))
+        self.assertEqual(loaded.runtime_ci, {e: 0.1})
+        table = loaded.avg_runtime_table()
+        table.lookup(EventKind.ENCRYPT, LevelInfo(0, 2))
+        table.lookup(EventKind.ENCRYPT, LevelInfo(0, 1))
+        self.assertAlmostEqual(table.ci_ns, 20.0)
+
+    def test_ci_combined(self):
+        cal = PKECalibrationData(SchemeModelBFV())
+        for kind, ns in [(EventKind.ENCRYPT, 300), (EventKind.DECRYPT, 200)]:
+            e = Event(kind, LevelInfo(0, 1))
+            cal.add_runtime_sample(e, ns)
+            cal.runtime_ci[e] = 0.1
+
+        # the intervals of independently measured events are not added up
+        table = cal.avg_runtime_table()
+        table.lookup(EventKind.ENCRYPT, LevelInfo(0, 1))
+        table.lookup(EventKind.DECRYPT, LevelInfo(0, 1))
+        table.lookup(EventKind.DECRYPT, LevelInfo(0, 1))
+        self.assertAlmostEqual(table.ci_ns, 50.0)
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.parallel import Parallelism
+from dioptra.utils.schedule import TaskGraph
+from tests.test_trace import calibration
+
+
+class TestTaskGraph(TestCase):
+    def test_makespan(self):
+        graph = TaskGraph()
+        a = graph.add(10, [])
+        b = graph.add(10, [])
+        c = graph.add(10, [])
+        graph.add(5, [a, b, c])
+
+        self.assertEqual(graph.work, 35)
+        self.assertEqual(graph.span, 15)
+        self.assertEqual(graph.makespan(1), 35)
+        self.assertEqual(graph.makespan(2), 25)
+        self.assertEqual(graph.makespan(3), 15)
+        self.assertEqual(graph.makespan(8), 15)
+
+    def test_critical_path_first(self):
+        # the long chain should start before the independent operation
+        graph = TaskGraph()
+        graph.add(10, [])
+        x = graph.add(5, [])
+        graph.add(10, [x])
+        self.assertEqual(graph.makespan(2), 15)
+
+    def test_dataflow(self):
+        cal = calibration()
+        parallel = Parallelism(cal)
+        cc = Analyzer([parallel], cal.scheme)
+
+        pt = cc.ArbitraryPT(level=2)
+        cts = [cc.ArbitraryCT(level=2) for _ in range(0, 4)]
+        sums = [cc.EvalAdd(cc.EvalMult(ct, ct), pt) for ct in cts]
+        cc.EvalAdd(cc.EvalMult(sums[0], sums[1]), pt)
+
+        graph = parallel.graph
+        self.assertEqual(len(graph), 10)
+        self.assertEqual(graph.work, 5 * 100 + 5 * 7)
+        self.assertEqual(graph.span, 2 * 100 + 2 * 7)
+        self.assertEqual(graph.makespan(4), graph.span)
@@ -0,0 +1,278 @@
+import json
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from dioptra.pke.calibration import (
+    CalibrationJournal,
+    Event,
+    EventKind,
+    PKECalibrationData,
+    RuntimeTable,
+)
+from dioptra.pke.cost_model import LinearCostModel, SizeTable
+from dioptra.pke.scheme import LevelInfo, SchemeModelBFV, SchemeModelCKKS
+
+
+class TestLevelInfo(TestCase):
+    def test_interned(self):
+        self.assertIs(LevelInfo(3, 2), LevelInfo(level=3, noise_scale_deg=2))
+        self.assertIs(LevelInfo(3, 2).copy(noise_scale_deg=1), LevelInfo(3, 1))
+        self.assertIs(LevelInfo.from_dict(LevelInfo(4, 1).to_dict()), LevelInfo(4, 1))
+        self.assertIs(pickle.loads(pickle.dumps(LevelInfo(5, 2))), LevelInfo(5, 2))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            LevelInfo(1, 1).level = 2
+
+    def test_levelled_incr(self):
+        self.assertIs(LevelInfo(1, 1).levelled_incr(), LevelInfo(1, 2))
+        self.assertIs(LevelInfo(1, 2).levelled_incr(), LevelInfo(2, 2))
+
+    def test_scheme_levels(self):
+        ckks = SchemeModelCKKS(LevelInfo(10, 2))
+        self.assertIs(ckks.mul_level(LevelInfo(1, 1), LevelInfo(2, 1)), LevelInfo(2, 2))
+        self.assertIs(ckks.mul_level(LevelInfo(2, 2), LevelInfo(2, 2)), LevelInfo(3, 2))
+        self.assertIs(ckks.add_level(LevelInfo(1, 2), LevelInfo(2, 1)), LevelInfo(2, 1))
+
+        bfv = SchemeModelBFV()
+        self.assertIs(bfv.mul_level(LevelInfo(0, 2), LevelInfo(0, 1)), LevelInfo(0, 3))
+
+
+class TestEvent(TestCase):
+    def test_interned(self):
+        e = Event(EventKind.EVAL_MULT_CTCT, LevelInfo(1, 1), LevelInfo(2, 1))
+        self.assertIs(
+            e, Event(EventKind.EVAL_MULT_CTCT, LevelInfo(1, 1), LevelInfo(2, 1))
+        )
+        self.assertIs(Event.from_dict(e.to_dict()), e)
+        self.assertIs(pickle.loads(pickle.dumps(e)), e)
+        self.assertIsNot(e, Event(EventKind.EVAL_MULT_CTCT, LevelInfo(2, 1)))
+
+
+class TestRuntimeTable(TestCase):
+    def test_lookup(self):
+        l1, l2 = LevelInfo(1, 1), LevelInfo(2, 1)
+        table = RuntimeTable(
+            {
+                Event(EventKind.EVAL_MULT_CTCT, l1, l2): 10,
+                Event(EventKind.EVAL_MULT_CTCT, l2, l1): 20,
+                Event(EventKind.EVAL_ADD_CTPT, l1, l2): 30,
+                Event(EventKind.EVAL_BOOTSTRAP): 40,
+            }
+        )
+        self.assertEqual(table.lookup(EventKind.EVAL_MULT_CTCT, l1, l2), 10)
+        self.assertEqual(table.lookup(EventKind.EVAL_MULT_CTCT, l2, l1), 20)
+        self.assertEqual(table.lookup(EventKind.EVAL_ADD_CTPT, l2, l1), 30)
+        self.assertEqual(table.lookup(EventKind.EVAL_BOOTSTRAP), 40)
+        self.assertEqual(table.get_runtime_ns(Event(EventKind.EVAL_BOOTSTRAP)), 40)
+
+        with self.assertRaises(NotImplementedError):
+            table.lookup(EventKind.EVAL_ADD_CTCT, l1, l2)
+
+        # levels created after the table was compiled
+        with self.assertRaises(NotImplementedError):
+            table.lookup(EventKind.EVAL_MULT_CTCT, l1, LevelInfo(1000, 1))
+
+    def test_new_levels(self):
+        runtimes = {}
+        for level in range(0, 3):
+            lv = LevelInfo(level, 1)
+            runtimes[Event(EventKind.EVAL_MULT_CTCT, lv, LevelInfo(0, 1))] = level
+            runtimes[Event(EventKind.EVAL_SUM, lv)] = 10 + level
+        model = LinearCostModel.fit(
+            (e.kind, e.arg_level1, e.arg_level2, ns) for (e, ns) in runtimes.items()
+        )
+
+        table = RuntimeTable(runtimes, is_bfv=True, model=model)
+        table.lookup(EventKind.EVAL_SUM, LevelInfo(0, 1))
+        stride = table.stride
+
+        # levels created after the table was compiled are filled in, without
+        # growing the table for every one of them
+        new = [LevelInfo(level, deg) for level in range(0, 3) for deg in (5000, 5001)]
+        new.append(LevelInfo(5000, 1))
+        for lv in new:
+            table.lookup(EventKind.EVAL_SUM, lv)
+        self.assertLessEqual(table.stride, 2 * stride)
+
+        fresh = RuntimeTable(runtimes, is_bfv=True, model=model)
+        levels = LevelInfo.interned()
+        for lv1 in levels:
+            expected = fresh.lookup(EventKind.EVAL_SUM, lv1)
+            self.assertEqual(table.lookup(EventKind.EVAL_SUM, lv1), expected)
+            for lv2 in levels:
+                expected = fresh.lookup(EventKind.EVAL_MULT_CTCT, lv1, lv2)
+                self.assertEqual(
+                    table.lookup(EventKind.EVAL_MULT_CTCT, lv1, lv2), expected
+                )
+
+        self.assertEqual(
+            table.lookup(EventKind.EVAL_MULT_CTCT, LevelInfo(2, 5000), LevelInfo(0, 1)),
+            2,
+        )
+        self.assertEqual(table.lookup(EventKind.EVAL_SUM, LevelInfo(5000, 1)), 5010)
+
+    def test_bfv_ignores_noise_scale_deg(self):
+        lv = LevelInfo(3, 1)
+        table = RuntimeTable({Event(EventKind.EVAL_SUM, lv): 5}, is_bfv=True)
+        self.assertEqual(table.lookup(EventKind.EVAL_SUM, lv), 5)
+        self.assertEqual(table.lookup(EventKind.EVAL_SUM, LevelInfo(3, 7)), 5)
+
+    def test_model_fills_gaps(self):
+        runtimes = {}
+        for level in range(0, 3):
+            lv = LevelInfo(level, 1)
+            runtimes[Event(EventKind.ENCRYPT, lv)] = 100 - 10 * level
+            runtimes[Event(EventKind.EVAL_ADD_CTCT, lv, lv)] = 50 - 5 * level
+
+        table = RuntimeTable(
+            runtimes,
+            model=LinearCostModel.fit(
+                (e.kind, e.arg_level1, e.arg_level2, ns) for (e, ns) in runtimes.items()
+            ),
+        )
+        self.assertEqual(table.lookup(EventKind.ENCRYPT, LevelInfo(1, 1)), 90)
+        self.assertEqual(table.modelled_uses, {})
+
+        # extrapolated beyond the calibrated levels, and between them
+        self.assertEqual(table.lookup(EventKind.ENCRYPT, LevelInfo(5, 1)), 50)
+        self.assertEqual(
+            table.lookup(EventKind.EVAL_ADD_CTCT, LevelInfo(0, 1), LevelInfo(2, 1)), 45
+        )
+        self.assertEqual(table.modelled_ns, 95)
+        self.assertEqual(len(table.modelled_uses), 2)
+
+        # kinds that were never calibrated are still missing
+        with self.assertRaises(NotImplementedError):
+            table.lookup(EventKind.EVAL_BOOTSTRAP)
+
+    def test_size_extrapolated(self):
+        sizes = SizeTable({0: 300, 1: 200})
+        self.assertEqual(sizes[3], 0)
+        self.assertEqual(sizes[-1], 400)
+        self.assertNotIn(-1, sizes)
+
+        # the line is refit when calibrated sizes change
+        sizes[1] = 250
+        self.assertEqual(sizes[-1], 350)
+
+    def test_merge_setup_memory(self):
+        groups = [PKECalibrationData(SchemeModelBFV()) for _ in range(3)]
+        for group, size in zip(groups, [0, 300, 200]):
+            group.set_setup_memory_estimate(size)
+
+        (data, *rest) = groups
+        for other in rest:
+            data.merge(other)
+        self.assertEqual(data.setup_memory_size, 200)
+
+    def test_cost_model_stored(self):
+        cal = PKECalibrationData(SchemeModelBFV())
+        for level in range(0, 4):
+            lv = LevelInfo(level, 1)
+            cal.add_runtime_sample(Event(EventKind.ENCRYPT, lv), 100 - 10 * level)
+
+        held_out = {Event(EventKind.ENCRYPT, LevelInfo(3, 1))}
+        cal.cost_model = cal.fit_cost_model(held_out)
+        self.assertEqual(cal.cost_model.errors, {EventKind.ENCRYPT: 0.0})
+
+        loaded = PKECalibrationData.from_dict(json.loads(json.dumps(cal.to_dict())))
+        self.assertEqual(loaded.cost_model.errors, {EventKind.ENCRYPT: 0.0})
+        table = loaded.avg_runtime_table()
+        self.assertEqual(table.lookup(EventKind.ENCRYPT, LevelInfo(6, 1)), 40)
+
+
+class TestCalibrationJournal(TestCase):
+    def test_resume(self):
+        bootstrap = Event(EventKind.EVAL_BOOTSTRAP)
+        encrypt = Event(EventKind.ENCRYPT, LevelInfo(0, 1))
+
+        with tempfile.TemporaryDirectory() as d:
+            journal = CalibrationJournal(os.path.join(d, "cal.dc.journal"))
+            self.assertIsNone(journal.read())
+
+            chunk = PKECalibrationData(SchemeModelCKKS(LevelInfo(5, 2)))
+            chunk.runtime_samples[bootstrap] = [1000, 1100]
+            journal.record(chunk)
+
+            chunk = PKECalibrationData(SchemeModelCKKS(LevelInfo()))
+            chunk.set_memory_tables({0: 10}, {0: 100})
+            chunk.runtime_samples[encrypt] = [5, 6]
+            journal.record(chunk)
+
+            # a chunk cut off by the calibration being interrupted
+            journal.fh.write('{"scheme": ')
+            journal.fh.flush()
+
+            data = journal.read()
+            journal.remove()
+            self.assertFalse(os.path.exists(journal.file))
+
+        self.assertEqual(
+            data.runtime_samples, {bootstrap: [1000, 1100], encrypt: [5, 6]}
+        )
+        self.assertEqual(data.get_scheme().bootstrap_lev, LevelInfo(5, 2))
+        self.assertEqual(data.ct_mem[0], 100)
+
+    def test_resume_twice(self):
+        def chunk(level: int) -> PKECalibrationData:
+            data = PKECalibrationData(SchemeModelBFV())
+            data.runtime_samples[Event(EventKind.ENCRYPT, LevelInfo(level, 1))] = [1]
+            return data
+
+        def interrupt(journal: CalibrationJournal) -> None:
+            journal.fh.write('{"scheme": ')
+            journal.fh.close()
+
+        with tempfile.TemporaryDirectory() as d:
+            file = os.path.join(d, "cal.dc.journal")
+            journal = CalibrationJournal(file)
+            journal.record(chunk(0))
+            interrupt(journal)
+
+            for level in [1, 2]:
+                journal = CalibrationJournal(file)
+                self.assertEqual(len(journal.read().runtime_samples), level)
+                journal.record(chunk(level))
+                interrupt(journal)
+
+            data = CalibrationJournal(file).read()
+
+        levels = [e.arg_level1.level for e in data.runtime_samples]
+        self.assertEqual(levels, [0, 1, 2])
+
+
+class TestThreadScaling(TestCase):
+    def test_merge_other_threads(self):
+        e = Event(EventKind.ENCRYPT, LevelInfo(0, 1))
+        cal = PKECalibrationData(SchemeModelBFV())
+        cal.add_runtime_sample(e, 1100)
+        cal.threads = 1
+
+        topped_up = PKECalibrationData(SchemeModelBFV())
+        topped_up.add_runtime_sample(e, 600)
+        topped_up.runtime_ci[e] = 0.5
+        topped_up.threads = 2
+        cal.merge(topped_up)
+
+        self.assertEqual(cal.runtime_samples, {e: [1100]})
+        self.assertEqual(cal.thread_samples, {2: {e: [600]}})
+        self.assertEqual(cal.runtime_ci, {})
+
+    def test_interpolates(self):
+        lv = LevelInfo(0, 1)
+        e = Event(EventKind.ENCRYPT, lv)
+        cal = PKECalibrationData(SchemeModelBFV())
+        # 100ns serial and 1000ns parallel work
+        cal.add_runtime_sample(e, 1100)
+        cal.threads = 1
+        cal.thread_samples = {2: {e: [600]}, 4: {e: [350]}}
+
+        loaded = PKECalibrationData.from_dict(json.loads(json.dumps(cal.to_dict())))
+        self.assertEqual(loaded.thread_counts(), [1, 2, 4])
+        self.assertEqual(loaded.avg_runtime_table().lookup(EventKind.ENCRYPT, lv), 1100)
+        for threads, ns in [(2, 600), (5, 300), (8, 225)]:
+            table = loaded.avg_runtime_table(threads)
+            self.assertEqual(table.lookup(EventKind.ENCRYPT, lv), ns)
@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.runtime import Runtime
+from dioptra.report.runtime import RuntimeAnnotation, RuntimeTotal
+from tests.test_trace import calibration
+
+
+def square(cc: Analyzer, ct):
+    return cc.EvalMult(ct, ct)
+
+
+class TestVirtualClocks(TestCase):
+    def test_thread_pool(self):
+        cal = calibration()
+        total = RuntimeTotal()
+        work = RuntimeAnnotation()
+        cc = Analyzer(
+            [Runtime(cal, total), Runtime(cal, work)], cal.scheme, clocks=total.clocks
+        )
+
+        cts = [cc.ArbitraryCT(level=1) for _ in range(0, 4)]
+        with cc.ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(square, cc, ct) for ct in cts]
+            first = futures[0].result()
+
+            # the first result is available after one multiplication
+            self.assertEqual(total.clocks.now(), 100)
+
+        # the pool is done after two rounds of two multiplications
+        self.assertEqual(total.clocks.now(), 200)
+        cc.EvalMult(first, first)
+        self.assertEqual(total.total_runtime, 300)
+        self.assertEqual(work.total_runtime, 500)
+
+    def test_single_thread(self):
+        cal = calibration()
+        total = RuntimeTotal()
+        cc = Analyzer([Runtime(cal, total)], cal.scheme, clocks=total.clocks)
+        ct = cc.ArbitraryCT(level=1)
+        with cc.ThreadPoolExecutor(max_workers=1) as pool:
+            results = list(pool.map(lambda c: square(cc, c), [ct, ct, ct]))
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(total.total_runtime, 300)
+
+    def test_real_threads(self):
+        cal = calibration()
+        total = RuntimeTotal()
+        work = RuntimeAnnotation()
+        cc = Analyzer(
+            [Runtime(cal, total), Runtime(cal, work)], cal.scheme, clocks=total.clocks
+        )
+        ids: list[int] = []
+
+        def run() -> None:
+            ct = cc.ArbitraryCT(level=1)
+            for _ in range(0, 50):
+                ids.append(square(cc, ct).id)
+
+        ct = cc.ArbitraryCT(level=1)
+        square(cc, ct)
+        threads = [cc.Thread(target=run) for _ in range(0, 4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # threads start after the work done before starting them, and joining
+        # them waits for all of their work
+        self.assertEqual(total.clocks.now(), 51 * 100)
+        square(cc, ct)
+        self.assertEqual(len(set(ids)), 200)
+        self.assertEqual(work.total_runtime, 202 * 100)
+        self.assertEqual(total.total_runtime, 52 * 100)
+
+    def test_plain_threads(self):
+        cal = calibration()
+        total = RuntimeTotal()
+        cc = Analyzer([Runtime(cal, total)], cal.scheme, clocks=total.clocks)
+        ct = cc.ArbitraryCT(level=1)
+        square(cc, ct)
+        thread = threading.Thread(target=lambda: square(cc, ct))
+        with self.assertWarns(RuntimeWarning):
+            thread.start()
+            thread.join()
+
+        # the work of a plain thread is added to the clock of the main thread
+        self.assertEqual(total.clocks.now(), 200)
+        self.assertEqual(total.total_runtime, 200)
+
+    def test_wait(self):
+        cal = calibration()
+        total = RuntimeTotal()
+        cc = Analyzer([Runtime(cal, total)], cal.scheme, clocks=total.clocks)
+        ct = cc.ArbitraryCT(level=1)
+        with cc.ThreadPoolExecutor(max_workers=2) as pool:
+            short = pool.submit(square, cc, ct)
+            long = pool.submit(lambda: square(cc, square(cc, ct)))
+            cc.wait([long, short], return_when=FIRST_COMPLETED)
+            self.assertEqual(total.clocks.now(), 100)
+
+            self.assertEqual(list(cc.as_completed([long, short])), [short, long])
+            self.assertEqual(total.clocks.now(), 200)
@@ -0,0 +1,138 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer, EvalKeyKind
+from dioptra.pke.calibration import Event, EventKind, PKECalibrationData
+from dioptra.pke.memory import PKEMemoryEstimate
+from dioptra.pke.runtime import Runtime
+from dioptra.pke.scheme import LevelInfo, SchemeModelCKKS
+from dioptra.pke.trace import (
+    OpTrace,
+    RecordedCase,
+    read_trace_file,
+    write_trace_file,
+)
+from dioptra.report.memory import MemoryMaxReport
+from dioptra.report.runtime import RuntimeAnnotation, RuntimeTotal
+
+
+def calibration() -> PKECalibrationData:
+    cal = PKECalibrationData(SchemeModelCKKS(LevelInfo(0, 2)))
+    levels = [LevelInfo(lv, deg) for lv in range(0, 3) for deg in [1, 2]]
+    for lv in levels:
+        cal.add_runtime_sample(Event(EventKind.ENCRYPT, lv), 5 + lv.level)
+        for lv2 in levels:
+            cal.add_runtime_sample(Event(EventKind.EVAL_MULT_CTCT, lv, lv2), 100)
+            cal.add_runtime_sample(Event(EventKind.EVAL_ADD_CTPT, lv, lv2), 7)
+    cal.add_runtime_sample(Event(EventKind.EVAL_BOOTSTRAP), 1000)
+    cal.set_memory_tables(
+        pt_data={0: 10, 1: 20, 2: 30}, ct_data={0: 100, 1: 200, 2: 300}
+    )
+    return cal
+
+
+def program(cc: Analyzer) -> None:
+    kp = cc.KeyGen()
+    pt = cc.ArbitraryPT()
+    ct = cc.Encrypt(kp.publicKey, pt)
+    for _ in range(0, 2):
+        ct = cc.EvalMult(ct, ct)
+        ct = cc.EvalAdd(ct, pt)
+    ct = cc.EvalBootstrap(ct)
+    ct = cc.EvalMult(ct, ct)
+
+
+class TestOpTrace(TestCase):
+    def test_mult_depths(self):
+        cal = calibration()
+        trace = OpTrace()
+        cc = Analyzer([trace], cal.get_scheme())
+        pt = cc.ArbitraryPT()
+        deep = cc.EvalMult(cc.ArbitraryCT(), pt)
+        deep = cc.EvalMult(deep, deep)
+        cc.EvalAdd(cc.ArbitraryCT(), pt)
+
+        # like `MultDepth`, additions get the largest depth seen so far
+        depths = trace.mult_depths()
+        self.assertEqual(depths[depths >= 0].tolist(), [1, 2, 2])
+
+    def test_matches_live_analyses(self):
+        cal = calibration()
+
+        total = RuntimeTotal()
+        maxmem = MemoryMaxReport()
+        memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, maxmem)
+        program(Analyzer([Runtime(cal, total), memory], cal.get_scheme()))
+
+        trace = OpTrace()
+        program(Analyzer([trace], cal.get_scheme()))
+
+        runtimes = trace.runtimes(cal.avg_runtime_table(), cal.ct_mem)
+        self.assertEqual(int(runtimes.sum()), total.total_runtime)
+        self.assertEqual(
+            trace.max_value_size(cal.ct_mem, cal.pt_mem), maxmem.max_value_size
+        )
+        self.assertEqual(int(trace.value_sizes(cal.ct_mem, cal.pt_mem)[-1]), 0)
+        self.assertEqual(int(trace.mult_depths().max()), 2)
+
+        depths = trace.mult_depths()
+        self.assertEqual(depths[depths >= 0].tolist(), [0, 1, 1, 2, 2, 0, 1])
+
+        annotation = RuntimeAnnotation()
+        trace.report_runtime(cal.avg_runtime_table(), cal.ct_mem, annotation)
+        self.assertEqual(annotation.unaccounted_time, 0)
+        self.assertEqual(
+            sum(sum(lines.values()) for lines in annotation.runtimes.values()),
+            total.total_runtime,
+        )
+
+    def test_eval_key_memory(self):
+        cal = calibration()
+        cal.eval_key_mem = {EvalKeyKind.MULT: 1000, EvalKeyKind.ROTATION: 500}
+
+        def keygen(cc: Analyzer) -> None:
+            sk = cc.KeyGen().secretKey
+            cc.EvalMultKeyGen(sk)
+            cc.EvalRotateKeyGen(sk, [1, 2])
+            # keys that already exist are replaced, not added
+            cc.EvalAtIndexKeyGen(sk, [2, 3])
+            cc.EvalMultKeyGen(sk)
+
+        maxmem = MemoryMaxReport()
+        memory = PKEMemoryEstimate(0, cal.ct_mem, cal.pt_mem, maxmem, cal.eval_key_mem)
+        keygen(Analyzer([memory], cal.get_scheme()))
+        self.assertEqual(maxmem.value_size, 1000 + 3 * 500)
+
+        trace = OpTrace()
+        keygen(Analyzer([trace], cal.get_scheme()))
+        self.assertEqual(
+            trace.max_value_size(cal.ct_mem, cal.pt_mem, cal.eval_key_mem),
+            1000 + 3 * 500,
+        )
+
+    def test_trace_file_roundtrip(self):
+        cal = calibration()
+        trace = OpTrace()
+        program(Analyzer([trace], cal.get_scheme()))
+
+        with tempfile.TemporaryDirectory() as d:
+            file = os.path.join(d, "case.trace")
+            write_trace_file(file, cal.get_scheme(), [RecordedCase("c", 5, trace)])
+            (scheme, cases) = read_trace_file(file)
+
+        self.assertEqual(scheme.name, "CKKS")
+        self.assertEqual(len(cases), 1)
+        self.assertEqual((cases[0].description, cases[0].limit_ns), ("c", 5))
+
+        loaded = cases[0].trace
+        self.assertEqual(bytes(loaded.rows), bytes(trace.rows))
+        self.assertEqual(
+            [str(loc) for loc in loaded.locations()],
+            [str(loc) for loc in trace.locations()],
+        )
+        table = cal.avg_runtime_table()
+        self.assertEqual(
+            int(loaded.runtimes(table, cal.ct_mem).sum()),
+            int(trace.runtimes(table, cal.ct_mem).sum()),
+        )
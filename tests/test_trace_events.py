@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.runtime import Runtime
+from dioptra.report.runtime import RuntimeTotal, RuntimeTraceEvents
+from dioptra.utils.measurement import BPS
+from tests.test_trace import calibration
+
+
+class TestTraceEvents(TestCase):
+    def test_timeline(self):
+        cal = calibration()
+        trace = RuntimeTraceEvents()
+        total = RuntimeTotal()
+        cc = Analyzer([Runtime(cal, trace), Runtime(cal, total)], cal.scheme)
+        network = cc.MakeNetwork(
+            send_bps=BPS(Mbps=100), recv_bps=BPS(Gbps=1), latency_ms=1
+        )
+
+        with trace.phase("server", "square"):
+            ct = cc.ArbitraryCT(level=2)
+            network.RecvCiphertext(ct)
+            cc.EvalMult(ct, ct)
+
+        self.assertEqual(trace.now, total.total_runtime)
+        events = trace.chrome_trace()["traceEvents"]
+        ops = [e for e in events if e["ph"] == "X" and e["cat"] != "phase"]
+        self.assertEqual([e["name"] for e in ops], ["RecvCiphertext", "EVAL_MULT_CTCT"])
+        self.assertEqual([e["cat"] for e in ops], ["network", "compute"])
+
+        # operations follow each other, within the phase
+        self.assertEqual(ops[1]["ts"], ops[0]["ts"] + ops[0]["dur"])
+        (phase,) = [e for e in events if e["ph"] == "X" and e["cat"] == "phase"]
+        self.assertEqual(phase["dur"], sum(e["dur"] for e in ops))
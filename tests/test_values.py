@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from dioptra.pke.analyzer import Analyzer
+from dioptra.pke.scheme import SchemeModelBGV
+
+
+class TestSlotValues(TestCase):
+    def test_operations(self):
+        cc = Analyzer([], SchemeModelBGV())
+        kp = cc.KeyGen()
+        pt1 = cc.MakePackedPlaintext([1, 2, 3, 4])
+        pt2 = cc.MakePackedPlaintext([5, 6, 7, 8])
+        ct1 = cc.Encrypt(kp.publicKey, pt1)
+        ct2 = cc.Encrypt(kp.publicKey, pt2)
+
+        def dec(ct):
+            return cc.Decrypt(kp.secretKey, ct).GetPackedValue()
+
+        self.assertEqual(dec(cc.EvalMult(ct1, ct2)), [5, 12, 21, 32])
+        self.assertEqual(dec(cc.EvalAdd(ct1, ct2)), [6, 8, 10, 12])
+        self.assertEqual(dec(cc.EvalSub(ct2, ct1)), [4, 4, 4, 4])
+        self.assertEqual(dec(cc.EvalSub(ct2, pt1)), [4, 4, 4, 4])
+        self.assertEqual(dec(cc.EvalSum(ct1, 4)), [10, 10, 10, 10])
+        self.assertEqual(dec(cc.EvalSum(ct1, 2)), [3, 5, 7, 5])
+
+        # values are shared, so they must not be modifiable
+        with self.assertRaises(ValueError):
+            ct1.value[0] = 0
+
+    def test_no_overflow(self):
+        cc = Analyzer([], SchemeModelBGV())
+        kp = cc.KeyGen()
+        x = 3**30
+        ct = cc.Encrypt(kp.publicKey, cc.MakePackedPlaintext([x, -x]))
+        sq = cc.EvalMult(ct, ct)
+        self.assertEqual(sq.value.tolist(), [x**2, x**2])
+        self.assertEqual(cc.EvalMult(sq, sq).value.tolist(), [x**4, x**4])
+        self.assertEqual(cc.EvalSum(sq, 2).value.tolist(), [2 * x**2] * 2)
+        self.assertEqual(cc.EvalSub(ct, sq).value.tolist(), [x - x**2, -x - x**2])
+
+    def test_untracked(self):
+        cc = Analyzer([], SchemeModelBGV(), track_values=False)
+        kp = cc.KeyGen()
+        ct = cc.Encrypt(kp.publicKey, cc.MakePackedPlaintext([1, 2]))
+        self.assertIsNone(cc.EvalSum(cc.EvalMult(ct, ct), 2).value)